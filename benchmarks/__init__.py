@@ -0,0 +1 @@
+# benchmarks - stub server and benchmarks for the Veracode API transport layer
@@ -0,0 +1,101 @@
+# bench_import.py - time taken by `import veracode_api_py` and friends in a fresh interpreter
+#
+# run from the repository root:  python -m benchmarks.bench_import --help
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+# the classes the package imported eagerly before its modules were loaded lazily
+EAGER = ('from veracode_api_py import VeracodeAPI, Policies, Applications, Sandboxes, CustomFields, Collections, '
+         'Analyses, Scans, CodeGroups, Configuration, ScannerVariables, ScanCapacitySummary, Occurrences, DynUtils, '
+         'VeracodeAPIError, VeracodeError, Findings, SummaryReport, ManualScans, CWEs, CWECategories, Healthcheck, '
+         'Users, Teams, BusinessUnits, APICredentials, Roles, Workspaces, ComponentActivity, SBOM, SCAApplications, '
+         'XMLAPI, Analytics, StaticCLI, DASTTargets, DASTAnalysisProfiles, DASTAnalysisRuns')
+
+# statement, and modules it must not load. `import *` loads every module
+CASES = [
+    ('import veracode_api_py', ['requests', 'aiohttp', 'veracode_api_py.apihelper']),
+    ('from veracode_api_py import VeracodeAPIError', ['requests', 'aiohttp']),
+    ('from veracode_api_py import Findings', ['aiohttp', 'asyncio', 'veracode_api_py.sca', 'veracode_api_py.dast']),
+    ('from veracode_api_py import XMLAPI', ['aiohttp', 'asyncio', 'veracode_api_py.findings']),
+    ('from veracode_api_py import VeracodeAPI', ['aiohttp']),
+    (EAGER, ['aiohttp']),
+    ('from veracode_api_py import *', []),
+]
+
+PROBE = """
+import sys, time, json
+started = time.perf_counter()
+{}
+elapsed = time.perf_counter() - started
+print(json.dumps({{'ms': elapsed * 1000, 'modules': sorted(sys.modules)}}))
+"""
+
+
+def measure(statement, repeat):
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join([root] + os.environ.get('PYTHONPATH', '').split(os.pathsep)))
+    timings = []
+    modules = []
+    for _ in range(repeat):
+        output = subprocess.run([sys.executable, '-c', PROBE.format(statement)], env=env, check=True,
+                                capture_output=True, text=True).stdout
+        result = json.loads(output)
+        timings.append(result['ms'])
+        modules = result['modules']
+    return statistics.median(timings), modules
+
+
+def label(statement):
+    return 'eager import (what the package used to load)' if statement == EAGER else statement
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Measure import time of veracode_api_py in fresh interpreters.')
+    parser.add_argument('--repeat', type=int, default=7, help='interpreters started per statement (default: 7)')
+    parser.add_argument('--check', action='store_true',
+                        help='exit with an error if a statement loads a module it should not, '
+                             'or is more than --max-slowdown times slower than in --baseline')
+    parser.add_argument('--save', metavar='PATH', help='write the median time of each statement to PATH as JSON')
+    parser.add_argument('--baseline', metavar='PATH', help='compare against times written earlier with --save')
+    parser.add_argument('--max-slowdown', type=float, default=1.25,
+                        help='largest allowed ratio of a time to its --baseline time (default: 1.25)')
+    parser.add_argument('--slack-ms', type=float, default=5.0,
+                        help='milliseconds a statement may take over its allowed time, to absorb noise in '
+                             'statements that take almost no time (default: 5)')
+    options = parser.parse_args(argv)
+
+    failures = []
+    timings = {}
+    print('{:<50}{:>10}{:>10}'.format('statement', 'median ms', 'modules'))
+    for statement, forbidden in CASES:
+        median, modules = measure(statement, options.repeat)
+        timings[statement] = median
+        print('{:<50}{:>10.1f}{:>10}'.format(label(statement), median, len(modules)))
+        for module in forbidden:
+            if module in modules:
+                failures.append('{} loads {}'.format(label(statement), module))
+
+    if options.baseline:
+        with open(options.baseline, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+        for statement, median in timings.items():
+            if statement in baseline and median > baseline[statement] * options.max_slowdown + options.slack_ms:
+                failures.append('{} takes {:.1f} ms, {:.2f} times its baseline of {:.1f} ms'.format(
+                    label(statement), median, median / baseline[statement], baseline[statement]))
+    if options.save:
+        with open(options.save, 'w', encoding='utf-8') as f:
+            json.dump(timings, f, indent=2)
+
+    for failure in failures:
+        print('FAIL: ' + failure)
+    if options.check and failures:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
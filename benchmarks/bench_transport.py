@@ -0,0 +1,174 @@
+# bench_transport.py - throughput, latency and memory of the transport layer against the stub server
+#
+# run from the repository root:  python -m benchmarks.bench_transport --help
+
+import argparse
+import json
+import sys
+import time
+import tracemalloc
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from veracode_api_py import Analytics, Findings, XMLAPI
+from veracode_api_py.apihelper import APIHelper, SessionPool
+from veracode_api_py.instrumentation import Instrumentation, add_instrumentation, remove_instrumentation
+from veracode_api_py.ratelimit import RateLimiter
+from veracode_api_py.scheduler import XMLRetryPolicy
+
+from .stubserver import StubServer
+
+APP_INFO = '<?xml version="1.0" encoding="UTF-8"?><appinfo xmlns="https://analysiscenter.veracode.com/schema/2.0/appinfo" ' \
+           'appinfo_version="1.1" account_id="1"><application app_id="{}" app_name="bench"/></appinfo>'
+
+
+def finding(n):
+    return {'issue_id': n, 'scan_type': 'STATIC', 'description': 'Benchmark finding ' + 'x' * 300,
+            'count': 1, 'context_type': 'APPLICATION', 'context_guid': str(uuid.UUID(int=n)),
+            'violates_policy': n % 3 == 0,
+            'finding_status': {'status': 'OPEN', 'resolution': 'UNRESOLVED', 'new': False},
+            'finding_details': {'severity': 3, 'cwe': {'id': 79, 'name': 'Cross-site Scripting'},
+                                'file_path': 'src/main/java/Bench{}.java'.format(n % 50),
+                                'file_line_number': n % 900, 'procedure': 'bench.run'}}
+
+
+class LatencyRecorder(Instrumentation):
+    def __init__(self):
+        self.latencies = []
+
+    def request_finished(self, metrics):
+        self.latencies.append(metrics.latency)
+
+
+def percentile(values, percent):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[max(0, -(-len(ordered) * percent // 100) - 1)]
+
+
+def fan_out(concurrency, calls, fn):
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        return list(executor.map(fn, range(calls)))
+
+
+# scenarios: each takes the stub server, concurrency level and options, and returns the number of records read
+
+def bench_rest_paged(stub, concurrency, options):
+    stub.add_paged('/bench/v1/records', 'records', finding, options.page_size, options.records)
+    APIHelper.page_workers = concurrency
+    return len(APIHelper()._rest_paged_request('bench/v1/records', 'GET', 'records', {}))
+
+
+def bench_xml_request(stub, concurrency, options):
+    stub.add_xml('5.0/getappinfo.do', APP_INFO.format(1))
+    return len(fan_out(concurrency, options.calls, lambda n: XMLAPI().get_app_info(n)))
+
+
+def bench_xml_retry_later(stub, concurrency, options):
+    stub.add_xml('5.0/getappinfo.do', APP_INFO.format(1), retry_later=concurrency)
+    XMLRetryPolicy.configure(initial=options.retry_seconds, maximum=options.retry_seconds)
+    return len(fan_out(concurrency, concurrency, lambda n: XMLAPI().get_app_info(n)))
+
+
+def bench_findings(stub, concurrency, options):
+    apps = [str(uuid.UUID(int=n)) for n in range(options.apps)]
+    for app in apps:
+        stub.add_paged('/appsec/v2/applications/{}/findings'.format(app), 'findings', finding,
+                       options.page_size, options.records // options.apps)
+    APIHelper.page_workers = 1
+    results = fan_out(concurrency, len(apps), lambda n: Findings().get_findings(apps[n]))
+    return sum(len(findings) for findings in results)
+
+
+def bench_analytics(stub, concurrency, options):
+    guids = [str(uuid.UUID(int=n)) for n in range(options.calls)]
+    for guid in guids:
+        stub.add_response('GET', '/appsec/v1/analytics/report/{}'.format(guid),
+                          {'_embedded': {'status': 'COMPLETED',
+                                         'findings': [finding(n) for n in range(options.page_size)]},
+                           'page': {'number': 0, 'size': options.page_size, 'total_pages': 1}})
+    results = fan_out(concurrency, len(guids), lambda n: Analytics().get(guids[n]))
+    return sum(len(body) for status, body in results)
+
+
+def bench_throttled(stub, concurrency, options):
+    stub.error_rate = options.error_rate
+    stub.add_paged('/bench/v1/records', 'records', finding, options.page_size, options.records)
+    APIHelper.page_workers = concurrency
+    return len(APIHelper()._rest_paged_request('bench/v1/records', 'GET', 'records', {}))
+
+
+SCENARIOS = {
+    'rest_paged': bench_rest_paged,
+    'xml_request': bench_xml_request,
+    'xml_retry_later': bench_xml_retry_later,
+    'findings': bench_findings,
+    'analytics': bench_analytics,
+    'throttled': bench_throttled,
+}
+
+
+def run(name, concurrency, options):
+    stub = StubServer(latency=options.latency, retry_after=0, seed=1)
+    stub.start()
+    stub.use()
+    SessionPool.configure(pool_maxsize=max(10, concurrency))
+    RateLimiter.configure(backoff_base=0.05)
+    recorder = add_instrumentation(LatencyRecorder())
+    if options.memory:
+        tracemalloc.start()
+    try:
+        started = time.perf_counter()
+        records = SCENARIOS[name](stub, concurrency, options)
+        elapsed = time.perf_counter() - started
+        peak = tracemalloc.get_traced_memory()[1] if options.memory else 0
+    finally:
+        if options.memory:
+            tracemalloc.stop()
+        remove_instrumentation(recorder)
+        stub.stop()
+    latencies = recorder.latencies
+    return {'scenario': name, 'concurrency': concurrency, 'seconds': elapsed, 'calls': len(latencies),
+            'http_requests': stub.requests, 'injected_errors': stub.errors, 'records': records,
+            'calls_per_second': len(latencies) / elapsed, 'records_per_second': records / elapsed,
+            'p50': percentile(latencies, 50), 'p95': percentile(latencies, 95), 'p99': percentile(latencies, 99),
+            'peak_memory_mb': peak / 1048576}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark the Veracode API transport layer against a local stub server.')
+    parser.add_argument('--scenarios', default=','.join(SCENARIOS),
+                        help='comma separated list of scenarios (default: all): ' + ', '.join(SCENARIOS))
+    parser.add_argument('--concurrency', default='1,4,16', help='comma separated concurrency levels (default: 1,4,16)')
+    parser.add_argument('--latency', type=float, default=0.02, help='stub response latency in seconds (default: 0.02)')
+    parser.add_argument('--records', type=int, default=20000, help='records served by paged scenarios (default: 20000)')
+    parser.add_argument('--page-size', type=int, default=500, help='records per page (default: 500)')
+    parser.add_argument('--calls', type=int, default=64, help='calls made by the XML and analytics scenarios (default: 64)')
+    parser.add_argument('--apps', type=int, default=16, help='applications in the findings scenario (default: 16)')
+    parser.add_argument('--error-rate', type=float, default=0.1, help='share of 429/503 answers in the throttled scenario (default: 0.1)')
+    parser.add_argument('--retry-seconds', type=float, default=0.05, help='XML 204 retry wait in the xml_retry_later scenario (default: 0.05)')
+    parser.add_argument('--no-memory', dest='memory', action='store_false', help='skip peak memory measurement, which slows the run down')
+    parser.add_argument('--json', help='also write the results to this file')
+    options = parser.parse_args(argv)
+
+    results = []
+    print('{:<16}{:>6}{:>9}{:>8}{:>10}{:>12}{:>9}{:>9}{:>9}{:>9}'.format(
+        'scenario', 'conc', 'seconds', 'calls', 'calls/s', 'records/s', 'p50 ms', 'p95 ms', 'p99 ms', 'peak MB'))
+    for name in options.scenarios.split(','):
+        for concurrency in [int(level) for level in options.concurrency.split(',')]:
+            result = run(name, concurrency, options)
+            results.append(result)
+            print('{scenario:<16}{concurrency:>6}{seconds:>9.2f}{calls:>8}{calls_per_second:>10.1f}'
+                  '{records_per_second:>12.0f}{p50_ms:>9.1f}{p95_ms:>9.1f}{p99_ms:>9.1f}{peak_memory_mb:>9.1f}'
+                  .format(p50_ms=result['p50'] * 1000, p95_ms=result['p95'] * 1000, p99_ms=result['p99'] * 1000,
+                          **result))
+            sys.stdout.flush()
+
+    if options.json:
+        with open(options.json, 'w') as f:
+            json.dump(results, f, indent=1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,238 @@
+# stubserver.py - local stand-in for the Veracode REST and XML APIs, for benchmarks and offline runs
+
+import base64
+import json
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+import requests
+
+from veracode_api_py.apihelper import SessionPool
+from veracode_api_py.credentials import CredentialsCache
+from veracode_api_py.xmlapi import XMLAPI
+
+STUB_API_KEY_ID = '0' * 32
+STUB_API_KEY_SECRET = '0' * 128
+
+_XML_PATH = re.compile(r'^/api/\d')
+
+
+class StubServer():
+    """Serves canned responses for Veracode API paths on 127.0.0.1.
+
+    REST endpoints are served from /, XML endpoints from /api, as on the real hosts. Responses come from
+    add_response(), add_paged() and add_xml(), or from a recording made with record_from(). Every response
+    can be delayed by latency seconds (a number, or a (min, max) range), and a share error_rate of requests
+    is answered with one of error_statuses instead; 429 answers carry a Retry-After of retry_after seconds."""
+
+    def __init__(self, latency=0.0, error_rate: float=0.0, error_statuses=(429, 503), retry_after: float=0,
+                 seed: int=None):
+        self.latency = latency
+        self.error_rate = error_rate
+        self.error_statuses = error_statuses
+        self.retry_after = retry_after
+        self.requests = 0
+        self.errors = 0
+        self.recording = []
+        self._random = random.Random(seed)
+        self._routes = {}
+        self._lock = threading.Lock()
+        self._upstream = None
+        self._server = None
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    @property
+    def url(self):
+        return 'http://127.0.0.1:{}/'.format(self._server.server_address[1])
+
+    def start(self):
+        stub = self
+
+        class Handler(_StubHandler):
+            server_stub = stub
+
+        self._server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self._server.daemon_threads = True
+        self._server.request_queue_size = 512
+        threading.Thread(target=self._server.serve_forever, name='veracode-stub', daemon=True).start()
+        return self.url
+
+    def stop(self):
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+    def use(self):
+        """Points the library at this server: registers stub credentials as the default profile, so that
+        worker threads use them too, and redirects the XML API."""
+        CredentialsCache.register(None, STUB_API_KEY_ID, STUB_API_KEY_SECRET, region='global',
+                                  base_rest_url=self.url, base_xml_url=self.url + 'api')
+        XMLAPI.baseurl = self.url + 'api'
+        SessionPool.close()
+
+    # canned responses
+
+    def add_response(self, method, path, body, status=200, headers=None, query=None):
+        """Answers method requests for path (and query, a dict, if given) with body, a str, bytes or JSON value."""
+        if not isinstance(body, (str, bytes)):
+            body = json.dumps(body)
+            headers = dict({'Content-Type': 'application/json'}, **(headers or {}))
+        if isinstance(body, str):
+            body = body.encode('utf-8')
+        response = (status, headers or {}, body)
+        self._routes[(method, path, _query_key(query))] = lambda query: response
+
+    def add_paged(self, path, element, records, page_size: int=500, count: int=None):
+        """Serves records as a paged REST resource, with the page.total_pages metadata that
+        APIHelper._rest_paged_request reads. records is a list, or a function that returns record n
+        of count records."""
+        if count is None:
+            count = len(records)
+        make_record = records if callable(records) else (lambda n: records[n])
+        total_pages = max(1, -(-count // page_size))
+        # pages are rendered up front, so that the stub, which shares the GIL with the client under test,
+        # spends as little time as possible per request
+        pages = []
+        for number in range(total_pages):
+            start = number * page_size
+            pages.append(json.dumps({'_embedded': {element: [make_record(n) for n in
+                                                             range(start, min(count, start + page_size))]},
+                                     'page': {'number': number, 'size': page_size, 'total_elements': count,
+                                              'total_pages': total_pages}}).encode('utf-8'))
+
+        def page(query):
+            number = int(query.get('page', ['0'])[0])
+            if number >= total_pages:
+                return 404, {'Content-Type': 'application/json'}, b'{"message": "no such page"}'
+            return 200, {'Content-Type': 'application/json'}, pages[number]
+
+        self._routes[('GET', path, None)] = page
+
+    def add_xml(self, path, body, retry_later: int=0, method='GET'):
+        """Serves an XML API response. The first retry_later requests are answered with 204, which the
+        XML APIs use to ask the caller to try again later."""
+        if isinstance(body, str):
+            body = body.encode('utf-8')
+        remaining = [retry_later]
+
+        def xml(query):
+            with self._lock:
+                if remaining[0] > 0:
+                    remaining[0] -= 1
+                    return 204, {}, b''
+            return 200, {'Content-Type': 'text/xml'}, body
+
+        self._routes[(method, '/api/' + path.lstrip('/'), None)] = xml
+
+    # record and replay
+
+    def record_from(self, profile: str=None):
+        """Forwards requests that have no canned response to the real Veracode APIs, signed with the
+        credentials for profile, and keeps what they return for save_recording()."""
+        self._upstream = CredentialsCache.get(profile)
+
+    def save_recording(self, filename):
+        with open(filename, 'w') as f:
+            json.dump(self.recording, f, indent=1)
+
+    def load_recording(self, filename):
+        """Replays the responses saved by save_recording(), matching on method, path and query string."""
+        with open(filename) as f:
+            for entry in json.load(f):
+                if 'body_base64' in entry:
+                    body = base64.b64decode(entry['body_base64'])
+                else:
+                    body = entry['body'].encode('utf-8')
+                self.add_response(entry['method'], entry['path'], body, entry['status'], entry['headers'],
+                                  entry['query'])
+
+    # request handling
+
+    def _respond(self, method, path, query, body, headers):
+        with self._lock:
+            self.requests += 1
+        self._delay()
+        if self.error_rate and self._random.random() < self.error_rate:
+            with self._lock:
+                self.errors += 1
+            status = self._random.choice(self.error_statuses)
+            extra = {'Retry-After': str(self.retry_after)} if status == 429 else {}
+            return status, extra, b'{"message": "injected error"}'
+
+        route = self._routes.get((method, path, _query_key(query))) or self._routes.get((method, path, None))
+        if route is not None:
+            return route(query)
+        if self._upstream is not None:
+            return self._forward(method, path, query, body, headers)
+        return 404, {'Content-Type': 'application/json'}, b'{"message": "no stub response"}'
+
+    def _delay(self):
+        latency = self.latency
+        if isinstance(latency, (tuple, list)):
+            latency = self._random.uniform(*latency)
+        if latency:
+            time.sleep(latency)
+
+    def _forward(self, method, path, query, body, headers):
+        if _XML_PATH.match(path):
+            url = self._upstream.base_xml_url + path[len('/api'):]
+        else:
+            url = self._upstream.base_rest_url + path.lstrip('/')
+        forwarded = {name: value for name, value in headers.items() if name.lower() == 'content-type'}
+        r = requests.request(method, url, params=query, data=body, headers=forwarded, auth=self._upstream.auth())
+        response_headers = {name: value for name, value in r.headers.items()
+                            if name.lower() in ('content-type', 'etag', 'last-modified', 'retry-after')}
+        entry = {'method': method, 'path': path, 'query': {name: values[0] for name, values in query.items()},
+                 'status': r.status_code, 'headers': response_headers}
+        try:
+            entry['body'] = r.content.decode('utf-8')
+        except UnicodeDecodeError:
+            entry['body_base64'] = base64.b64encode(r.content).decode('ascii')
+        with self._lock:
+            self.recording.append(entry)
+        return r.status_code, response_headers, r.content
+
+
+class _StubHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    server_stub = None
+
+    def log_message(self, format, *args):
+        pass
+
+    def _handle(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        body = self.rfile.read(length) if length else None
+        parts = urlsplit(self.path)
+        status, headers, payload = self.server_stub._respond(self.command, parts.path, parse_qs(parts.query),
+                                                             body, self.headers)
+        self.send_response(status)
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    do_GET = do_POST = do_PUT = do_DELETE = _handle
+
+
+def _query_key(query):
+    if query is None:
+        return None
+    items = []
+    for name, value in query.items():
+        if isinstance(value, list):
+            value = value[0]
+        items.append((name, str(value)))
+    return tuple(sorted(items))
@@ -20,6 +20,9 @@ setup(
   install_requires=[            
           'veracode-api-signing'
       ],
+  extras_require={
+          'async': ['aiohttp']
+      },
   classifiers=[
     'Development Status :: 4 - Beta',      # Chose either "3 - Alpha", "4 - Beta" or "5 - Production/Stable" as the current state of your package
     'Intended Audience :: Developers',      
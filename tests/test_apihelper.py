@@ -0,0 +1,28 @@
+from veracode_api_py.apihelper import APIHelper
+from veracode_api_py.credentials import CredentialsCache
+
+PAGES = 5
+
+
+def _page_profiles(monkeypatch):
+    # answers every page request with one record: the profile selected where the request was made
+    def rest_request(self, url, method, params=None, body=None, fullresponse=False, use_base_url=True, files=None):
+        profile = CredentialsCache.get().profile
+        return {'_embedded': {'records': [profile]}, 'page': {'total_pages': PAGES}}
+
+    CredentialsCache.register('paging', 'id', 'secret', region='global')
+    monkeypatch.setattr(APIHelper, '_rest_request', rest_request)
+
+
+def test_pages_fetched_by_workers_use_the_selected_profile(monkeypatch):
+    _page_profiles(monkeypatch)
+    with CredentialsCache.use_profile('paging'):
+        records = APIHelper()._rest_paged_request('records', 'GET', 'records', page_workers=4)
+    assert records == ['paging'] * PAGES
+
+
+def test_pages_fetched_ahead_by_iter_use_the_selected_profile(monkeypatch):
+    _page_profiles(monkeypatch)
+    with CredentialsCache.use_profile('paging'):
+        records = list(APIHelper()._rest_paged_iter('records', 'GET', 'records', read_ahead=2))
+    assert records == ['paging'] * PAGES
@@ -0,0 +1,21 @@
+import subprocess
+import sys
+
+
+def _run(code):
+    # in a fresh interpreter, since other tests have already imported the modules
+    return subprocess.run([sys.executable, '-c', code], check=True, capture_output=True, text=True).stdout.strip()
+
+
+def test_submodules_are_attributes_after_importing_the_package():
+    assert _run('import veracode_api_py; print(veracode_api_py.findings.Findings.__name__, '
+                'veracode_api_py.xmlresults.BuildInfo.__name__)') == 'Findings BuildInfo'
+
+
+def test_importing_the_package_does_not_load_the_submodules():
+    assert _run('import sys, veracode_api_py; print("veracode_api_py.findings" in sys.modules)') == 'False'
+
+
+def test_unknown_attributes_still_raise():
+    assert _run('import veracode_api_py\n'
+                'try:\n    veracode_api_py.nothing\nexcept AttributeError:\n    print("raised")') == 'raised'
@@ -0,0 +1,44 @@
+import threading
+import time
+
+from veracode_api_py.ratelimit import RateLimiter
+
+
+def test_concurrent_429s_halve_the_rate_once():
+    limiter = RateLimiter(rate=400.0)
+    sent = time.monotonic()
+    start = threading.Barrier(50)
+
+    def throttled():
+        start.wait()
+        limiter.throttled(sent=sent)
+
+    threads = [threading.Thread(target=throttled) for _ in range(50)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert limiter.rate == 200.0
+
+
+def test_429s_within_the_decrease_interval_halve_the_rate_once():
+    limiter = RateLimiter(rate=400.0, decrease_interval=60.0)
+    for _ in range(10):
+        limiter.throttled()
+    assert limiter.rate == 200.0
+
+
+def test_429_for_a_call_sent_after_the_decrease_halves_again():
+    limiter = RateLimiter(rate=400.0, decrease_interval=0.0)
+    limiter.throttled(sent=time.monotonic())
+    time.sleep(0.01)
+    limiter.throttled(sent=time.monotonic())
+    assert limiter.rate == 100.0
+
+
+def test_recovery_is_proportional_to_the_rate():
+    limiter = RateLimiter(rate=10.0, recovery_factor=0.5)
+    for _ in range(20):
+        limiter.reserve()
+    limiter.succeeded()
+    assert limiter.rate == 15.0
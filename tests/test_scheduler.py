@@ -0,0 +1,22 @@
+import warnings
+
+from veracode_api_py.apihelper import APIHelper
+from veracode_api_py.credentials import CredentialsCache
+from veracode_api_py.scheduler import XMLRetryPolicy
+
+
+def test_default_policy_waits_120_seconds_before_every_retry():
+    policy = XMLRetryPolicy()
+    assert [policy.delay(attempt) for attempt in range(1, 6)] == [120.0] * 5
+    assert not policy.gives_up(waited=10 ** 6, delay=120.0)
+
+
+def test_retry_seconds_sets_a_fixed_retry_delay():
+    CredentialsCache.register('retries', 'id', 'secret', region='global')
+    helper = APIHelper(profile='retries')
+    assert helper.retry_seconds == XMLRetryPolicy.get().initial
+    with warnings.catch_warnings(record=True) as caught:
+        warnings.simplefilter('always')
+        helper.retry_seconds = 30
+    assert caught[0].category is DeprecationWarning
+    assert [helper.retry_policy.delay(attempt) for attempt in range(1, 4)] == [30, 30, 30]
@@ -0,0 +1,25 @@
+import pytest
+
+from veracode_api_py.exceptions import VeracodeAPIError
+from veracode_api_py.scheduler import XMLRetryPolicy
+from veracode_api_py.upload import UploadPipeline
+from veracode_api_py.xmlapi import XMLAPI
+
+BUILD_INFO = ('<buildinfo app_id="1" build_id="2"><build build_id="2">'
+              '<analysis_unit analysis_type="Static" status="{}"/></build></buildinfo>')
+
+
+def test_canceled_prescan_fails_without_polling_again(monkeypatch):
+    polls = []
+
+    def get_build_info(self, app_id, build_id=None, sandbox_id=None):
+        polls.append(app_id)
+        return BUILD_INFO.format('Pre-Scan Canceled').encode('utf-8')
+
+    monkeypatch.setattr(XMLAPI, 'get_build_info', get_build_info)
+    monkeypatch.setattr(UploadPipeline, 'upload', lambda self: None)
+    monkeypatch.setattr(UploadPipeline, 'prescan', lambda self: None)
+    pipeline = UploadPipeline(1, [], poll_policy=XMLRetryPolicy(initial=60, max_wait=3600))
+    with pytest.raises(VeracodeAPIError, match='Pre-Scan Canceled'):
+        pipeline.run()
+    assert polls == [1]
@@ -1,15 +1,105 @@
-from veracode_api_py.api import VeracodeAPI
-from veracode_api_py.policy import Policies
-from veracode_api_py.applications import Applications, Sandboxes, CustomFields
-from veracode_api_py.collections import Collections
-from veracode_api_py.dynamic import Analyses, Scans, CodeGroups, Configuration, ScannerVariables, ScanCapacitySummary, Occurrences, DynUtils
-from veracode_api_py.exceptions import VeracodeAPIError, VeracodeError
-from veracode_api_py.findings import Findings, SummaryReport, ManualScans, CWEs, CWECategories
-from veracode_api_py.healthcheck import Healthcheck
-from veracode_api_py.identity import Users, Teams, BusinessUnits, APICredentials, Roles
-from veracode_api_py.sca import Workspaces, ComponentActivity, SBOM, SCAApplications
-from veracode_api_py.exceptions import VeracodeError, VeracodeAPIError
-from veracode_api_py.xmlapi import XMLAPI
-from veracode_api_py.analytics import Analytics
-from veracode_api_py.static import StaticCLI
-from veracode_api_py.dast import DASTTargets, DASTAnalysisProfiles, DASTAnalysisRuns
\ No newline at end of file
+# The API classes are imported from their modules the first time they are used (PEP 562), so that
+# `from veracode_api_py import Findings` only loads the modules Findings needs.
+
+import importlib
+from typing import TYPE_CHECKING
+
+_EXPORTS = {
+    'VeracodeAPI': 'api',
+    'AsyncVeracodeAPI': 'asyncapi',
+    'Policies': 'policy',
+    'Applications': 'applications',
+    'Sandboxes': 'applications',
+    'CustomFields': 'applications',
+    'Collections': 'collections',
+    'Analyses': 'dynamic',
+    'Scans': 'dynamic',
+    'CodeGroups': 'dynamic',
+    'Configuration': 'dynamic',
+    'ScannerVariables': 'dynamic',
+    'ScanCapacitySummary': 'dynamic',
+    'Occurrences': 'dynamic',
+    'DynUtils': 'dynamic',
+    'VeracodeAPIError': 'exceptions',
+    'VeracodeError': 'exceptions',
+    'Findings': 'findings',
+    'FindingMatcher': 'findings',
+    'FindingCorrelation': 'findings',
+    'SummaryReport': 'findings',
+    'ManualScans': 'findings',
+    'CWEs': 'findings',
+    'CWECategories': 'findings',
+    'Healthcheck': 'healthcheck',
+    'Users': 'identity',
+    'Teams': 'identity',
+    'BusinessUnits': 'identity',
+    'APICredentials': 'identity',
+    'Roles': 'identity',
+    'Workspaces': 'sca',
+    'ComponentActivity': 'sca',
+    'SBOM': 'sca',
+    'SCAApplications': 'sca',
+    'XMLAPI': 'xmlapi',
+    'UploadPipeline': 'upload',
+    'BuildWatcher': 'buildwatcher',
+    'BulkMitigation': 'mitigations',
+    'FindingsHarvester': 'harvest',
+    'FindingsStore': 'store',
+    'Analytics': 'analytics',
+    'StaticCLI': 'static',
+    'DASTTargets': 'dast',
+    'DASTAnalysisProfiles': 'dast',
+    'DASTAnalysisRuns': 'dast',
+}
+
+__all__ = list(_EXPORTS)
+
+
+_submodules = None
+
+
+def __getattr__(name):
+    module = _EXPORTS.get(name)
+    if module is None:
+        # the package used to import every module, so `veracode_api_py.findings` worked without importing it
+        if name in _submodule_names():
+            return importlib.import_module('.' + name, __name__)
+        raise AttributeError("module {!r} has no attribute {!r}".format(__name__, name))
+    value = getattr(importlib.import_module('.' + module, __name__), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(_EXPORTS) | _submodule_names())
+
+
+def _submodule_names():
+    global _submodules
+    if _submodules is None:
+        import pkgutil
+        _submodules = {info.name for info in pkgutil.iter_modules(__path__)}
+    return _submodules
+
+
+if TYPE_CHECKING:
+    from veracode_api_py.api import VeracodeAPI
+    from veracode_api_py.asyncapi import AsyncVeracodeAPI
+    from veracode_api_py.policy import Policies
+    from veracode_api_py.applications import Applications, Sandboxes, CustomFields
+    from veracode_api_py.collections import Collections
+    from veracode_api_py.dynamic import Analyses, Scans, CodeGroups, Configuration, ScannerVariables, ScanCapacitySummary, Occurrences, DynUtils
+    from veracode_api_py.exceptions import VeracodeAPIError, VeracodeError
+    from veracode_api_py.findings import Findings, FindingMatcher, FindingCorrelation, SummaryReport, ManualScans, CWEs, CWECategories
+    from veracode_api_py.healthcheck import Healthcheck
+    from veracode_api_py.identity import Users, Teams, BusinessUnits, APICredentials, Roles
+    from veracode_api_py.sca import Workspaces, ComponentActivity, SBOM, SCAApplications
+    from veracode_api_py.xmlapi import XMLAPI
+    from veracode_api_py.upload import UploadPipeline
+    from veracode_api_py.buildwatcher import BuildWatcher
+    from veracode_api_py.mitigations import BulkMitigation
+    from veracode_api_py.harvest import FindingsHarvester
+    from veracode_api_py.store import FindingsStore
+    from veracode_api_py.analytics import Analytics
+    from veracode_api_py.static import StaticCLI
+    from veracode_api_py.dast import DASTTargets, DASTAnalysisProfiles, DASTAnalysisRuns
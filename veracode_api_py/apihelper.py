@@ -2,36 +2,137 @@
 
 import requests
 import logging
+import contextvars
 import json
 import time
-from requests.adapters import HTTPAdapter
+import threading
+import queue
+import functools
+import warnings
+from concurrent.futures import Future, ThreadPoolExecutor
 
 from veracode_api_signing.exceptions import VeracodeAPISigningException
-from veracode_api_signing.plugin_requests import RequestsAuthPluginVeracodeHMAC
-from veracode_api_signing.credentials import get_credentials
-from veracode_api_signing.regions import get_region_for_api_credential
 
+from . import instrumentation, jsondecode
+from .credentials import CredentialContext, CredentialsCache
 from .exceptions import VeracodeAPIError
 from .log import VeracodeLog as vlog
+from .multipart import MultipartEncoder
+from .ratelimit import RateLimiter, RETRY_STATUS_CODES, parse_retry_after
+from .scheduler import RetryScheduler, XMLRetryPolicy
+from .singleflight import SingleFlight
 from .constants import Constants
 
 logger = logging.getLogger(__name__)
 
+# set while an asyncapi.AsyncVeracodeAPI call runs, to send its requests through an AsyncAPIHelper on the event loop
+_async_transport = contextvars.ContextVar('veracode_api_async_transport', default=None)
+
+
+class SessionPool():
+    """Process-wide requests.Session shared by every APIHelper, so that connections to the Veracode
+    API hosts are kept alive and reused across calls instead of paying a new TCP and TLS handshake each time.
+    The underlying urllib3 connection pools are thread-safe."""
+    pool_connections = 10 # number of hosts for which a connection pool is kept
+    pool_maxsize = 10 # number of connections kept alive per host
+    pool_block = False # if True, wait for a free connection instead of opening one beyond pool_maxsize
+    xml_max_retries = 3
+
+    _session = None
+    _lock = threading.Lock()
+
+    @classmethod
+    def get(cls):
+        session = cls._session
+        if session is None:
+            with cls._lock:
+                if cls._session is None:
+                    cls._session = cls._new_session()
+                session = cls._session
+        return session
+
+    @classmethod
+    def configure(cls, pool_connections: int=None, pool_maxsize: int=None, pool_block: bool=None):
+        """Changes the pool sizes. Connections already open in the previous session are released once
+        requests in flight complete."""
+        with cls._lock:
+            if pool_connections is not None:
+                cls.pool_connections = pool_connections
+            if pool_maxsize is not None:
+                cls.pool_maxsize = pool_maxsize
+            if pool_block is not None:
+                cls.pool_block = pool_block
+            cls._session = None
+
+    @classmethod
+    def close(cls):
+        with cls._lock:
+            session = cls._session
+            cls._session = None
+        if session is not None:
+            session.close()
+
+    @classmethod
+    def _new_session(cls):
+        session = requests.Session()
+        adapter = cls._new_adapter()
+        session.mount('https://', adapter)
+        session.mount('http://', adapter)
+        # XML APIs have always been retried on connection errors
+        for region in Constants.REGIONS.values():
+            session.mount(region['base_xml_url'], cls._new_adapter(max_retries=cls.xml_max_retries))
+        return session
+
+    @classmethod
+    def _new_adapter(cls, max_retries=0):
+        return instrumentation.TimedHTTPAdapter(pool_connections=cls.pool_connections, pool_maxsize=cls.pool_maxsize,
+                                                max_retries=max_retries, pool_block=cls.pool_block)
+
 
 class APIHelper():
     api_key_id = None
     api_key_secret = None
     region = None
+    page_workers = 1 # threads used to fetch the remaining pages of a paged request
+    page_read_ahead = 2 # pages fetched ahead of the consumer of a paged iterator
+    response_cache = None # set to a cache.ResponseCache to cache slow-changing GET responses
+    coalesce_gets = False # if True, identical GETs made at the same time share one request
+    retry_policy = None # set to a scheduler.XMLRetryPolicy to use instead of the shared one
+
+    _in_flight = SingleFlight()
 
-    def __init__(self, debug=False):
+    def __init__(self, debug=False, profile=None):
+        if self.api_key_id is None or self.api_key_secret is None:
+            self.credentials = CredentialsCache.get(profile)
+        else:
+            # credentials set directly on the class take precedence over any profile
+            self.credentials = CredentialContext(self.api_key_id, self.api_key_secret, region=self.region)
+        self.api_key_id = self.credentials.api_key_id
+        self.api_key_secret = self.credentials.api_key_secret
+        self.region = self.credentials.region
         self.baseurl = self._get_baseurl()
         self.base_rest_url = self._get_baseresturl()
-        self.retry_seconds = 120
         self.connect_error_msg = "Connection Error"
         # vlog.setup_logging(self,debug=debug)
 
+    @property
+    def retry_seconds(self):
+        # deprecated: XML calls that are not ready are now retried as XMLRetryPolicy says
+        return self._retry_policy().initial
+
+    @retry_seconds.setter
+    def retry_seconds(self, seconds):
+        warnings.warn("APIHelper.retry_seconds is deprecated, set retry_policy or use XMLRetryPolicy.configure()",
+                      DeprecationWarning, stacklevel=2)
+        policy = self._retry_policy()
+        # every retry waits the same time, as it did when this was the only setting
+        self.retry_policy = XMLRetryPolicy(initial=seconds, maximum=seconds, max_wait=policy.max_wait)
+
     # helper functions
 
+    def _retry_policy(self):
+        return self.retry_policy or XMLRetryPolicy.get()
+
     def _get_baseurl(self):
         return self._get_region_url('xml')
 
@@ -39,29 +140,97 @@ class APIHelper():
         return self._get_region_url('rest')
 
     def _get_region_url(self, type):
-        if self.api_key_id is None or self.api_key_secret is None:
-            self.api_key_id, self.api_key_secret = get_credentials()
-        if self.region is None:
-            self.region = get_region_for_api_credential(self.api_key_id)
-
         if type == 'xml':
-            return Constants().REGIONS[self.region]['base_xml_url']
+            return self.credentials.base_xml_url
         elif type == 'rest':
-            return Constants().REGIONS[self.region]['base_rest_url']
+            return self.credentials.base_rest_url
 
     def _check_for_errors(self,theresponse, *args, **kwargs):
-        if theresponse.status_code in (429, 502, 503, 504):
-            # retry by populating new prepared request from the request in the response object
-            # and recalculating auth
-            logger.debug("Retrying request, error code {} received".format(theresponse.status_code))
-            session = requests.Session()
-            oldreq = theresponse.request
-            oldheaders = oldreq.headers
-            del oldheaders['authorization']
-            newreq = requests.Request(oldreq.method,oldreq.url,auth=RequestsAuthPluginVeracodeHMAC(),
-                                      headers=oldheaders)
-            return session.send(newreq.prepare())
-        
+        # response hook: retries throttled or unavailable responses with backoff, up to the rate limiter's
+        # max_attempts. Only GETs are retried on gateway errors, since other calls may have been processed
+        limiter = RateLimiter.get()
+        attempt = 1
+        while self._should_retry(theresponse) and attempt < limiter.max_attempts:
+            retry_after = parse_retry_after(theresponse.headers.get('Retry-After'))
+            if theresponse.status_code == 429:
+                limiter.throttled(retry_after, sent=time.monotonic() - theresponse.elapsed.total_seconds())
+            delay = limiter.backoff(attempt, retry_after)
+            logger.debug("Retrying request in {:.1f}s, error code {} received".format(delay, theresponse.status_code))
+            theresponse.close()
+            time.sleep(delay)
+
+            # resend a copy of the original request, re-signed since the signature includes a timestamp
+            newreq = theresponse.request.copy()
+            newreq.hooks = {'response': []}
+            if isinstance(newreq.body, MultipartEncoder):
+                newreq.body.seek(0)
+            del newreq.headers['authorization']
+            newreq = self.credentials.auth()(newreq)
+            limiter.acquire()
+            instrumentation.reset_connect_time()
+            theresponse = SessionPool.get().send(newreq, **kwargs)
+            attempt += 1
+
+        if theresponse.status_code != 429:
+            limiter.succeeded()
+        theresponse.veracode_retries = attempt - 1
+        return theresponse
+
+    def _should_retry(self, theresponse):
+        if theresponse.request.method == "GET":
+            return theresponse.status_code in RETRY_STATUS_CODES
+        return theresponse.status_code == 429
+
+    def _read_response(self, r, metrics):
+        # responses are streamed so that reading the body can be timed apart from the time to first byte
+        started = time.perf_counter()
+        r.content
+        if metrics is not None:
+            metrics.body = time.perf_counter() - started
+
+    def _finish_metrics(self, metrics, r=None, error=None, streamed=False):
+        # for a streamed response the body has not been read yet, so its size is taken from Content-Length
+        if metrics is None:
+            return
+        if r is not None:
+            metrics.connect = instrumentation.connect_time()
+            metrics.ttfb = max(0.0, r.elapsed.total_seconds() - metrics.connect)
+            metrics.retries = getattr(r, 'veracode_retries', 0)
+            metrics.bytes_out = instrumentation.request_size(r.request.body)
+            bytes_in = int(r.headers.get('Content-Length') or 0) if streamed else len(r.content or b'')
+            metrics.finish(r.status_code, r.headers, bytes_in)
+        else:
+            metrics.finish(error=error)
+        instrumentation.finish_request(metrics)
+
+    def _cache_lookup(self, url, params):
+        # returns the cache key, TTL and cached entry (or None) for a GET, or None if the endpoint is not cached
+        cache = self.response_cache
+        full_url = self._full_url(url, params)
+        ttl = cache.ttl(full_url)
+        if not ttl:
+            return None
+        key = cache.key(self.api_key_id, full_url)
+        return key, ttl, cache.lookup(key)
+
+    def _full_url(self, url, params):
+        prepared = requests.models.PreparedRequest()
+        prepared.prepare_url(url, params)
+        return prepared.url
+
+    def _decode_json(self, content):
+        # decodes straight from the response bytes; malformed JSON raises the same error as Response.json()
+        if not content:
+            return ""
+        try:
+            return jsondecode.loads(content)
+        except json.JSONDecodeError as e:
+            raise requests.exceptions.JSONDecodeError(e.msg, e.doc, e.pos) from e
+
+    def _take_page(self, page_data, element):
+        # moves the records out of a decoded page rather than copying them
+        return page_data.get('_embedded', {}).pop(element, [])
+
     def _prepare_headers(self,method,apifamily,files=False):
         headers = {"User-Agent": "api.py"}
         if method in ["POST", "PUT"] and apifamily=='json' and not(files):
@@ -75,35 +244,28 @@ class APIHelper():
         else:
             myheaders = self._prepare_headers(method,'json',files=True)
 
-        session = requests.Session()
-
         if use_base_url:
             url = self.base_rest_url + url
 
-        try:
-            if method == "GET":
-                request = requests.Request(method, url, params=params, auth=RequestsAuthPluginVeracodeHMAC(),
-                                           headers=myheaders,
-                                           hooks={'response': self._check_for_errors})
-                prepared_request = request.prepare()
-                r = session.send(prepared_request)
-            elif method == "POST":
-                if files is None:
-                    r = requests.post(url, params=params, auth=RequestsAuthPluginVeracodeHMAC(), headers=myheaders,
-                                  data=body)
-                else:
-                    r = requests.post(url, params=params, auth=RequestsAuthPluginVeracodeHMAC(), headers=myheaders,
-                                  data=body, files=files)
-            elif method == "PUT":
-                r = requests.put(url, params=params, auth=RequestsAuthPluginVeracodeHMAC(), headers=myheaders,
-                                 data=body)
-            elif method == "DELETE":
-                r = requests.delete(url, params=params, auth=RequestsAuthPluginVeracodeHMAC(), headers=myheaders)
-            else:
-                raise VeracodeAPIError("Unsupported HTTP method")
-        except requests.exceptions.RequestException as e:
-            logger.exception("Error: {}".format(self.connect_error_msg))
-            raise VeracodeAPIError(e.text) from e
+        if method not in ["GET", "POST", "PUT", "DELETE"]:
+            raise VeracodeAPIError("Unsupported HTTP method")
+
+        cached = None
+        if method == "GET" and self.response_cache is not None and not fullresponse:
+            cached = self._cache_lookup(url, params)
+        if cached is not None:
+            cache_key, ttl, entry = cached
+            if entry is not None:
+                if entry.is_fresh():
+                    return self._decode_json(entry.content)
+                myheaders.update(entry.validators())
+
+        if method == "GET" and self.coalesce_gets and not fullresponse:
+            # callers share the response, and each decodes its own copy of the body
+            key = (self.api_key_id, self._full_url(url, params), tuple(sorted(myheaders.items())))
+            r = self._in_flight.do(key, lambda: self._send_rest_request(url, method, params, body, files, myheaders))
+        else:
+            r = self._send_rest_request(url, method, params, body, files, myheaders)
 
         if r.status_code != requests.codes.ok:
             logger.debug("API call returned non-200 HTTP status code: {}".format(r.status_code))
@@ -125,49 +287,236 @@ class APIHelper():
                 re.request = r.request
                 raise re
 
+        if cached is not None:
+            if r.status_code == 304 and entry is not None:
+                self.response_cache.revalidated(cache_key, ttl, entry)
+                return self._decode_json(entry.content)
+            if r.status_code == 200:
+                self.response_cache.store(cache_key, ttl, r)
+
         if fullresponse:
             return r
-        elif r.text != "":
-            return r.json()
+        return self._decode_json(r.content)
+
+    def _send_rest_request(self, url, method, params, body, files, myheaders):
+        transport = _async_transport.get()
+        if transport is not None and files is None:
+            return transport.send(self.credentials, 'rest', method, url, params, body, myheaders)
+
+        session = SessionPool.get()
+        hooks = {'response': self._check_for_errors}
+        metrics = instrumentation.start_request('rest', method, url)
+
+        try:
+            RateLimiter.get().acquire()
+            if method == "GET":
+                request = requests.Request(method, url, params=params, auth=self.credentials.auth(),
+                                           headers=myheaders,
+                                           hooks=hooks)
+                prepared_request = request.prepare()
+                r = session.send(prepared_request, stream=True)
+            elif method == "POST":
+                if files is None:
+                    r = session.post(url, params=params, auth=self.credentials.auth(), headers=myheaders,
+                                  data=body, hooks=hooks, stream=True)
+                else:
+                    r = session.post(url, params=params, auth=self.credentials.auth(), headers=myheaders,
+                                  data=body, files=files, hooks=hooks, stream=True)
+            elif method == "PUT":
+                r = session.put(url, params=params, auth=self.credentials.auth(), headers=myheaders,
+                                 data=body, hooks=hooks, stream=True)
+            elif method == "DELETE":
+                r = session.delete(url, params=params, auth=self.credentials.auth(), headers=myheaders,
+                                   hooks=hooks, stream=True)
+            self._read_response(r, metrics)
+        except requests.exceptions.RequestException as e:
+            self._finish_metrics(metrics, error=e)
+            logger.exception("Error: {}".format(self.connect_error_msg))
+            raise VeracodeAPIError(e.text) from e
+        self._finish_metrics(metrics, r)
+        return r
+
+    def _rest_paged_request(self, uri, method, element, params=None,fullresponse=False,page_workers=None):
+        # once the first page has told us how many pages there are, the rest can be fetched
+        # concurrently on up to page_workers threads (APIHelper.page_workers by default)
+        if params is None:
+            params = {}
+        if page_workers is None:
+            page_workers = self.page_workers
+
+        params['page'] = 0
+        page_data = self._rest_request(uri, method, params)
+        total_pages = page_data.get('page', {}).get('total_pages', 0)
+
+        if total_pages <= 1:
+            if fullresponse:
+                return page_data
+            return self._take_page(page_data, element)
+
+        all_data = self._take_page(page_data, element)
+
+        if page_workers > 1:
+            page_params = [dict(params, page=page) for page in range(1, total_pages)]
+            with ThreadPoolExecutor(max_workers=min(page_workers, total_pages - 1)) as executor:
+                # each page is fetched in a copy of the caller's context, so that it is sent the same way
+                pages = [executor.submit(contextvars.copy_context().run, self._rest_request, uri, method, p)
+                         for p in page_params]
+                for page in pages:
+                    all_data.extend(self._take_page(page.result(), element))
         else:
-            return ""
+            for page in range(1, total_pages):
+                params['page'] = page
+                page_data = self._rest_request(uri, method, params)
+                all_data.extend(self._take_page(page_data, element))
+        return all_data
 
-    def _rest_paged_request(self, uri, method, element, params=None,fullresponse=False):
-        all_data = []
-        page = 0
-        more_pages = True
+    def _rest_paged_iter(self, uri, method, element, params=None, read_ahead=None):
+        # yields the records of a paged request as each page arrives. A background thread fetches
+        # up to read_ahead pages (APIHelper.page_read_ahead by default) ahead of the consumer,
+        # so memory use depends on the page size rather than on the total number of records
+        if params is None:
+            params = {}
+        if read_ahead is None:
+            read_ahead = self.page_read_ahead
 
-        while more_pages:
-            params['page'] = page
-            page_data = self._rest_request(uri, method, params)
-            total_pages = page_data.get('page', {}).get('total_pages', 0)
-            data_page = page_data.get('_embedded', {}).get(element, [])
-            all_data += data_page
+        if read_ahead < 1:
+            for data_page in self._rest_pages(uri, method, element, params):
+                yield from data_page
+            return
+
+        pages = queue.Queue(maxsize=read_ahead)
+        stop = threading.Event()
+
+        def put(item):
+            while not stop.is_set():
+                try:
+                    pages.put(item, timeout=0.1)
+                    return True
+                except queue.Full:
+                    pass
+            return False
+
+        def fetch():
+            try:
+                for data_page in self._rest_pages(uri, method, element, params):
+                    if not put(data_page):
+                        return
+            except Exception as e:
+                put(e)
+            put(None)
 
+        fetcher = threading.Thread(target=functools.partial(contextvars.copy_context().run, fetch),
+                                   name='veracode-api-pages', daemon=True)
+        fetcher.start()
+        try:
+            while True:
+                data_page = pages.get()
+                if data_page is None:
+                    break
+                if isinstance(data_page, Exception):
+                    raise data_page
+                yield from data_page
+        finally:
+            stop.set()
+
+    def _rest_pages(self, uri, method, element, params):
+        page = 0
+        total_pages = 1
+        while page < total_pages:
+            page_data = self._rest_request(uri, method, dict(params, page=page))
+            total_pages = page_data.get('page', {}).get('total_pages', 0)
+            yield self._take_page(page_data, element)
             page += 1
-            more_pages = page < total_pages
-        if page==1 and fullresponse:
-            return page_data    
-        else:
-            return all_data
 
     def _xml_request(self, url, method, params=None, files=None):
-        # base request method for XML APIs, handles what little error handling there is around these APIs
+        # base request method for XML APIs, handles what little error handling there is around these APIs.
+        # While the API answers 204 (not ready yet), the call is retried as XMLRetryPolicy says
+        content = self._xml_attempt(url, method, params, files)
+        if content is not None:
+            return content
+        future = Future()
+        self._schedule_xml_retry(future, url, method, params, files, 1, time.monotonic())
+        return future.result()
+
+    def _xml_request_future(self, url, method, params=None, files=None):
+        # same as _xml_request, but returns a concurrent.futures.Future straight away
+        future = Future()
+        RetryScheduler.get().call_later(0, functools.partial(contextvars.copy_context().run, self._xml_retry, future,
+                                                             url, method, params, files, 0, time.monotonic()))
+        return future
+
+    def _schedule_xml_retry(self, future, url, method, params, files, attempt, started):
+        policy = self._retry_policy()
+        delay = policy.delay(attempt)
+        waited = time.monotonic() - started
+        if policy.gives_up(waited, delay):
+            future.set_exception(VeracodeAPIError("{} was still not ready after {:.0f} seconds".format(url, waited)))
+            return
+        logger.debug("{} not ready, retrying in {:.0f}s".format(url, delay))
+        # retries run on scheduler threads, in the caller's context so that they are sent the same way
+        RetryScheduler.get().call_later(delay, functools.partial(contextvars.copy_context().run, self._xml_retry,
+                                                                 future, url, method, params, files, attempt, started))
+
+    def _xml_retry(self, future, url, method, params, files, attempt, started):
+        if future.cancelled():
+            return
+        try:
+            if attempt > 0:
+                self._rewind_files(files)
+            content = self._xml_attempt(url, method, params, files)
+        except Exception as e:
+            future.set_exception(e)
+            return
+        if content is not None:
+            future.set_result(content)
+        else:
+            self._schedule_xml_retry(future, url, method, params, files, attempt + 1, started)
+
+    def _rewind_files(self, files):
+        # the multipart body is built again from the file objects, so they must be read from the start
+        if isinstance(files, MultipartEncoder):
+            files.seek(0)
+            return
+        for value in (files or {}).values():
+            fileobj = value[1] if isinstance(value, tuple) else value
+            if hasattr(fileobj, 'seek'):
+                fileobj.seek(0)
+
+    def _xml_stream(self, url, method, params=None, headers=None):
+        # like _xml_request, but returns the response with its body unread, so that it can be parsed or saved
+        # as it arrives. headers are added to the request. The caller must close the response
+        policy = self._retry_policy()
+        started = time.monotonic()
+        attempt = 0
+        while True:
+            r = self._xml_attempt(url, method, params, None, stream=True, headers=headers)
+            if r is not None:
+                return r
+            attempt += 1
+            delay = policy.delay(attempt)
+            waited = time.monotonic() - started
+            if policy.gives_up(waited, delay):
+                raise VeracodeAPIError("{} was still not ready after {:.0f} seconds".format(url, waited))
+            time.sleep(delay)
+
+    def _xml_attempt(self, url, method, params, files, stream=False, headers=None):
+        # sends an XML API request once; returns the response body, or None if the API answered 204.
+        # files may be a MultipartEncoder, which is streamed as the body instead of being built in memory.
+        # With stream=True a successful response is returned with its body unread
         if method not in ["GET", "POST"]:
             raise VeracodeAPIError("Unsupported HTTP method")
 
         try:
-            session = requests.Session()
-            session.mount(self.baseurl, HTTPAdapter(max_retries=3))
-            request = requests.Request(method, url, params=params, files=files,
-                                       auth=RequestsAuthPluginVeracodeHMAC(), headers=self._prepare_headers(method,'xml'))
-            prepared_request = request.prepare()
-            r = session.send(prepared_request)
+            transport = _async_transport.get()
+            if transport is not None and files is None and headers is None and not stream:
+                r = transport.send(self.credentials, 'xml', method, url, params)
+            else:
+                r = self._send_xml_attempt(url, method, params, files, stream, headers)
+            if stream and 200 <= r.status_code <= 299 and r.status_code != 204:
+                return r
             if 200 <= r.status_code <= 299:
                 if r.status_code == 204:
-                    # retry after wait
-                    time.sleep(self.retry_seconds)
-                    return self._xml_request(url,method,params)
+                    return None
                 elif r.content is None:
                     logger.debug("HTTP response body empty:\r\n{}\r\n{}\r\n{}\r\n\r\n{}\r\n{}\r\n{}\r\n"
                                  .format(r.request.url, r.request.headers, r.request.body, r.status_code, r.headers,
@@ -183,3 +532,27 @@ class APIHelper():
         except requests.exceptions.RequestException as e:
             logger.exception("Connection error")
             raise VeracodeAPIError(e)
+
+    def _send_xml_attempt(self, url, method, params, files, stream, headers):
+        session = SessionPool.get()
+        headers = dict(self._prepare_headers(method,'xml'), **(headers or {}))
+        data = None
+        if isinstance(files, MultipartEncoder):
+            files, data = None, files
+            headers['Content-Type'] = data.content_type
+        request = requests.Request(method, url, params=params, data=data, files=files,
+                                   auth=self.credentials.auth(), headers=headers,
+                                   hooks={'response': self._check_for_errors})
+        prepared_request = request.prepare()
+        metrics = instrumentation.start_request('xml', method, url)
+        RateLimiter.get().acquire()
+        try:
+            r = session.send(prepared_request, stream=True)
+            streamed = stream and 200 <= r.status_code <= 299 and r.status_code != 204
+            if not streamed:
+                self._read_response(r, metrics)
+        except requests.exceptions.RequestException as e:
+            self._finish_metrics(metrics, error=e)
+            raise
+        self._finish_metrics(metrics, r, streamed=streamed)
+        return r
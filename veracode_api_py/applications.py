@@ -1,42 +1,98 @@
 #applications.py - API class for Applications API calls
 
 import json
+import threading
 from urllib import parse
 from uuid import UUID
 
 from .apihelper import APIHelper
 from .constants import Constants
 
-class Applications():    
-    def get_all(self,policy_check_after=None):
-        if policy_check_after == None:
-            params={}
-        else:
-            params={"policy_compliance_checked_after": policy_check_after}
+class LegacyIdMap():
+    """Maps legacy application ids, as used by the XML APIs, to application GUIDs and REST records.
+    load() fills it from one paged sweep of the Applications API, after which lookups need no API call."""
+    __slots__ = ('_apps', '_lock')
+
+    def __init__(self):
+        self._apps = {}
+        self._lock = threading.Lock()
+
+    def load(self, policy_check_after=None):
+        for app in Applications().iter_all(policy_check_after=policy_check_after):
+            self.add(app)
+        return self
+
+    def add(self, app):
+        with self._lock:
+            self._apps[int(app['id'])] = app
+
+    def guid(self, legacy_id: int):
+        app = self._apps.get(int(legacy_id))
+        return app['guid'] if app is not None else None
+
+    def app(self, legacy_id: int):
+        return self._apps.get(int(legacy_id))
+
+    def guids(self, legacy_ids):
+        """Returns a dict of legacy id to GUID for the given ids; ids not in the map are left out."""
+        apps = self._apps
+        return {legacy_id: apps[int(legacy_id)]['guid'] for legacy_id in legacy_ids if int(legacy_id) in apps}
+
+    def __contains__(self, legacy_id):
+        return int(legacy_id) in self._apps
+
+    def __len__(self):
+        return len(self._apps)
+
+
+class Applications():
+    legacy_id_map = None # set to a LegacyIdMap to answer get(legacy_id=...) from it once an id is known
 
-        return APIHelper()._rest_paged_request('appsec/v1/applications',"GET", params=params, 
+    def get_all(self,policy_check_after=None):
+        return APIHelper()._rest_paged_request('appsec/v1/applications',"GET", params=self._get_all_params(policy_check_after), 
                                                 element="applications")
 
+    def iter_all(self,policy_check_after=None):
+        return APIHelper()._rest_paged_iter('appsec/v1/applications',"GET", params=self._get_all_params(policy_check_after),
+                                             element="applications")
+
     def get (self,guid: UUID=None,legacy_id: int=None):
         """Gets a single applications in the current customer account using the Veracode Application API."""
         if legacy_id == None:
             apps_base_uri = "appsec/v1/applications" + "/{}"
             uri = apps_base_uri.format(guid)
-        else:
-            apps_base_uri = "appsec/v1/applications?legacy_id={}"
-            uri = apps_base_uri.format(legacy_id)
-
-        return APIHelper()._rest_request(uri,"GET")
+            return APIHelper()._rest_request(uri,"GET")
+
+        legacy_ids = self.legacy_id_map
+        if legacy_ids is not None and legacy_id in legacy_ids:
+            # same shape as the API's answer for a legacy_id query
+            return {'_embedded': {'applications': [legacy_ids.app(legacy_id)]},
+                    'page': {'size': 1, 'total_elements': 1, 'total_pages': 1, 'number': 0}}
+        apps_base_uri = "appsec/v1/applications?legacy_id={}"
+        uri = apps_base_uri.format(legacy_id)
+        response = APIHelper()._rest_request(uri,"GET")
+        if legacy_ids is not None:
+            for app in response.get('_embedded', {}).get('applications', []):
+                legacy_ids.add(app)
+        return response
 
     def get_by_name (self,appname: str):
         """Gets a list of applications having a name that matches appname, using the Veracode Applications API."""
         params = {"name": parse.quote(appname)}
         return APIHelper()._rest_paged_request(uri="appsec/v1/applications",method="GET",element="applications",params=params)
 
+    def iter_by_name (self,appname: str):
+        params = {"name": parse.quote(appname)}
+        return APIHelper()._rest_paged_iter(uri="appsec/v1/applications",method="GET",element="applications",params=params)
+
     def get_by_repo (self,git_repo_url: str):
         """Gets a list of applications having a name that matches appname, using the Veracode Applications API."""
         params = {"git_repo_url": parse.quote(git_repo_url)}
         return APIHelper()._rest_paged_request(uri="appsec/v1/applications",method="GET",element="applications",params=params)
+
+    def iter_by_repo (self,git_repo_url: str):
+        params = {"git_repo_url": parse.quote(git_repo_url)}
+        return APIHelper()._rest_paged_iter(uri="appsec/v1/applications",method="GET",element="applications",params=params)
     
     def create(self,app_name:str ,business_criticality, description: str=None, business_unit: UUID=None, teams=[], policy_guid:UUID=None,
                 custom_fields=[], bus_owner_name=None, bus_owner_email=None, git_repo_url=None, custom_kms_alias: str=None, tags=None):
@@ -58,6 +114,12 @@ class Applications():
         uri = 'appsec/v1/applications/{}'.format(guid)
         return APIHelper()._rest_request(uri,'DELETE')
 
+    def _get_all_params(self,policy_check_after):
+        if policy_check_after == None:
+            return {}
+        else:
+            return {"policy_compliance_checked_after": policy_check_after}
+
     def _create_or_update(self,method,app_name: str, business_criticality, description: str=None, business_unit: UUID=None, 
                           teams=[],guid=None,policy_guid:UUID=None, custom_fields=[],
                           bus_owner_name=None,bus_owner_email=None,git_repo_url=None,custom_kms_alias:str=None, tags=None):
@@ -120,6 +182,10 @@ class Sandboxes ():
         uri = 'appsec/v1/applications/{}/sandboxes'.format(guid)
         return APIHelper()._rest_paged_request(uri,'GET','sandboxes',request_params)
 
+    def iter_all(self,guid: UUID):
+        uri = 'appsec/v1/applications/{}/sandboxes'.format(guid)
+        return APIHelper()._rest_paged_iter(uri,'GET','sandboxes',{})
+
     def create(self, app: UUID, name: str, auto_recreate=False, custom_fields=[]):
         uri = 'appsec/v1/applications/{}/sandboxes'.format(app)
         sandbox_def = {'name': name, 'auto_recreate': auto_recreate}
@@ -0,0 +1,116 @@
+# asyncapi.py - asyncio version of the VeracodeAPI object
+
+import asyncio
+import contextvars
+import functools
+import inspect
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from requests.structures import CaseInsensitiveDict
+from requests.utils import get_encoding_from_headers
+
+from .api import VeracodeAPI
+from .apihelper import _async_transport
+from .asyncapihelper import AsyncAPIHelper, DEFAULT_MAX_CONCURRENCY
+from .credentials import CredentialsCache
+
+
+class AsyncVeracodeAPI:
+    """Exposes every VeracodeAPI method as a coroutine, so that one event loop can drive many calls at once.
+
+    The requests each method makes are sent by an AsyncAPIHelper on the event loop, at most max_concurrency
+    at a time; the method itself runs on a worker thread, which waits for them. Requests that upload files
+    or stream their response use the shared connection pool instead. An AsyncAPIHelper is created on the
+    first call for each set of credentials, so aiohttp is only needed once a call is made."""
+
+    def __init__(self, max_concurrency: int=DEFAULT_MAX_CONCURRENCY, profile=None):
+        self.max_concurrency = max_concurrency
+        self.profile = profile
+        self._api = VeracodeAPI()
+        self._helpers = {}
+        self._executor = None
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
+
+    async def close(self):
+        helpers, self._helpers = self._helpers, {}
+        for helper in helpers.values():
+            await helper.close()
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+            self._executor = None
+
+    @property
+    def helper(self):
+        """The AsyncAPIHelper for the credentials of profile, for sending requests directly on the event loop."""
+        return self._helper_for(CredentialsCache.get(self.profile))
+
+    def _helper_for(self, credentials):
+        key = (credentials.api_key_id, credentials.base_rest_url, credentials.base_xml_url)
+        helper = self._helpers.get(key)
+        if helper is None:
+            helper = self._helpers[key] = AsyncAPIHelper(max_concurrency=self.max_concurrency,
+                                                         credentials=credentials)
+        return helper
+
+    async def _run(self, method, *args, **kwargs):
+        loop = asyncio.get_running_loop()
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.max_concurrency, thread_name_prefix='veracode-api')
+        context = contextvars.copy_context()
+        call = functools.partial(context.run, self._call, _LoopTransport(self, loop), method, *args, **kwargs)
+        return await loop.run_in_executor(self._executor, call)
+
+    def _call(self, transport, method, *args, **kwargs):
+        # runs in a copy of the caller's context, so the transport is only seen by this call
+        _async_transport.set(transport)
+        if self.profile is None:
+            return method(self._api, *args, **kwargs)
+        with CredentialsCache.use_profile(self.profile):
+            return method(self._api, *args, **kwargs)
+
+
+class _LoopTransport():
+    # sends the requests of an APIHelper on a worker thread through an AsyncAPIHelper on the event loop,
+    # and hands back a requests.Response so that APIHelper handles the answer as it would its own
+
+    def __init__(self, facade, loop):
+        self._facade = facade
+        self._loop = loop
+
+    def send(self, credentials, apifamily, method, url, params=None, body=None, headers=None):
+        return asyncio.run_coroutine_threadsafe(
+            self._send(credentials, apifamily, method, url, params, body, headers), self._loop).result()
+
+    async def _send(self, credentials, apifamily, method, url, params, body, headers):
+        helper = self._facade._helper_for(credentials)
+        if apifamily == 'xml':
+            r = await helper._xml_attempt(url, method, params)
+        else:
+            r = await helper._send_rest_request(method, url, params, body, None, headers)
+        response = requests.Response()
+        response.status_code = r.status
+        response.reason = r.reason
+        response.headers = CaseInsensitiveDict(r.headers)
+        response.encoding = get_encoding_from_headers(response.headers)
+        response.url = str(r.url)
+        response._content = await r.read()
+        response.request = requests.Request(method, response.url, headers=headers).prepare()
+        return response
+
+
+def _async_method(method):
+    @functools.wraps(method)
+    async def call(self, *args, **kwargs):
+        return await self._run(method, *args, **kwargs)
+    return call
+
+
+for _name, _method in inspect.getmembers(VeracodeAPI, inspect.isfunction):
+    if not _name.startswith('_'):
+        setattr(AsyncVeracodeAPI, _name, _async_method(_method))
@@ -0,0 +1,267 @@
+# asyncapihelper.py - asyncio API class for making network calls
+
+import asyncio
+import logging
+import time
+
+from requests.models import PreparedRequest
+
+try:
+    import aiohttp
+    from yarl import URL
+except ImportError:
+    aiohttp = None
+
+from . import instrumentation, jsondecode
+from .credentials import CredentialsCache
+from .exceptions import VeracodeAPIError
+from .ratelimit import RateLimiter, RETRY_STATUS_CODES, parse_retry_after
+from .scheduler import XMLRetryPolicy
+from .singleflight import AsyncSingleFlight
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_CONCURRENCY = 100
+
+
+class AsyncAPIHelper():
+    """asyncio counterpart of APIHelper, built on aiohttp. Requests are signed with the same Veracode HMAC
+    scheme as RequestsAuthPluginVeracodeHMAC. At most max_concurrency requests are in flight at once.
+
+    Use as an async context manager, or call close() when done, to release pooled connections. credentials,
+    a CredentialContext, takes precedence over profile."""
+    coalesce_gets = False # if True, identical GETs made at the same time share one request
+
+    def __init__(self, max_concurrency: int=DEFAULT_MAX_CONCURRENCY, profile=None, credentials=None):
+        if aiohttp is None:
+            raise VeracodeAPIError("AsyncAPIHelper requires the aiohttp package (pip install veracode_api_py[async])")
+        self.credentials = credentials or CredentialsCache.get(profile)
+        self.baseurl = self.credentials.base_xml_url
+        self.base_rest_url = self.credentials.base_rest_url
+        self.max_concurrency = max_concurrency
+        self._session = None
+        self._semaphore = None
+        self._in_flight = AsyncSingleFlight()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
+
+    async def close(self):
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+    def _get_session(self):
+        # created lazily so that the session and semaphore belong to the running event loop
+        if self._session is None:
+            connector = aiohttp.TCPConnector(limit=self.max_concurrency)
+            trace_config = aiohttp.TraceConfig()
+            trace_config.on_connection_create_start.append(self._connection_create_start)
+            trace_config.on_connection_create_end.append(self._connection_create_end)
+            self._session = aiohttp.ClientSession(connector=connector, timeout=aiohttp.ClientTimeout(total=None),
+                                                  trace_configs=[trace_config])
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        return self._session
+
+    async def _connection_create_start(self, session, trace_config_ctx, params):
+        trace_config_ctx.connect_started = time.perf_counter()
+
+    async def _connection_create_end(self, session, trace_config_ctx, params):
+        metrics = trace_config_ctx.trace_request_ctx
+        if metrics is not None:
+            metrics.connect += time.perf_counter() - trace_config_ctx.connect_started
+
+    def _finish_metrics(self, metrics, r=None, content=b'', error=None):
+        if metrics is None:
+            return
+        if r is not None:
+            metrics.finish(r.status, r.headers, len(content))
+        else:
+            metrics.finish(error=error)
+        instrumentation.finish_request(metrics)
+
+    def _prepare_headers(self, method, apifamily, files=False):
+        headers = {"User-Agent": "api.py"}
+        if method in ["POST", "PUT"] and apifamily=='json' and not(files):
+            headers.update({'Content-type': 'application/json'})
+        return headers
+
+    def _prepare_data(self, body, files):
+        if files is None:
+            return body
+        form = aiohttp.FormData()
+        for name, value in files.items():
+            if isinstance(value, tuple):
+                filename, value = value[0], value[1]
+            else:
+                filename = getattr(value, 'name', name)
+            if hasattr(value, 'seek'):
+                value.seek(0)
+            form.add_field(name, value, filename=filename)
+        return form
+
+    async def _send(self, method, url, params=None, body=None, files=None, headers=None, metrics=None):
+        # encode the query string the same way requests does, so that the signed path is the one sent
+        prepared = PreparedRequest()
+        prepared.prepare_url(url, params)
+        signed_headers = dict(headers or {})
+        session = self._get_session()
+
+        limiter = RateLimiter.get()
+        async with self._semaphore:
+            attempt = 1
+            while True:
+                await asyncio.sleep(limiter.reserve())
+                signed_headers['Authorization'] = self.credentials.hmac_header(prepared.url, method)
+                if metrics is not None:
+                    metrics.connect = 0.0
+                    metrics.retries = attempt - 1
+                    metrics.bytes_out = instrumentation.request_size(body)
+                sent = time.perf_counter()
+                sent_at = time.monotonic()
+                # multipart bodies are rebuilt for each attempt because aiohttp consumes them
+                response = await session.request(method, URL(prepared.url, encoded=True),
+                                                 data=self._prepare_data(body, files), headers=signed_headers,
+                                                 trace_request_ctx=metrics)
+                received = time.perf_counter()
+                await response.read()
+                if metrics is not None:
+                    metrics.ttfb = max(0.0, received - sent - metrics.connect)
+                    metrics.body = time.perf_counter() - received
+                if not self._should_retry(method, response.status) or attempt >= limiter.max_attempts:
+                    break
+                retry_after = parse_retry_after(response.headers.get('Retry-After'))
+                if response.status == 429:
+                    limiter.throttled(retry_after, sent=sent_at)
+                delay = limiter.backoff(attempt, retry_after)
+                logger.debug("Retrying request in {:.1f}s, error code {} received".format(delay, response.status))
+                await asyncio.sleep(delay)
+                attempt += 1
+
+        if response.status != 429:
+            limiter.succeeded()
+        return response
+
+    def _should_retry(self, method, status):
+        # only GETs are retried on gateway errors, since other calls may have been processed
+        if method == "GET":
+            return status in RETRY_STATUS_CODES
+        return status == 429
+
+    async def _rest_request(self, url, method, params=None, body=None, fullresponse=False, use_base_url=True, files=None):
+        # base request method for a REST request
+        if method not in ["GET", "POST", "PUT", "DELETE"]:
+            raise VeracodeAPIError("Unsupported HTTP method")
+
+        myheaders = self._prepare_headers(method, 'json', files=files is not None)
+
+        if use_base_url:
+            url = self.base_rest_url + url
+
+        if method == "GET" and self.coalesce_gets and not fullresponse:
+            # callers share the response, and each decodes its own copy of the body
+            prepared = PreparedRequest()
+            prepared.prepare_url(url, params)
+            r = await self._in_flight.do((prepared.url, tuple(sorted(myheaders.items()))),
+                                         lambda: self._send_rest_request(method, url, params, body, files, myheaders))
+        else:
+            r = await self._send_rest_request(method, url, params, body, files, myheaders)
+
+        if not (200 <= r.status <= 299):
+            conv_id = r.headers.get('x-conversation-id', "Unknown")
+            logger.debug("Error retrieving data. HTTP status code: {}, conversation id {}".format(r.status, conv_id))
+            text = await r.text()
+            if r.status == 401:
+                logger.exception(
+                    "Error [{}]: {} for request {}. Check that your Veracode API account credentials are correct.".format(
+                        r.status, text, r.url))
+            else:
+                logger.exception("Error [{}]: {} for request {}".format(r.status, text, r.url))
+                raise VeracodeAPIError("HTTP error: {}, conversation id {}".format(r.status, conv_id))
+
+        if fullresponse:
+            return r
+        content = await r.read()
+        if content:
+            return jsondecode.loads(content)
+        return ""
+
+    async def _send_rest_request(self, method, url, params, body, files, myheaders):
+        metrics = instrumentation.start_request('rest', method, url)
+        try:
+            r = await self._send(method, url, params=params, body=body, files=files, headers=myheaders,
+                                 metrics=metrics)
+        except aiohttp.ClientError as e:
+            self._finish_metrics(metrics, error=e)
+            logger.exception("Error: Connection Error")
+            raise VeracodeAPIError(e) from e
+        self._finish_metrics(metrics, r, await r.read())
+        return r
+
+    async def _rest_paged_request(self, uri, method, element, params=None, fullresponse=False):
+        # the pages after the first are requested concurrently, within the concurrency cap
+        params = dict(params or {})
+
+        params['page'] = 0
+        page_data = await self._rest_request(uri, method, params)
+        total_pages = page_data.get('page', {}).get('total_pages', 0)
+
+        if total_pages <= 1:
+            if fullresponse:
+                return page_data
+            return page_data.get('_embedded', {}).pop(element, [])
+
+        all_data = page_data.get('_embedded', {}).pop(element, [])
+
+        pages = await asyncio.gather(*[self._rest_request(uri, method, dict(params, page=page))
+                                       for page in range(1, total_pages)])
+        for page_data in pages:
+            # records are moved out of each decoded page rather than copied
+            all_data.extend(page_data.get('_embedded', {}).pop(element, []))
+        return all_data
+
+    async def _xml_request(self, url, method, params=None, files=None):
+        # base request method for XML APIs, handles what little error handling there is around these APIs
+        if method not in ["GET", "POST"]:
+            raise VeracodeAPIError("Unsupported HTTP method")
+
+        policy = XMLRetryPolicy.get()
+        started = time.monotonic()
+        attempt = 0
+        while True:
+            r = await self._xml_attempt(url, method, params, files)
+            if r.status != 204:
+                break
+            # not ready yet, ask again after the policy's delay
+            attempt += 1
+            delay = policy.delay(attempt)
+            waited = time.monotonic() - started
+            if policy.gives_up(waited, delay):
+                raise VeracodeAPIError("{} was still not ready after {:.0f} seconds".format(url, waited))
+            await asyncio.sleep(delay)
+
+        content = await r.read()
+        if 200 <= r.status <= 299:
+            if content is None:
+                raise VeracodeAPIError("HTTP response body is empty")
+            return content
+        else:
+            logger.debug("HTTP error for request:\r\n{}\r\n{}\r\n{}\r\n{}\r\n"
+                         .format(r.url, r.status, r.headers, content))
+            raise VeracodeAPIError("HTTP error: {}".format(r.status))
+
+    async def _xml_attempt(self, url, method, params=None, files=None):
+        # sends an XML API request once and returns the response, with its body read
+        metrics = instrumentation.start_request('xml', method, url)
+        try:
+            r = await self._send(method, url, params=params, files=files,
+                                 headers=self._prepare_headers(method, 'xml'), metrics=metrics)
+        except aiohttp.ClientError as e:
+            self._finish_metrics(metrics, error=e)
+            logger.exception("Connection error")
+            raise VeracodeAPIError(e)
+        self._finish_metrics(metrics, r, await r.read())
+        return r
@@ -0,0 +1,223 @@
+# buildwatcher.py - waits for many builds at once from one poll loop
+
+import contextvars
+import functools
+import logging
+import queue
+import statistics
+import threading
+import time
+
+from .exceptions import VeracodeAPIError
+from .scheduler import RetryScheduler
+from .xmlapi import XMLAPI
+from .xmlresults import BuildInfo
+
+logger = logging.getLogger(__name__)
+
+DONE_STATUSES = ('Results Ready',)
+PRESCAN_FAILED_STATUSES = ('Pre-Scan Failed', 'Pre-Scan Canceled', 'No Modules Defined')
+FAILED_STATUSES = PRESCAN_FAILED_STATUSES + ('Scan Canceled', 'Vendor Reject', 'Scan Errors')
+SCANNING_STATUSES = ('Submitted to Engine', 'Scan In Process')
+# statuses a build can only have once its prescan has finished, whether it succeeded or not
+PRESCAN_DONE_STATUSES = ('Pre-Scan Success',) + SCANNING_STATUSES + DONE_STATUSES + FAILED_STATUSES
+
+
+class BuildEvent():
+    """A change in the status of a watched build. done is True once the build reached a done or failed
+    status, or gave up: failed is then True for a failed status, and error is set if polling gave up."""
+    __slots__ = ('app_id', 'sandbox_id', 'build_id', 'status', 'done', 'failed', 'error', 'polls', 'elapsed',
+                 'build_info')
+
+    def __init__(self, watched, build_info=None, done=False, failed=False, error=None):
+        self.app_id = watched.app_id
+        self.sandbox_id = watched.sandbox_id
+        self.build_id = build_info.build_id if build_info is not None else watched.build_id
+        self.status = watched.status
+        self.done = done
+        self.failed = failed
+        self.error = error
+        self.polls = watched.polls
+        self.elapsed = time.monotonic() - watched.started
+        self.build_info = build_info
+
+    def __repr__(self):
+        return 'BuildEvent(app_id={}, sandbox_id={}, status={!r}, done={})'.format(self.app_id, self.sandbox_id,
+                                                                                  self.status, self.done)
+
+
+class _Watched():
+    __slots__ = ('app_id', 'sandbox_id', 'build_id', 'expected_duration', 'status', 'interval', 'polls', 'errors',
+                 'started', 'scan_started', 'overdue', 'context')
+
+    def __init__(self, app_id, sandbox_id, build_id, expected_duration):
+        self.app_id = app_id
+        self.sandbox_id = sandbox_id
+        self.build_id = build_id
+        self.expected_duration = expected_duration
+        self.status = None
+        self.interval = None
+        self.polls = 0
+        self.errors = 0
+        self.started = None
+        self.scan_started = None
+        self.overdue = False
+        # polls run on scheduler threads, in the context of the caller of add() so that they use its profile
+        self.context = contextvars.copy_context()
+
+
+class BuildWatcher():
+    """Polls get_build_info for many builds from the shared RetryScheduler and reports them as they finish.
+
+    Each build has its own interval. It starts at min_interval when the status changes and grows by multiplier,
+    up to max_interval, while it stays the same. While a build is scanning, the watcher expects it to finish
+    after expected_duration seconds (given to add(), or else the median scan time of the builds it has seen
+    finish) and polls around that time more often. Polls that fail are retried until max_errors in a row;
+    a build still not done after timeout seconds is given up."""
+
+    def __init__(self, min_interval: float=15.0, max_interval: float=300.0, multiplier: float=1.5, timeout: float=None,
+                 done_statuses=DONE_STATUSES, failed_statuses=FAILED_STATUSES, max_errors: int=3):
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.multiplier = multiplier
+        self.timeout = timeout
+        self.done_statuses = done_statuses
+        self.failed_statuses = failed_statuses
+        self.max_errors = max_errors
+        self.polls = 0
+        self._watched = []
+        self._events = queue.Queue()
+        self._lock = threading.Lock()
+        self._active = 0
+        self._durations = []
+        self._include_changes = False
+        self._running = False
+        self._closed = False
+
+    def add(self, app_id: int, sandbox_id: int=None, build_id: int=None, expected_duration: float=None):
+        """Watches the latest build of an application or sandbox, or the build build_id."""
+        watched = _Watched(app_id, sandbox_id, build_id, expected_duration)
+        with self._lock:
+            self._watched.append(watched)
+            self._active += 1
+            running = self._running
+        if running:
+            self._start(watched)
+        return self
+
+    def events(self, include_changes: bool=False):
+        """Yields a BuildEvent for each build as it is done, in the order they finish. With include_changes,
+        also yields an event for every status change on the way. Stops polling if the loop is left early."""
+        self._include_changes = include_changes
+        with self._lock:
+            self._running = True
+            waiting = list(self._watched)
+        for watched in waiting:
+            self._start(watched)
+        try:
+            while True:
+                with self._lock:
+                    if self._active == 0 and self._events.empty():
+                        return
+                yield self._events.get()
+        finally:
+            self.close()
+
+    def wait(self):
+        """Waits for every build and returns their final BuildEvents, keyed by (app_id, sandbox_id)."""
+        return {(event.app_id, event.sandbox_id): event for event in self.events()}
+
+    def close(self):
+        self._closed = True
+
+    def expected_duration(self):
+        """The median time from the start of a scan to its end, over the builds seen finishing, or None."""
+        with self._lock:
+            return statistics.median(self._durations) if self._durations else None
+
+    def _start(self, watched):
+        watched.started = time.monotonic()
+        watched.interval = self.min_interval
+        self._schedule(watched, 0)
+
+    def _schedule(self, watched, delay):
+        RetryScheduler.get().call_later(delay, functools.partial(watched.context.run, self._poll, watched))
+
+    def _poll(self, watched):
+        if self._closed:
+            return
+        watched.polls += 1
+        with self._lock:
+            self.polls += 1
+        try:
+            future = XMLAPI(wait=False).get_build_info(watched.app_id, build_id=watched.build_id,
+                                                       sandbox_id=watched.sandbox_id)
+        except VeracodeAPIError as e:
+            self._poll_failed(watched, e)
+            return
+        future.add_done_callback(functools.partial(self._polled, watched))
+
+    def _polled(self, watched, future):
+        if self._closed:
+            return
+        try:
+            build_info = BuildInfo.from_xml(future.result())
+        except Exception as e:
+            self._poll_failed(watched, e)
+            return
+
+        watched.errors = 0
+        now = time.monotonic()
+        changed = build_info.status != watched.status
+        watched.status = build_info.status
+        if watched.scan_started is None and build_info.status in SCANNING_STATUSES:
+            watched.scan_started = now
+
+        if build_info.status in self.done_statuses or build_info.status in self.failed_statuses:
+            failed = build_info.status in self.failed_statuses
+            if watched.scan_started is not None and not failed:
+                with self._lock:
+                    self._durations.append(now - watched.scan_started)
+            self._finish(BuildEvent(watched, build_info, done=True, failed=failed))
+            return
+        if self.timeout is not None and now - watched.started >= self.timeout:
+            error = VeracodeAPIError("Build for app {} still has status {} after {:.0f} seconds"
+                                     .format(watched.app_id, watched.status, now - watched.started))
+            self._finish(BuildEvent(watched, build_info, done=True, error=error))
+            return
+        if changed and self._include_changes:
+            self._events.put(BuildEvent(watched, build_info))
+        self._schedule(watched, self._next_interval(watched, changed, now))
+
+    def _poll_failed(self, watched, error):
+        watched.errors += 1
+        if watched.errors >= self.max_errors:
+            self._finish(BuildEvent(watched, done=True, error=error))
+            return
+        logger.debug("Polling build info for app {} failed ({}), retrying".format(watched.app_id, error))
+        watched.interval = min(self.max_interval, watched.interval * self.multiplier)
+        self._schedule(watched, watched.interval)
+
+    def _next_interval(self, watched, changed, now):
+        if changed:
+            interval = self.min_interval
+        else:
+            interval = min(self.max_interval, watched.interval * self.multiplier)
+        expected = watched.expected_duration or self.expected_duration()
+        if watched.scan_started is not None and expected is not None:
+            remaining = watched.scan_started + expected - now
+            if remaining > 0:
+                # do not sleep past the expected end of the scan
+                interval = min(interval, max(self.min_interval, remaining))
+            elif not watched.overdue:
+                # the scan should be done by now: poll closely, then back off again
+                watched.overdue = True
+                interval = self.min_interval
+        watched.interval = interval
+        return interval
+
+    def _finish(self, event):
+        # under the lock, so that events() never sees the last event taken with _active not yet at 0
+        with self._lock:
+            self._active -= 1
+            self._events.put(event)
@@ -0,0 +1,168 @@
+# cache.py - opt-in response cache for slow-changing REST resources
+
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from os.path import expanduser
+
+from .instrumentation import endpoint_template
+
+# seconds a response stays fresh, by endpoint template. Endpoints not listed here are not cached
+DEFAULT_TTLS = {
+    'appsec/v1/cwes': 86400,
+    'appsec/v1/cwes/{}': 86400,
+    'appsec/v1/categories': 86400,
+    'appsec/v1/categories/{}': 86400,
+    'appsec/v1/policies': 3600,
+    'appsec/v1/policies/{}': 3600,
+    'appsec/v1/custom_fields': 3600,
+    'api/authn/v2/roles': 3600,
+    'api/authn/v2/roles/{}': 3600,
+    'api/authn/v2/permissions': 3600,
+    'api/authn/v2/permissions/{}': 3600,
+    'was/configservice/v1/configuration': 3600,
+}
+
+
+class CacheEntry():
+    """A cached response body with its expiry time (seconds since the epoch) and validators."""
+
+    def __init__(self, content: bytes, expires: float, etag: str=None, last_modified: str=None):
+        self.content = content
+        self.expires = expires
+        self.etag = etag
+        self.last_modified = last_modified
+
+    def is_fresh(self):
+        return time.time() < self.expires
+
+    def validators(self):
+        # headers for a conditional GET, empty if the API sent neither ETag nor Last-Modified
+        headers = {}
+        if self.etag is not None:
+            headers['If-None-Match'] = self.etag
+        if self.last_modified is not None:
+            headers['If-Modified-Since'] = self.last_modified
+        return headers
+
+
+class MemoryCacheBackend():
+    """Keeps up to max_entries responses in memory, evicting the least recently used."""
+
+    def __init__(self, max_entries: int=1024):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+            return entry
+
+    def set(self, key, entry: CacheEntry):
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+class DiskCacheBackend():
+    """Keeps up to max_entries responses in a SQLite file, evicting the least recently used.
+    Several processes can share the same file, for example consecutive CI jobs on one runner."""
+    default_path = os.path.join(expanduser("~"), '.veracode', 'api_cache.sqlite')
+
+    def __init__(self, path: str=None, max_entries: int=10000):
+        self.path = path or self.default_path
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        self._db = sqlite3.connect(self.path, timeout=30, check_same_thread=False, isolation_level=None)
+        self._db.execute('CREATE TABLE IF NOT EXISTS entries (key TEXT PRIMARY KEY, content BLOB, expires REAL, '
+                         'etag TEXT, last_modified TEXT, used REAL)')
+        self._db.execute('CREATE INDEX IF NOT EXISTS entries_used ON entries (used)')
+
+    def get(self, key):
+        with self._lock:
+            row = self._db.execute('SELECT content, expires, etag, last_modified FROM entries WHERE key = ?',
+                                   (key,)).fetchone()
+            if row is None:
+                return None
+            self._db.execute('UPDATE entries SET used = ? WHERE key = ?', (time.time(), key))
+        return CacheEntry(bytes(row[0]), row[1], row[2], row[3])
+
+    def set(self, key, entry: CacheEntry):
+        with self._lock:
+            self._db.execute('INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?, ?, ?)',
+                             (key, entry.content, entry.expires, entry.etag, entry.last_modified, time.time()))
+            excess = self._db.execute('SELECT COUNT(*) FROM entries').fetchone()[0] - self.max_entries
+            if excess > 0:
+                self._db.execute('DELETE FROM entries WHERE key IN '
+                                 '(SELECT key FROM entries ORDER BY used LIMIT ?)', (excess,))
+
+    def delete(self, key):
+        with self._lock:
+            self._db.execute('DELETE FROM entries WHERE key = ?', (key,))
+
+    def clear(self):
+        with self._lock:
+            self._db.execute('DELETE FROM entries')
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+
+class ResponseCache():
+    """Caches the bodies of successful REST GET responses for endpoints with a TTL. Fresh responses are
+    served without a network call; once stale, a response that had an ETag or Last-Modified header is
+    revalidated with a conditional GET, and a 304 answer renews it for another TTL.
+
+    Entries are keyed by API key id and full URL, so different credentials never share cached data.
+    ttls maps endpoint templates (see instrumentation.endpoint_template) to seconds and is merged over
+    DEFAULT_TTLS; default_ttl applies to every other endpoint, which are not cached by default."""
+
+    def __init__(self, backend=None, ttls: dict=None, default_ttl: float=None):
+        self.backend = backend if backend is not None else MemoryCacheBackend()
+        self.ttls = dict(DEFAULT_TTLS)
+        if ttls is not None:
+            self.ttls.update(ttls)
+        self.default_ttl = default_ttl
+
+    def ttl(self, url):
+        return self.ttls.get(endpoint_template(url), self.default_ttl)
+
+    def key(self, api_key_id, url):
+        return hashlib.sha256('{} {}'.format(api_key_id, url).encode('utf-8')).hexdigest()
+
+    def lookup(self, key):
+        return self.backend.get(key)
+
+    def store(self, key, ttl, response):
+        if 'no-store' in response.headers.get('Cache-Control', ''):
+            return
+        self.backend.set(key, CacheEntry(response.content, time.time() + ttl, response.headers.get('ETag'),
+                                         response.headers.get('Last-Modified')))
+
+    def revalidated(self, key, ttl, entry: CacheEntry):
+        entry.expires = time.time() + ttl
+        self.backend.set(key, entry)
+
+    def invalidate(self, api_key_id, url):
+        self.backend.delete(self.key(api_key_id, url))
+
+    def clear(self):
+        self.backend.clear()
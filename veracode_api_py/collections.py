@@ -31,6 +31,17 @@ class Collections():
       params = {"business_unit": parse.quote(business_unit_name)}
       return self._get_collections(params)
 
+   def iter_all(self):
+      return self._iter_collections({})
+
+   def iter_by_name(self,collection_name: str):
+      params = {"name": parse.quote(collection_name)}
+      return self._iter_collections(params)
+
+   def iter_by_business_unit(self,business_unit_name: str):
+      params = {"business_unit": parse.quote(business_unit_name)}
+      return self._iter_collections(params)
+
    def get_statistics(self):
       return APIHelper()._rest_request("appsec/v1/collections/statistics","GET")
 
@@ -42,6 +53,10 @@ class Collections():
       uri = "appsec/v1/collections/{}/assets".format(guid)
       return APIHelper()._rest_paged_request(uri,"GET","assets",params={})
 
+   def iter_assets(self,guid: UUID):
+      uri = "appsec/v1/collections/{}/assets".format(guid)
+      return APIHelper()._rest_paged_iter(uri,"GET","assets",params={})
+
    def create(self,name: str,description: str="",tags='',business_unit_guid: UUID=None,custom_fields=[],assets=[]):
       return self._create_or_update(method="CREATE",name=name,description=description,
                   tags=tags,business_unit_guid=business_unit_guid,custom_fields=custom_fields,assets=assets)
@@ -59,6 +74,9 @@ class Collections():
    def _get_collections(self,params):
       return APIHelper()._rest_paged_request("appsec/v1/collections","GET","collections",params=params)
 
+   def _iter_collections(self,params):
+      return APIHelper()._rest_paged_iter("appsec/v1/collections","GET","collections",params=params)
+
    def _create_or_update(self,method,name: str,description: str="",tags: str="",business_unit_guid: UUID=None,custom_fields=[],assets=[],guid: UUID=None):
       if method == 'CREATE':
          uri = 'appsec/v1/collections'
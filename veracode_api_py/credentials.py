@@ -0,0 +1,117 @@
+# credentials.py - resolved API credentials and region, cached per credentials profile
+
+import os
+import threading
+import configparser
+from contextlib import contextmanager
+from contextvars import ContextVar
+from os.path import expanduser
+
+from veracode_api_signing.credentials import get_credentials, ENV_API_KEY_NAME, ENV_API_SECRET_KEY_NAME, FIX_INSTRUCTIONS
+from veracode_api_signing.exceptions import VeracodeCredentialsError
+from veracode_api_signing.plugin_requests import RequestsAuthPluginVeracodeHMAC
+from veracode_api_signing.regions import get_region_for_api_credential
+from veracode_api_signing.utils import get_host_from_url, get_path_and_params_from_url
+from veracode_api_signing.validation import validate_api_key_id, validate_api_key_secret
+from veracode_api_signing.veracode_hmac_auth import generate_veracode_hmac_header
+
+from .constants import Constants
+
+_active_profile = ContextVar('veracode_api_profile', default=None)
+
+
+class CredentialContext():
+    """API credentials together with the region and base URLs they resolve to."""
+
+    def __init__(self, api_key_id, api_key_secret, region=None, profile=None, base_rest_url=None, base_xml_url=None):
+        self.profile = profile
+        self.api_key_id = api_key_id
+        self.api_key_secret = api_key_secret
+        if region is None:
+            region = get_region_for_api_credential(api_key_id)
+        self.region = region
+        self.base_rest_url = base_rest_url or Constants.REGIONS[region]['base_rest_url']
+        self.base_xml_url = base_xml_url or Constants.REGIONS[region]['base_xml_url']
+
+    def auth(self):
+        return RequestsAuthPluginVeracodeHMAC(api_key_id=self.api_key_id, api_key_secret=self.api_key_secret)
+
+    def hmac_header(self, url, method):
+        # same signature RequestsAuthPluginVeracodeHMAC puts on a requests.PreparedRequest, for other HTTP clients
+        validate_api_key_id(self.api_key_id)
+        validate_api_key_secret(self.api_key_secret)
+        return generate_veracode_hmac_header(get_host_from_url(url), get_path_and_params_from_url(url), method,
+                                             self.api_key_id, self.api_key_secret)
+
+
+class CredentialsCache():
+    """Resolves credentials once per profile and hands the same CredentialContext to every APIHelper.
+
+    Without a profile, credentials come from the environment or the profile named by VERACODE_API_PROFILE
+    in ~/.veracode/credentials, as in veracode-api-signing. A named profile is read from the credentials file."""
+    credentials_file = os.path.join(expanduser("~"), '.veracode', 'credentials')
+
+    _contexts = {}
+    _lock = threading.Lock()
+
+    @classmethod
+    def get(cls, profile: str=None):
+        if profile is None:
+            profile = _active_profile.get()
+        context = cls._contexts.get(profile)
+        if context is None:
+            with cls._lock:
+                context = cls._contexts.get(profile)
+                if context is None:
+                    context = cls._load(profile)
+                    cls._contexts[profile] = context
+        return context
+
+    @classmethod
+    def register(cls, profile: str, api_key_id: str, api_key_secret: str, region: str=None,
+                 base_rest_url: str=None, base_xml_url: str=None):
+        """Adds a profile from values held in memory instead of the credentials file."""
+        context = CredentialContext(api_key_id, api_key_secret, region=region, profile=profile,
+                                    base_rest_url=base_rest_url, base_xml_url=base_xml_url)
+        with cls._lock:
+            cls._contexts[profile] = context
+        return context
+
+    @classmethod
+    def invalidate(cls, profile: str=None):
+        """Forgets the resolved credentials for profile, or for all profiles if none is given,
+        so they are read again on the next API call."""
+        with cls._lock:
+            if profile is None:
+                cls._contexts.clear()
+            else:
+                cls._contexts.pop(profile, None)
+
+    @classmethod
+    @contextmanager
+    def use_profile(cls, profile: str):
+        """Makes API calls in this thread or task use profile until the block exits."""
+        token = _active_profile.set(profile)
+        try:
+            yield cls.get(profile)
+        finally:
+            _active_profile.reset(token)
+
+    @classmethod
+    def _load(cls, profile):
+        if profile is None:
+            api_key_id, api_key_secret = get_credentials()
+        else:
+            api_key_id, api_key_secret = cls._read_profile(profile)
+        return CredentialContext(api_key_id, api_key_secret, profile=profile)
+
+    @classmethod
+    def _read_profile(cls, profile):
+        config = configparser.ConfigParser()
+        try:
+            if not config.read(cls.credentials_file):
+                raise IOError("Could not read file: {}".format(cls.credentials_file))
+            return config.get(profile, ENV_API_KEY_NAME), config.get(profile, ENV_API_SECRET_KEY_NAME)
+        except (IOError, configparser.Error) as e:
+            raise VeracodeCredentialsError('Unable to get credentials for profile {} from {}: {}\n{}'
+                                           .format(profile, cls.credentials_file, e, FIX_INSTRUCTIONS))
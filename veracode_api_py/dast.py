@@ -17,7 +17,10 @@ class DASTTargets():
 
    def get_all(self):
       return APIHelper()._rest_paged_request(self.base_url, 'GET', element='targets',params={})
-   
+
+   def iter_all(self):
+      return APIHelper()._rest_paged_iter(self.base_url, 'GET', element='targets',params={})
+
    def get(self, target_id: UUID):
       uri = self.base_url + '/{}'.format(target_id)
       return APIHelper()._rest_request(uri, 'GET')
@@ -26,6 +29,22 @@ class DASTTargets():
       return self.search(target_name=target_name)
    
    def search(self, target_name=None, url=None, search_term=None, target_type=None):
+      params = self._search_params(target_name, url, search_term, target_type)
+
+      if params == {}:
+         return {}
+
+      return APIHelper()._rest_paged_request(self.base_url, 'GET', element='targets',params=params)
+
+   def iter_search(self, target_name=None, url=None, search_term=None, target_type=None):
+      params = self._search_params(target_name, url, search_term, target_type)
+
+      if params == {}:
+         return iter(())
+
+      return APIHelper()._rest_paged_iter(self.base_url, 'GET', element='targets',params=params)
+
+   def _search_params(self, target_name, url, search_term, target_type):
       # do null checks and construct the parameters
       params = {}
 
@@ -43,10 +62,7 @@ class DASTTargets():
             raise ValueError("{} is not in the list of valid target types ({})".format(target_type,Constants().DAST_TARGET_TYPE))
          params['target_type'] = target_type
 
-      if params == {}:
-         return {}
-
-      return APIHelper()._rest_paged_request(self.base_url, 'GET', element='targets',params=params)
+      return params
    
    def create(self, name, description, protocol, url='', api_specification_file_url='', target_type='WEB_APP',
               scan_type='QUICK',is_sec_lead_only=False,teams=[]):
@@ -102,6 +118,14 @@ class DASTAnalysisProfiles():
    base_url = ROOT_URL + '/analysis_profiles'
    
    def get_all(self, target_id: UUID=None, type=None):
+      params = self._get_all_params(target_id, type)
+      return APIHelper()._rest_paged_request(self.base_url,"GET",'analysis_profiles',params=params)
+
+   def iter_all(self, target_id: UUID=None, type=None):
+      params = self._get_all_params(target_id, type)
+      return APIHelper()._rest_paged_iter(self.base_url,"GET",'analysis_profiles',params=params)
+
+   def _get_all_params(self, target_id: UUID=None, type=None):
       params = {}
 
       if type != None:
@@ -112,7 +136,7 @@ class DASTAnalysisProfiles():
       if target_id != None:
          params['target_id'] = target_id
 
-      return APIHelper()._rest_paged_request(self.base_url,"GET",'analysis_profiles',params=params)
+      return params
 
    def get(self,analysis_profile_id: UUID):
       uri = '{}/{}'.format(self.base_url,analysis_profile_id)
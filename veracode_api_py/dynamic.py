@@ -29,6 +29,21 @@ class Analyses():
       params = {"search_term": parse.quote(search_term)}
       return self._get_analyses(params)
 
+   def iter_all(self):
+      return self._iter_analyses({})
+
+   def iter_by_name(self,analysis_name: str):
+      params = {"name": parse.quote(analysis_name)}
+      return self._iter_analyses(params)
+
+   def iter_by_target_url(self,target_url):
+      params = {"target_url": target_url}
+      return self._iter_analyses(params)
+
+   def iter_by_search_term(self,search_term: str):
+      params = {"search_term": parse.quote(search_term)}
+      return self._iter_analyses(params)
+
    def get(self,guid: UUID):
       uri = self.base_url + "/{}".format(guid)
       return APIHelper()._rest_request(uri,"GET")
@@ -37,6 +52,10 @@ class Analyses():
       uri = self.base_url + "/{}/audits".format(guid)
       return APIHelper()._rest_paged_request(uri,"GET",'analysis_audits',{'page':0})
 
+   def iter_audits(self,guid: UUID):
+      uri = self.base_url + "/{}/audits".format(guid)
+      return APIHelper()._rest_paged_iter(uri,"GET",'analysis_audits',{'page':0})
+
    def create_scan(self,guid: UUID):
       uri = self.base_url + '/{}/scans'.format(guid)
       payload = {} #TODO add code for all the scan values
@@ -46,6 +65,10 @@ class Analyses():
       uri = self.base_url + "/{}/scans".format(guid)
       return APIHelper()._rest_paged_request(uri,"GET",'scans',{'page': 0})
 
+   def iter_scans(self,guid: UUID):
+      uri = self.base_url + "/{}/scans".format(guid)
+      return APIHelper()._rest_paged_iter(uri,"GET",'scans',{'page': 0})
+
    def create(self,name: str,scans,start_scan=None,business_unit_guid: UUID=None,email=None,owner: str=None):
       # basic create that adds only metadata. Use Scans().setup() to create a Scans object
       return self._create_or_update(method="CREATE",name=name,scans=scans,
@@ -59,6 +82,10 @@ class Analyses():
       uri = self.base_url + "/{}/scanner_variables".format(guid)
       return APIHelper()._rest_paged_request(uri,"GET", 'scanner_variables', {'page': 0})
 
+   def iter_scanner_variables(self,guid: UUID):
+      uri = self.base_url + "/{}/scanner_variables".format(guid)
+      return APIHelper()._rest_paged_iter(uri,"GET", 'scanner_variables', {'page': 0})
+
    def update_scanner_variable(self,analysis_guid: UUID,scanner_variable_guid: UUID,reference_key: str,value: str,description: str):
       uri = self.base_url + '/{}/scanner_variables/{}'.format(analysis_guid,scanner_variable_guid)
       body = { 'reference_key': reference_key, 'value': value, 'description': description }
@@ -77,6 +104,9 @@ class Analyses():
    def _get_analyses(self,params):
       return APIHelper()._rest_paged_request(self.base_url,"GET","analyses",params=params)
 
+   def _iter_analyses(self,params):
+      return APIHelper()._rest_paged_iter(self.base_url,"GET","analyses",params=params)
+
    def _create_or_update(self,method,name: str,scans,start_scan=None,business_unit_guid: UUID=None,email=None,owner: str=None,guid: UUID=None):
       if method == 'CREATE':
          uri = self.base_url
@@ -113,6 +143,10 @@ class Scans():
       uri = self.base_url + "/{}/audits".format(guid)
       return APIHelper()._rest_paged_request(uri,"GET",'scan_audits',{'page':0})
 
+   def iter_audits(self, guid: UUID):
+      uri = self.base_url + "/{}/audits".format(guid)
+      return APIHelper()._rest_paged_iter(uri,"GET",'scan_audits',{'page':0})
+
    def get_configuration(self,guid: UUID):
       uri = self.base_url + "/{}/configuration".format(guid)
       return APIHelper()._rest_request(uri,"GET")
@@ -130,6 +164,10 @@ class Scans():
       uri = self.base_url + "/{}/scanner_variables".format(guid)
       return APIHelper()._rest_paged_request(uri,"GET",'scanner_variables',{'page': 0})
 
+   def iter_scanner_variables(self,guid: UUID):
+      uri = self.base_url + "/{}/scanner_variables".format(guid)
+      return APIHelper()._rest_paged_iter(uri,"GET",'scanner_variables',{'page': 0})
+
    def update_scanner_variable(self,scan_guid: UUID,scanner_variable_guid: UUID,reference_key: str,value: str,description: str):
       uri = self.base_url + '/{}/scanner_variables/{}'.format(scan_guid,scanner_variable_guid)
       body = { 'reference_key': reference_key, 'value': value, 'description': description }
@@ -145,6 +183,9 @@ class Occurrences():
    def get_all(self):
       return APIHelper()._rest_paged_request(self.base_url,'GET','analysis_occurrences',{'page':0})
 
+   def iter_all(self):
+      return APIHelper()._rest_paged_iter(self.base_url,'GET','analysis_occurrences',{'page':0})
+
    def get(self,guid: UUID):
       uri = self.base_url + '/{}'.format(guid)
       return APIHelper()._rest_request(uri, 'GET')
@@ -159,6 +200,10 @@ class Occurrences():
       uri = self.base_url + '/{}/scan_occurrences'.format(guid)
       return APIHelper()._rest_paged_request(uri, 'GET', 'scan_occurrences',{'page':0})
 
+   def iter_scan_occurrences(self,guid: UUID):
+      uri = self.base_url + '/{}/scan_occurrences'.format(guid)
+      return APIHelper()._rest_paged_iter(uri, 'GET', 'scan_occurrences',{'page':0})
+
 class ScanOccurrences():
    base_url = ROOT_URL + '/scan_occurrences'
 
@@ -210,6 +255,9 @@ class ScannerVariables():
    def get_all(self):
       return APIHelper()._rest_paged_request(self.base_url,"GET",'scanner_variables',{'page': 0})
 
+   def iter_all(self):
+      return APIHelper()._rest_paged_iter(self.base_url,"GET",'scanner_variables',{'page': 0})
+
    def create(self,reference_key: str,value: str,description: str):
       payload = {'reference_key':reference_key, 'value': value, 'description': description}
       return APIHelper()._rest_request(self.base_url,'POST',body=json.dumps(payload))
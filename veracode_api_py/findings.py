@@ -1,6 +1,7 @@
 #findings.py - API class for Findings API and related calls
 
 import json
+from bisect import bisect_left, bisect_right
 from uuid import UUID
 
 from .apihelper import APIHelper
@@ -11,6 +12,15 @@ class Findings():
     
     def get_findings(self,app: UUID,scantype='STATIC',annot='TRUE',request_params=None,sandbox: UUID=None):
         #Gets a list of  findings for app using the Veracode Findings API
+        uri, request_params = self._findings_request(app,scantype,annot,request_params,sandbox)
+        return APIHelper()._rest_paged_request(uri,"GET","findings",request_params)
+
+    def iter_findings(self,app: UUID,scantype='STATIC',annot='TRUE',request_params=None,sandbox: UUID=None):
+        #Yields the findings for app as each page arrives, instead of returning them all at once
+        uri, request_params = self._findings_request(app,scantype,annot,request_params,sandbox)
+        return APIHelper()._rest_paged_iter(uri,"GET","findings",request_params)
+
+    def _findings_request(self,app: UUID,scantype,annot,request_params,sandbox: UUID):
         if request_params == None:
             request_params = {}
         
@@ -31,7 +41,7 @@ class Findings():
             request_params['context'] = sandbox
         
         uri = "appsec/v2/applications/{}/findings".format(app)
-        return APIHelper()._rest_paged_request(uri,"GET","findings",request_params)
+        return uri, request_params
 
     def get_static_flaw_info(self,app: UUID,issueid: int,sandbox: UUID=None):
         if sandbox != None:
@@ -63,23 +73,18 @@ class Findings():
         payload = json.dumps(annotation_def)
         return APIHelper()._rest_request(uri,"POST",body=payload,params=params)
 
-    def match(self,origin_finding,potential_matches,approved_matches_only=True,allow_fuzzy_match=False):
-        # match a finding against an array of potential matches
-        match = None
-
-        if approved_matches_only:
-            potential_matches = self._filter_approved(potential_matches)
-
-        #flatten findings arrays to make processing easier
-        scan_type = origin_finding['scan_type']
-        of = self._create_match_format_policy(policy_findings=[origin_finding],finding_type=scan_type)
-        pm = self._create_match_format_policy(policy_findings=potential_matches,finding_type=scan_type)
+    def match(self,origin_finding,potential_matches,approved_matches_only=True,allow_fuzzy_match=False,slop: int=LINE_NUMBER_SLOP):
+        # match a finding against an array of potential matches. To match many findings against the same
+        # potential matches, use FindingMatcher, which indexes them once
+        matcher = FindingMatcher(potential_matches,approved_matches_only=approved_matches_only,
+                                 allow_fuzzy_match=allow_fuzzy_match,slop=slop)
+        return matcher.match(origin_finding)
 
-        if scan_type == 'STATIC':
-            match = self._match_static (of[0], pm, allow_fuzzy_match)
-        elif scan_type == 'DYNAMIC':
-            match = self._match_dynamic (of[0], pm)
-        return match
+    def correlate(self,findings,baseline,allow_fuzzy_match=True,slop: int=LINE_NUMBER_SLOP):
+        # pair each of findings with at most one baseline finding, e.g. sandbox findings with policy findings
+        # or the findings of a build with those of the build before it. Unlike match(), two findings never
+        # share a baseline finding, and the pairing does not depend on list order
+        return FindingCorrelation(findings,baseline,allow_fuzzy_match=allow_fuzzy_match,slop=slop)
 
     def format_file_path(self,file_path):
         # special case - omit prefix for teamcity work directories, which look like this:
@@ -101,46 +106,6 @@ class Findings():
 
         return formatted_file_path
 
-    def _match_static(self,origin_finding,potential_matches,allow_fuzzy_match=False):
-        match = None
-        if origin_finding['source_file'] not in ('', None):
-            #attempt precise match first
-            match = next((pf for pf in potential_matches if ((origin_finding['cwe'] == int(pf['cwe'])) & 
-                (origin_finding['source_file'].find(pf['source_file']) > -1 ) & 
-                (origin_finding['line'] == pf['line'] ))), None)
-
-            if match is None and allow_fuzzy_match:
-                #then fall to fuzzy match
-                match = next((pf for pf in potential_matches if ((origin_finding['cwe'] == int(pf['cwe'])) & 
-                    (origin_finding['source_file'].find(pf['source_file']) > -1 ) & 
-                    ((origin_finding['line'] - LINE_NUMBER_SLOP) <= pf['line'] <= (origin_finding['line'] + LINE_NUMBER_SLOP)))), None)
-
-            if match is None:
-                #then fall to nondebug as a last resort
-                match = self._get_matched_static_finding_nondebug(origin_finding,potential_matches)
-        else:
-            # if we don't have source file info try matching on procedure and relative location
-            match = self._get_matched_static_finding_nondebug(origin_finding,potential_matches)
-
-        return match
-
-    def _get_matched_static_finding_nondebug(self,origin_finding, potential_findings):
-        match = None
-
-        match = next((pf for pf in potential_findings if ((origin_finding['cwe'] == int(pf['cwe'])) & 
-                    (origin_finding['procedure'].find(pf['procedure']) > -1 ) & 
-                    (origin_finding['relative_location'] == pf['relative_location'] ))), None)
-        return match
-
-    def _match_dynamic (self, origin_finding, potential_matches):
-        match = None
-
-        match = next((pf for pf in potential_matches if ((origin_finding['cwe'] == int(pf['cwe'])) & 
-            (origin_finding['path'] == pf['path']) &
-            (origin_finding['vulnerable_parameter'] == pf['vulnerable_parameter']))), None)
-
-        return match
-
     def _filter_approved(self,findings):
         return [f for f in findings if (f['finding_status']['resolution_status'] == 'APPROVED')]
 
@@ -167,6 +132,268 @@ class Findings():
             findings.extend(thesefindings)
         return findings
 
+class FindingMatcher():
+    """Matches findings against one set of potential matches, for example sandbox findings against policy
+    findings. The potential matches are indexed once, so each match is a few lookups instead of a scan.
+
+    Static findings are indexed by (cwe, source file), each with its lines sorted, so that the lines within
+    slop of the origin finding are found by binary search; a potential match qualifies if its source file is
+    a trailing part of the origin's path, e.g. com/a/Foo.java for src/main/java/com/a/Foo.java. Static findings
+    without source file information are matched by (cwe, relative_location) and procedure, dynamic findings by
+    (cwe, path, vulnerable_parameter). Where several potential matches qualify, the first in the list is returned,
+    as Findings().match() does."""
+
+    def __init__(self,potential_matches,approved_matches_only=True,allow_fuzzy_match=False,slop: int=LINE_NUMBER_SLOP):
+        findings = Findings()
+        if approved_matches_only:
+            potential_matches = findings._filter_approved(potential_matches)
+        self.allow_fuzzy_match = allow_fuzzy_match
+        self.slop = slop
+        self._by_file = {}
+        self._lines = {}
+        self._by_location = {}
+        self._without_line = {}
+        self._by_path = {}
+
+        static = [pf for pf in potential_matches if pf.get('scan_type', 'STATIC') == 'STATIC']
+        for position, pf in enumerate(findings._create_match_format_policy(policy_findings=static,finding_type='STATIC')):
+            cwe = int(pf['cwe'])
+            if pf['line'] is not None:
+                key = (cwe, self._normalize(pf['source_file']))
+                self._by_file.setdefault(key, []).append((pf['line'], position, pf))
+            self._by_location.setdefault((cwe, pf['relative_location']), []).append((position, pf))
+            if pf['line'] is None:
+                self._without_line.setdefault((cwe, pf['relative_location']), []).append((position, pf))
+        for key, entries in self._by_file.items():
+            entries.sort(key=lambda entry: entry[:2])
+            self._lines[key] = [entry[0] for entry in entries]
+
+        dynamic = [pf for pf in potential_matches if pf.get('scan_type', 'DYNAMIC') == 'DYNAMIC']
+        for pf in findings._create_match_format_policy(policy_findings=dynamic,finding_type='DYNAMIC'):
+            self._by_path.setdefault((int(pf['cwe']), pf['path'], pf['vulnerable_parameter']), []).append(pf)
+
+    def match(self,origin_finding,slop: int=None):
+        """Returns the match for origin_finding, in the format of Findings().match(), or None. slop is how
+        many lines a fuzzy match may be away from the origin finding; by default the matcher's slop."""
+        scan_type = origin_finding['scan_type']
+        of = Findings()._create_match_format_policy(policy_findings=[origin_finding],finding_type=scan_type)
+        if scan_type == 'STATIC':
+            return self._match_static(of[0], self.slop if slop is None else slop)
+        elif scan_type == 'DYNAMIC':
+            matches = self._by_path.get((int(of[0]['cwe']), of[0]['path'], of[0]['vulnerable_parameter']))
+            return matches[0] if matches else None
+        return None
+
+    def candidates(self,origin_finding,slop: int=None):
+        """Returns every potential match of origin_finding as (score, match) pairs, best first. A match on the
+        same line or dynamic key scores 3, a fuzzy match 1 to 2 depending on its distance in lines, and a match
+        on relative location and procedure, which is only looked for when one of the two findings has no line, 1."""
+        slop = self.slop if slop is None else slop
+        scan_type = origin_finding['scan_type']
+        of = Findings()._create_match_format_policy(policy_findings=[origin_finding],finding_type=scan_type)
+        scores = {}
+        if scan_type == 'STATIC':
+            of = of[0]
+            cwe = int(of['cwe'])
+            has_line = of['source_file'] not in ('', None) and of['line'] is not None
+            if has_line:
+                source_file = self._normalize(of['source_file'])
+                for line, position, pf in self._lines_within(cwe, source_file, of['line'],
+                                                             slop if self.allow_fuzzy_match else 0):
+                    distance = abs(line - of['line'])
+                    scores[position] = (3.0 if distance == 0 else 2.0 - distance / (slop + 1), pf)
+            #relative location and procedure only pair findings when one of them has no line
+            procedure = of['procedure'] or ''
+            by_location = self._without_line if has_line else self._by_location
+            for position, pf in by_location.get((cwe, of['relative_location']), ()):
+                if pf['procedure'] is not None and procedure.find(pf['procedure']) > -1:
+                    scores[position] = (1.0, pf)
+        elif scan_type == 'DYNAMIC':
+            for position, pf in enumerate(self._by_path.get((int(of[0]['cwe']), of[0]['path'],
+                                                              of[0]['vulnerable_parameter']), ())):
+                scores[position] = (3.0, pf)
+        return [scores[position] for position in sorted(scores, key=lambda position: (-scores[position][0], position))]
+
+    def match_all(self,origin_findings,slop: int=None):
+        """Returns a list with the match (or None) for each of origin_findings, in order."""
+        return [self.match(origin_finding, slop) for origin_finding in origin_findings]
+
+    def _match_static(self,origin_finding,slop):
+        cwe = int(origin_finding['cwe'])
+        source_file = origin_finding['source_file']
+        line = origin_finding['line']
+        if source_file not in ('', None) and line is not None:
+            #attempt precise match first, then fall to fuzzy match
+            source_file = self._normalize(source_file)
+            match = self._match_lines(cwe, source_file, line, 0)
+            if match is None and self.allow_fuzzy_match:
+                match = self._match_lines(cwe, source_file, line, slop)
+            if match is not None:
+                return match
+        #then fall to nondebug as a last resort
+        procedure = origin_finding['procedure'] or ''
+        for position, pf in self._by_location.get((cwe, origin_finding['relative_location']), ()):
+            if pf['procedure'] is not None and procedure.find(pf['procedure']) > -1:
+                return pf
+        return None
+
+    def _match_lines(self,cwe,source_file,line,slop):
+        # the earliest potential match, in list order, in a file that source_file ends with and within slop lines
+        best = None
+        for entry in self._lines_within(cwe, source_file, line, slop):
+            if best is None or entry[1] < best[1]:
+                best = entry
+        return best[2] if best is not None else None
+
+    def _lines_within(self,cwe,source_file,line,slop):
+        for suffix in self._suffixes(source_file):
+            lines = self._lines.get((cwe, suffix))
+            if lines is not None:
+                yield from self._by_file[(cwe, suffix)][bisect_left(lines, line - slop):bisect_right(lines, line + slop)]
+
+    @staticmethod
+    def _normalize(source_file):
+        source_file = (source_file or '').replace('\\', '/')
+        while source_file.startswith('./'):
+            source_file = source_file[2:]
+        return source_file.lstrip('/')
+
+    @staticmethod
+    def _suffixes(source_file):
+        # source_file and each trailing part of its path, down to the empty path of findings without a file
+        parts = source_file.split('/')
+        for start in range(len(parts)):
+            yield '/'.join(parts[start:])
+        yield ''
+
+class FindingCorrelation():
+    """Pairs findings with baseline findings one to one. Candidate pairs are scored as FindingMatcher.candidates()
+    does, and the pairing with the highest total score is chosen within each group of findings that share
+    candidates; groups larger than max_group findings on a side are paired greedily, best score first.
+    Findings of scan types other than STATIC and DYNAMIC are paired by scan type and issue id.
+
+    matched is a list of (finding, baseline_finding, score) tuples, new the findings with no baseline finding
+    and closed the baseline findings that no finding was paired with, each in the order of their list."""
+    max_group = 64
+
+    def __init__(self,findings,baseline,allow_fuzzy_match=True,slop: int=LINE_NUMBER_SLOP):
+        findings = list(findings)
+        baseline = list(baseline)
+        matcher = FindingMatcher(baseline,approved_matches_only=False,allow_fuzzy_match=allow_fuzzy_match,slop=slop)
+        positions = {id(finding): j for j, finding in enumerate(baseline)}
+        by_issue = {}
+        for j, finding in enumerate(baseline):
+            if finding.get('scan_type') not in ('STATIC', 'DYNAMIC'):
+                by_issue.setdefault((finding.get('scan_type'), finding.get('issue_id')), j)
+
+        edges = []
+        for i, finding in enumerate(findings):
+            if finding.get('scan_type') in ('STATIC', 'DYNAMIC'):
+                for score, pf in matcher.candidates(finding):
+                    edges.append((score, i, positions[id(pf['finding'])]))
+            else:
+                j = by_issue.get((finding.get('scan_type'), finding.get('issue_id')))
+                if j is not None:
+                    edges.append((3.0, i, j))
+
+        pairs = {}
+        for group in self._groups(edges):
+            pairs.update(self._assign(group))
+        self.matched = [(findings[i], baseline[pairs[i][0]], pairs[i][1]) for i in sorted(pairs)]
+        self.new = [finding for i, finding in enumerate(findings) if i not in pairs]
+        paired = {j for j, score in pairs.values()}
+        self.closed = [finding for j, finding in enumerate(baseline) if j not in paired]
+
+    def __repr__(self):
+        return 'FindingCorrelation({} matched, {} new, {} closed)'.format(len(self.matched), len(self.new),
+                                                                           len(self.closed))
+
+    def _groups(self,edges):
+        # connected groups of candidate pairs; findings in different groups cannot compete for a match
+        parent = {}
+
+        def find(node):
+            while parent.setdefault(node, node) != node:
+                parent[node] = parent[parent[node]]
+                node = parent[node]
+            return node
+
+        for score, i, j in edges:
+            parent[find(('f', i))] = find(('b', j))
+        groups = {}
+        for edge in edges:
+            groups.setdefault(find(('f', edge[1])), []).append(edge)
+        return groups.values()
+
+    def _assign(self,edges):
+        rows = sorted({i for score, i, j in edges})
+        columns = sorted({j for score, i, j in edges})
+        if len(edges) == 1 or max(len(rows), len(columns)) > self.max_group:
+            return self._assign_greedy(edges)
+        scores = {(i, j): score for score, i, j in edges}
+        transpose = len(rows) > len(columns)
+        if transpose:
+            rows, columns = columns, rows
+        cost = [[-scores.get((column, row) if transpose else (row, column), 0.0) for column in columns] for row in rows]
+        pairs = {}
+        for r, c in self._hungarian(cost).items():
+            i, j = (columns[c], rows[r]) if transpose else (rows[r], columns[c])
+            if (i, j) in scores:
+                pairs[i] = (j, scores[(i, j)])
+        return pairs
+
+    @staticmethod
+    def _assign_greedy(edges):
+        pairs = {}
+        taken = set()
+        for score, i, j in sorted(edges, key=lambda edge: (-edge[0], edge[1], edge[2])):
+            if i not in pairs and j not in taken:
+                pairs[i] = (j, score)
+                taken.add(j)
+        return pairs
+
+    @staticmethod
+    def _hungarian(cost):
+        # minimum cost assignment of every row to a distinct column, for no more rows than columns
+        n, m = len(cost), len(cost[0])
+        u = [0.0] * (n + 1)
+        v = [0.0] * (m + 1)
+        p = [0] * (m + 1)
+        way = [0] * (m + 1)
+        for row in range(1, n + 1):
+            p[0] = row
+            j0 = 0
+            minv = [float('inf')] * (m + 1)
+            used = [False] * (m + 1)
+            while True:
+                used[j0] = True
+                i0 = p[j0]
+                delta = float('inf')
+                j1 = 0
+                for j in range(1, m + 1):
+                    if not used[j]:
+                        current = cost[i0 - 1][j - 1] - u[i0] - v[j]
+                        if current < minv[j]:
+                            minv[j] = current
+                            way[j] = j0
+                        if minv[j] < delta:
+                            delta = minv[j]
+                            j1 = j
+                for j in range(m + 1):
+                    if used[j]:
+                        u[p[j]] += delta
+                        v[j] -= delta
+                    else:
+                        minv[j] -= delta
+                j0 = j1
+                if p[j0] == 0:
+                    break
+            while j0:
+                j1 = way[j0]
+                p[j0] = p[j1]
+                j0 = j1
+        return {p[j] - 1: j - 1 for j in range(1, m + 1) if p[j]}
+
 class SummaryReport():
     def get_summary_report(self,app: UUID,sandbox: UUID=None, build_id: int=None):
         uri = "appsec/v2/applications/{}/summary_report".format(app)
@@ -186,6 +413,12 @@ class ManualScans():
         params['application'] = appid
         uri = 'mpt/v1/scans'
         return APIHelper()._rest_paged_request(uri,"GET","scans",params=params)
+
+    def iter_for_app(self,appid: UUID):
+        params = {}
+        params['application'] = appid
+        uri = 'mpt/v1/scans'
+        return APIHelper()._rest_paged_iter(uri,"GET","scans",params=params)
     
     def get(self,scanid: int):
         uri = "mpt/v1/scans/{}".format(scanid)
@@ -196,12 +429,21 @@ class ManualScans():
         params = {}
         params['include_artifacts'] = include_artifacts
         return APIHelper()._rest_paged_request(uri,"GET","findings",params=params)
+
+    def iter_findings(self,scanid: int, include_artifacts=False):
+        uri = "mpt/v1/scans/{}/findings".format(scanid)
+        params = {}
+        params['include_artifacts'] = include_artifacts
+        return APIHelper()._rest_paged_iter(uri,"GET","findings",params=params)
     
 class CWEs():
     base_uri = 'appsec/v1/cwes'
     def get_all(self):
         params = {}
         return APIHelper()._rest_paged_request(self.base_uri,"GET","cwes", params=params)
+
+    def iter_all(self):
+        return APIHelper()._rest_paged_iter(self.base_uri,"GET","cwes", params={})
     
     def get(self,cwe_id: int):
         uri = '{}/{}'.format(self.base_uri, cwe_id)
@@ -212,6 +454,9 @@ class CWECategories():
     def get_all(self):
         params = {}
         return APIHelper()._rest_paged_request(self.base_uri,"GET", "categories", params=params)
+
+    def iter_all(self):
+        return APIHelper()._rest_paged_iter(self.base_uri,"GET", "categories", params={})
     
     def get(self,category_id: int):
         uri = '{}/{}'.format(self.base_uri, category_id)
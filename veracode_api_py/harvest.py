@@ -0,0 +1,258 @@
+# harvest.py - fetches the findings of many applications concurrently, with a resumable checkpoint
+
+import contextvars
+import json
+import logging
+import os
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from .applications import Sandboxes
+from .findings import Findings
+
+logger = logging.getLogger(__name__)
+
+
+def normalize_finding(finding, app_guid, sandbox_guid=None):
+    """Flattens a finding from the Findings API into a record with the same keys for every scan type.
+    The finding itself is kept under 'finding'."""
+    status = finding.get('finding_status') or {}
+    details = finding.get('finding_details') or {}
+    cwe = details.get('cwe') or {}
+    cve = details.get('cve') or {}
+    return {'app_guid': app_guid,
+            'sandbox_guid': sandbox_guid,
+            'issue_id': finding.get('issue_id'),
+            'scan_type': finding.get('scan_type'),
+            'cwe_id': cwe.get('id'),
+            'severity': details.get('severity'),
+            'status': status.get('status'),
+            'resolution': status.get('resolution'),
+            'resolution_status': status.get('resolution_status'),
+            'new': status.get('new'),
+            'violates_policy': finding.get('violates_policy'),
+            'first_found_date': status.get('first_found_date'),
+            'last_seen_date': status.get('last_seen_date'),
+            'file_path': details.get('file_path'),
+            'line': details.get('file_line_number'),
+            'module': details.get('module'),
+            'path': details.get('path') or details.get('url'),
+            'component_id': details.get('component_id'),
+            'cve': cve.get('name'),
+            'finding': finding}
+
+
+class HarvestCheckpoint():
+    """The targets a harvest has finished, kept as one line each in a text file so that an interrupted
+    harvest can be resumed. A line is written and flushed to disk as soon as a target is done."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._done = set()
+        if os.path.exists(path):
+            with open(path, 'r', encoding='utf-8') as f:
+                self._done.update(line.strip() for line in f if line.strip())
+        self._file = open(path, 'a', encoding='utf-8')
+
+    def add(self, key: str):
+        if key in self._done:
+            return
+        self._done.add(key)
+        self._file.write(key + '\n')
+        self._file.flush()
+        os.fsync(self._file.fileno())
+
+    def clear(self):
+        self._done.clear()
+        self._file.seek(0)
+        self._file.truncate()
+
+    def close(self):
+        self._file.close()
+
+    def __contains__(self, key):
+        return key in self._done
+
+    def __len__(self):
+        return len(self._done)
+
+
+class JSONLinesSink():
+    """A sink that appends each record to a file as one line of JSON."""
+
+    def __init__(self, path: str, keep_finding: bool=True):
+        self.keep_finding = keep_finding
+        self._file = open(path, 'a', encoding='utf-8')
+
+    def __call__(self, record):
+        if not self.keep_finding:
+            record = {key: value for key, value in record.items() if key != 'finding'}
+        self._file.write(json.dumps(record, default=str) + '\n')
+
+    def flush(self):
+        self._file.flush()
+        os.fsync(self._file.fileno())
+
+    def close(self):
+        self._file.close()
+
+
+class HarvestReport():
+    """What a harvest did. targets counts the targets harvested, skipped the targets, or whole applications,
+    skipped because the checkpoint has them. errors maps the key of each target that failed to its exception
+    ('app_guid:*' if the sandboxes of an application could not be listed); those targets are not checkpointed,
+    so they are fetched again on the next run."""
+
+    def __init__(self):
+        self.apps = 0
+        self.targets = 0
+        self.skipped = 0
+        self.records = 0
+        self.errors = {}
+        self.seconds = 0.0
+
+    def __repr__(self):
+        return 'HarvestReport({} targets, {} records, {} skipped, {} errors, {:.1f}s)'.format(
+            self.targets, self.records, self.skipped, len(self.errors), self.seconds)
+
+
+class FindingsHarvester():
+    """Fetches the findings of many applications, workers applications at a time, and passes each finding
+    to sink as a record from normalize_finding, as the pages arrive.
+
+    sink is called as sink(record) from the thread that calls run(), so it need not be thread-safe. If sink
+    has a flush() method, it is called before a target is checkpointed. A target is the policy findings
+    of an application, or the findings of one of its sandboxes; with sandboxes=True, every sandbox of each
+    application is harvested too. The keys of finished targets are added to checkpoint (a HarvestCheckpoint),
+    and targets already in it are skipped, so a harvest that stopped can be run again to resume it.
+    Records of a target that was in progress when it stopped are sent again.
+
+    All calls are made with the profile selected by the caller of run() and share the library's rate limiter."""
+
+    def __init__(self, sink, workers: int=8, scantype='ALL', annot='TRUE', request_params=None,
+                 sandboxes: bool=False, checkpoint: HarvestCheckpoint=None, batch_size: int=500):
+        self.sink = sink
+        self.workers = workers
+        self.scantype = scantype
+        self.annot = annot
+        self.request_params = request_params
+        self.sandboxes = sandboxes
+        self.checkpoint = checkpoint
+        self.batch_size = batch_size
+
+    def run(self, apps, progress=None):
+        """Harvests apps, an iterable of application guids or application dicts (from Applications().get_all()
+        or iter_all()), and returns a HarvestReport. progress, if given, is called as
+        progress(apps_done, apps_total)."""
+        guids = list(dict.fromkeys(app['guid'] if isinstance(app, dict) else str(app) for app in apps))
+        report = HarvestReport()
+        report.apps = len(guids)
+        started = time.perf_counter()
+        messages = queue.Queue(maxsize=self.workers * 4)
+        stop = threading.Event()
+        apps_done = 0
+
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            pending = set()
+            for guid in guids:
+                if self.sandboxes and self._done(guid, '*'):
+                    report.skipped += 1
+                    apps_done += 1
+                    continue
+                pending.add(guid)
+                # each application is harvested in a copy of the caller's context, so that it uses the same profile
+                executor.submit(contextvars.copy_context().run, self._harvest_app, guid, messages, stop)
+            try:
+                while pending:
+                    kind, key, value = messages.get()
+                    if kind == 'records':
+                        for record in value:
+                            self.sink(record)
+                        report.records += len(value)
+                    elif kind == 'done':
+                        self._flush()
+                        self._mark(key)
+                        report.targets += 1
+                    elif kind == 'skipped':
+                        report.skipped += 1
+                    elif kind == 'error':
+                        logger.warning("Harvesting findings for {} failed: {}".format(key, value))
+                        report.errors[key] = value
+                    elif kind == 'app':
+                        if self.sandboxes and not value:
+                            self._mark(self._key(key, '*'))
+                        pending.discard(key)
+                        apps_done += 1
+                        if progress is not None:
+                            progress(apps_done, report.apps)
+            finally:
+                stop.set()
+                self._flush()
+        report.seconds = time.perf_counter() - started
+        return report
+
+    def _harvest_app(self, app_guid, messages, stop):
+        if stop.is_set():
+            return
+        failed = False
+        try:
+            targets = [None]
+            if self.sandboxes:
+                targets.extend(sandbox['guid'] for sandbox in Sandboxes().iter_all(app_guid))
+            for sandbox_guid in targets:
+                if stop.is_set():
+                    failed = True
+                    break
+                failed = not self._harvest_target(app_guid, sandbox_guid, messages, stop) or failed
+        except Exception as e:
+            failed = True
+            self._put(messages, stop, ('error', self._key(app_guid, '*'), e))
+        self._put(messages, stop, ('app', app_guid, failed))
+
+    def _harvest_target(self, app_guid, sandbox_guid, messages, stop):
+        key = self._key(app_guid, sandbox_guid)
+        if self._done(app_guid, sandbox_guid):
+            return self._put(messages, stop, ('skipped', key, None))
+        try:
+            request_params = dict(self.request_params) if self.request_params else None
+            batch = []
+            for finding in Findings().iter_findings(app_guid, scantype=self.scantype, annot=self.annot,
+                                                    request_params=request_params, sandbox=sandbox_guid):
+                batch.append(normalize_finding(finding, app_guid, sandbox_guid))
+                if len(batch) >= self.batch_size:
+                    if not self._put(messages, stop, ('records', key, batch)):
+                        return False
+                    batch = []
+            if batch and not self._put(messages, stop, ('records', key, batch)):
+                return False
+        except Exception as e:
+            self._put(messages, stop, ('error', key, e))
+            return False
+        return self._put(messages, stop, ('done', key, None))
+
+    def _put(self, messages, stop, message):
+        # returns False if the harvest stopped before the message could be queued
+        while not stop.is_set():
+            try:
+                messages.put(message, timeout=0.1)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def _key(self, app_guid, sandbox_guid=None):
+        return app_guid if sandbox_guid is None else '{}:{}'.format(app_guid, sandbox_guid)
+
+    def _done(self, app_guid, sandbox_guid=None):
+        return self.checkpoint is not None and self._key(app_guid, sandbox_guid) in self.checkpoint
+
+    def _mark(self, key):
+        if self.checkpoint is not None:
+            self.checkpoint.add(key)
+
+    def _flush(self):
+        flush = getattr(self.sink, 'flush', None)
+        if flush is not None:
+            flush()
@@ -17,6 +17,11 @@ class Users():
       request_params = {'page': 0} #initialize the page request
       return APIHelper()._rest_paged_request(self.USER_URI,"GET","users",request_params)
 
+   def iter_all(self):
+      #Yields users using the Veracode Identity API        
+      request_params = {'page': 0} #initialize the page request
+      return APIHelper()._rest_paged_iter(self.USER_URI,"GET","users",request_params)
+
    def get_self (self):
       #Gets the user info for the current user, using the Veracode Identity API
       return APIHelper()._rest_request(self.USER_URI + "/self","GET")
@@ -31,7 +36,20 @@ class Users():
       request_params = {'user_name': parse.quote(username)} #initialize the page request
       return APIHelper()._rest_paged_request(self.USER_URI,"GET","users",request_params)
 
+   def iter_by_name(self,username):
+      #Yields all the users who match the provided email address, using the Veracode Identity API
+      request_params = {'user_name': parse.quote(username)} #initialize the page request
+      return APIHelper()._rest_paged_iter(self.USER_URI,"GET","users",request_params)
+
    def get_user_search(self,search_term: str=None, api_id: UUID=None, role_id: UUID=None, login_status=None, saml_user=None, team_id: UUID=None, detailed=False, user_type=None, request_params=None):
+      request_params = self._user_search_params(search_term, api_id, role_id, login_status, saml_user, team_id, detailed, user_type, request_params)
+      return APIHelper()._rest_paged_request(self.USER_URI + "/search","GET","users",request_params)
+
+   def iter_user_search(self,search_term: str=None, api_id: UUID=None, role_id: UUID=None, login_status=None, saml_user=None, team_id: UUID=None, detailed=False, user_type=None, request_params=None):
+      request_params = self._user_search_params(search_term, api_id, role_id, login_status, saml_user, team_id, detailed, user_type, request_params)
+      return APIHelper()._rest_paged_iter(self.USER_URI + "/search","GET","users",request_params)
+
+   def _user_search_params(self,search_term: str=None, api_id: UUID=None, role_id: UUID=None, login_status=None, saml_user=None, team_id: UUID=None, detailed=False, user_type=None, request_params=None):
       if request_params == None:
          request_params = {'detailed': detailed}
       
@@ -56,7 +74,7 @@ class Users():
       if user_type != None:
          request_params['user_type'] = user_type
          
-      return APIHelper()._rest_paged_request(self.USER_URI + "/search","GET","users",request_params)
+      return request_params
 
    def create(self,email,firstname: str,lastname: str,username: str=None,type="HUMAN",roles=[],teams=[],mfa=False, 
               ipRestricted=False, allowedIpAddresses=[],
@@ -156,6 +174,13 @@ class Teams():
          request_params.update({'all_for_org': True})
       return APIHelper()._rest_paged_request("api/authn/v2/teams","GET","teams",request_params)
 
+   def iter_by_name(self, team_name, all_for_org=False):
+      #Yields teams matching a team_name using the Veracode Identity API
+      request_params = {'team_name': parse.quote(team_name), 'page': 0}
+      if all_for_org:
+         request_params.update({'all_for_org': True})
+      return APIHelper()._rest_paged_iter("api/authn/v2/teams","GET","teams",request_params)
+
    def get_all(self, all_for_org=False):
       #Gets a list of teams using the Veracode Identity API       
       if all_for_org:
@@ -164,6 +189,14 @@ class Teams():
          request_params = {'page': 0} #initialize the page request
       return APIHelper()._rest_paged_request("api/authn/v2/teams","GET","teams",request_params)
 
+   def iter_all(self, all_for_org=False):
+      #Yields teams using the Veracode Identity API       
+      if all_for_org:
+         request_params = {'all_for_org': True}
+      else:
+         request_params = {'page': 0} #initialize the page request
+      return APIHelper()._rest_paged_iter("api/authn/v2/teams","GET","teams",request_params)
+
    def get(self, team_id):
       uri = "api/authn/v2/teams/{}".format(team_id)
       return APIHelper()._rest_request(uri,"GET")
@@ -220,10 +253,19 @@ class BusinessUnits():
       request_params = {'bu_name': parse.quote(bu_name), 'page': 0}
       return APIHelper()._rest_paged_request(self.base_uri,"GET","business_units",request_params)
 
+   def iter_by_name(self, bu_name):
+      #Yields business units matching a bu_name using the Veracode Identity API
+      request_params = {'bu_name': parse.quote(bu_name), 'page': 0}
+      return APIHelper()._rest_paged_iter(self.base_uri,"GET","business_units",request_params)
+
    def get_all(self):
       request_params = {'page': 0}
       return APIHelper()._rest_paged_request(self.base_uri,"GET","business_units",request_params)
 
+   def iter_all(self):
+      request_params = {'page': 0}
+      return APIHelper()._rest_paged_iter(self.base_uri,"GET","business_units",request_params)
+
    def get(self,guid: UUID):
       return APIHelper()._rest_request(self.base_uri + "/{}".format(guid),"GET")
 
@@ -276,6 +318,9 @@ class Roles():
    base_uri = "api/authn/v2/roles"
    def get_all(self):
       return APIHelper()._rest_paged_request(self.base_uri,"GET","roles",{'page':0})
+
+   def iter_all(self):
+      return APIHelper()._rest_paged_iter(self.base_uri,"GET","roles",{'page':0})
    
    def get(self, role_guid: UUID):
       return APIHelper()._rest_request("{}/{}".format(self.base_uri,role_guid),"GET")
@@ -327,6 +372,9 @@ class Permissions():
    base_uri = "api/authn/v2/permissions"
    def get_all(self):
       return APIHelper()._rest_paged_request( self.base_uri,"GET","permissions",{'page':0})
+
+   def iter_all(self):
+      return APIHelper()._rest_paged_iter( self.base_uri,"GET","permissions",{'page':0})
    
    def get(self, permission_guid: UUID):
       return APIHelper()._rest_request("{}/{}".format(self.base_uri,permission_guid),"GET")
@@ -0,0 +1,214 @@
+# instrumentation.py - per-call metrics and tracing hooks for Veracode API calls
+
+import re
+import threading
+import time
+from urllib.parse import urlsplit
+
+from requests.adapters import HTTPAdapter
+from urllib3.connection import HTTPConnection, HTTPSConnection
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+
+_ID_SEGMENT = re.compile(r'^(?:[0-9a-fA-F]{8}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{12}|\d+)$')
+_LONG_ID_SEGMENT = re.compile(r'^(?=.*\d)[\w:.\-]{16,}$')
+
+_hooks = []
+_hooks_lock = threading.Lock()
+_connect_timing = threading.local()
+
+
+def endpoint_template(url):
+    """Returns the path of url with GUIDs, numeric ids and other long identifiers replaced by {},
+    e.g. appsec/v2/applications/{}/findings. The query string is dropped."""
+    path = urlsplit(url).path.strip('/')
+    return '/'.join('{}' if _ID_SEGMENT.match(segment) or _LONG_ID_SEGMENT.match(segment) else segment
+                    for segment in path.split('/'))
+
+
+class RequestMetrics():
+    """Measurements for one REST or XML API call. Times are in seconds. latency covers the whole call,
+    including retries and the waits between them, while connect, ttfb and body split up the last attempt:
+    connect is 0 when a pooled connection was reused, ttfb runs from sending the request to the response headers."""
+
+    def __init__(self, api, method, url):
+        self.api = api # 'rest' or 'xml'
+        self.method = method
+        self.url = url.split('?')[0]
+        self.endpoint = endpoint_template(url)
+        self.status = None
+        self.bytes_out = 0
+        self.bytes_in = 0
+        self.connect = 0.0
+        self.ttfb = None
+        self.body = None
+        self.latency = None
+        self.retries = 0
+        self.conversation_id = None
+        self.error = None # the exception raised by the transport, if any
+        self.started = time.perf_counter()
+
+    def finish(self, status=None, headers=None, bytes_in=0, error=None):
+        self.latency = time.perf_counter() - self.started
+        self.status = status
+        self.bytes_in = bytes_in
+        self.error = error
+        if headers is not None:
+            self.conversation_id = headers.get('x-conversation-id')
+
+    def __repr__(self):
+        return '<RequestMetrics {} {} {} {:.3f}s>'.format(self.method, self.endpoint, self.status, self.latency or 0)
+
+
+class Instrumentation():
+    """Base class for instrumentation hooks. Subclass it, override either method and pass an instance
+    to add_instrumentation(). Hooks run on the thread (or event loop) making the call, so keep them quick."""
+
+    def request_started(self, metrics: RequestMetrics):
+        """Called before the request is sent; only method, url, endpoint and api are set."""
+        pass
+
+    def request_finished(self, metrics: RequestMetrics):
+        """Called once the response body has been read, or the call failed."""
+        pass
+
+
+class MetricsAggregator(Instrumentation):
+    """Keeps the latency of every call in memory and reports percentiles per endpoint."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stats = {}
+
+    def request_finished(self, metrics):
+        key = (metrics.method, metrics.endpoint)
+        with self._lock:
+            stats = self._stats.get(key)
+            if stats is None:
+                stats = self._stats[key] = {'latencies': [], 'errors': 0, 'retries': 0, 'bytes_in': 0,
+                                            'bytes_out': 0, 'connect': 0.0, 'ttfb': 0.0, 'body': 0.0}
+            stats['latencies'].append(metrics.latency)
+            stats['retries'] += metrics.retries
+            stats['bytes_in'] += metrics.bytes_in
+            stats['bytes_out'] += metrics.bytes_out
+            stats['connect'] += metrics.connect
+            stats['ttfb'] += metrics.ttfb or 0.0
+            stats['body'] += metrics.body or 0.0
+            if metrics.error is not None or metrics.status is None or metrics.status >= 400:
+                stats['errors'] += 1
+
+    def reset(self):
+        with self._lock:
+            self._stats = {}
+
+    def report(self):
+        """Returns one dict per method and endpoint, the endpoints taking the most total time first."""
+        with self._lock:
+            items = [(key, dict(stats, latencies=sorted(stats['latencies']))) for key, stats in self._stats.items()]
+        rows = []
+        for (method, endpoint), stats in items:
+            latencies = stats.pop('latencies')
+            count = len(latencies)
+            total = sum(latencies)
+            stats.update({'method': method, 'endpoint': endpoint, 'count': count, 'total': total,
+                          'mean': total / count, 'p50': _percentile(latencies, 50),
+                          'p95': _percentile(latencies, 95), 'p99': _percentile(latencies, 99),
+                          'max': latencies[-1]})
+            rows.append(stats)
+        rows.sort(key=lambda row: row['total'], reverse=True)
+        return rows
+
+    def format_report(self):
+        lines = ['{:<7}{:<60}{:>7}{:>9}{:>9}{:>9}{:>9}{:>8}{:>8}'.format(
+            'method', 'endpoint', 'count', 'total', 'p50', 'p95', 'p99', 'retries', 'errors')]
+        for row in self.report():
+            lines.append('{method:<7}{endpoint:<60}{count:>7}{total:>9.2f}{p50:>9.3f}{p95:>9.3f}{p99:>9.3f}'
+                         '{retries:>8}{errors:>8}'.format(**row))
+        return '\n'.join(lines)
+
+
+def _percentile(ordered, percent):
+    # nearest-rank percentile of an already sorted list
+    rank = max(1, -(-len(ordered) * percent // 100))
+    return ordered[int(rank) - 1]
+
+
+def add_instrumentation(hook: Instrumentation):
+    with _hooks_lock:
+        if hook not in _hooks:
+            _hooks.append(hook)
+    return hook
+
+
+def remove_instrumentation(hook: Instrumentation):
+    with _hooks_lock:
+        if hook in _hooks:
+            _hooks.remove(hook)
+
+
+def start_request(api, method, url):
+    """Returns a RequestMetrics for the call, or None when no hooks are registered."""
+    if not _hooks:
+        return None
+    metrics = RequestMetrics(api, method, url)
+    reset_connect_time()
+    for hook in list(_hooks):
+        hook.request_started(metrics)
+    return metrics
+
+
+def finish_request(metrics):
+    for hook in list(_hooks):
+        hook.request_finished(metrics)
+
+
+def reset_connect_time():
+    _connect_timing.seconds = 0.0
+
+
+def connect_time():
+    """Seconds spent opening connections on this thread since reset_connect_time()."""
+    return getattr(_connect_timing, 'seconds', 0.0)
+
+
+def request_size(body):
+    if body is None:
+        return 0
+    if isinstance(body, (bytes, str)):
+        return len(body)
+    if hasattr(body, 'read') and hasattr(body, '__len__'):
+        return len(body) # a streamed body that knows its size, such as a MultipartEncoder
+    return 0 # streamed bodies are counted by their producer
+
+
+class _TimedConnectMixin():
+    def connect(self):
+        start = time.perf_counter()
+        try:
+            super().connect()
+        finally:
+            _connect_timing.seconds = connect_time() + time.perf_counter() - start
+
+
+class _TimedHTTPConnection(_TimedConnectMixin, HTTPConnection):
+    pass
+
+
+class _TimedHTTPSConnection(_TimedConnectMixin, HTTPSConnection):
+    pass
+
+
+class _TimedHTTPConnectionPool(HTTPConnectionPool):
+    ConnectionCls = _TimedHTTPConnection
+
+
+class _TimedHTTPSConnectionPool(HTTPSConnectionPool):
+    ConnectionCls = _TimedHTTPSConnection
+
+
+class TimedHTTPAdapter(HTTPAdapter):
+    """HTTPAdapter whose connections record the time spent connecting (TCP and TLS handshakes)."""
+
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {'http': _TimedHTTPConnectionPool,
+                                                   'https': _TimedHTTPSConnectionPool}
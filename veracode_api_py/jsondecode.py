@@ -0,0 +1,44 @@
+# jsondecode.py - JSON decoding of API responses with the fastest decoder installed
+
+import json
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import ujson
+except ImportError:
+    ujson = None
+
+from .exceptions import VeracodeAPIError
+
+_decoders = {'stdlib': json.loads}
+if ujson is not None:
+    _decoders['ujson'] = ujson.loads
+if orjson is not None:
+    _decoders['orjson'] = orjson.loads
+
+backend = 'orjson' if orjson is not None else 'ujson' if ujson is not None else 'stdlib'
+_loads = _decoders[backend]
+
+
+def use_backend(name: str):
+    """Selects the JSON decoder: 'orjson', 'ujson' or 'stdlib'. By default the first one installed is used."""
+    global backend, _loads
+    if name not in _decoders:
+        raise VeracodeAPIError("JSON decoder {} is not installed".format(name))
+    backend = name
+    _loads = _decoders[name]
+
+
+def loads(content):
+    """Decodes a JSON document from the raw response bytes, without decoding them to text first."""
+    if _loads is not json.loads:
+        try:
+            return _loads(content)
+        except ValueError:
+            # let the standard library decide, so that invalid documents raise json.JSONDecodeError
+            pass
+    return json.loads(content)
@@ -0,0 +1,137 @@
+# mitigations.py - mitigation and annotation actions for large numbers of flaws, in batches
+
+import contextvars
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import quote_plus
+
+from .findings import Findings
+from .xmlapi import XMLAPI
+from .xmlresults import local_name, parse_xml
+
+_ENCODED_COMMA = '%2C'
+
+
+class BatchResult():
+    """The outcome of one batch. error is set if the call failed; failed_flaws maps the flaw ids the
+    XML API refused to the reason it gave."""
+    __slots__ = ('api', 'target', 'action', 'comment', 'flaw_ids', 'response', 'error', 'failed_flaws', 'seconds')
+
+    def __init__(self, api, target, action, comment, flaw_ids):
+        self.api = api
+        self.target = target
+        self.action = action
+        self.comment = comment
+        self.flaw_ids = flaw_ids
+        self.response = None
+        self.error = None
+        self.failed_flaws = {}
+        self.seconds = 0.0
+
+    @property
+    def ok(self):
+        return self.error is None and not self.failed_flaws
+
+    def __repr__(self):
+        return 'BatchResult({}, {!r}, {} flaws, ok={})'.format(self.api, self.target, len(self.flaw_ids), self.ok)
+
+
+class BulkMitigation():
+    """Collects mitigation actions for many flaws and submits them in batches.
+
+    Actions for the same build (XML API) or the same application and sandbox (Annotations API), with the
+    same action and comment, are merged. They are then split into batches of at most batch_size flaws. For
+    the XML API, which sends the ids and the comment in the query string, the comma separated id list and the
+    comment together are at most max_list_length characters once URL-encoded, which keeps URLs within limits.
+    Batches are sent by workers threads, in the caller's context so that they use its profile; all calls
+    share the library's rate limiter."""
+
+    def __init__(self, batch_size: int=500, max_list_length: int=4000, workers: int=4):
+        self.batch_size = batch_size
+        self.max_list_length = max_list_length
+        self.workers = workers
+        self._groups = {}
+
+    def add_xml(self, build_id: int, flaw_ids, action, comment: str):
+        """Queues XMLAPI.set_mitigation_info for flaw_ids (a list, or a comma separated string) of build_id."""
+        self._add(('xml', build_id, action, comment), flaw_ids)
+        return self
+
+    def add_rest(self, app, issue_ids, action, comment: str, sandbox=None):
+        """Queues Findings.add_annotation for issue_ids of the application app, or of its sandbox."""
+        self._add(('rest', (app, sandbox), action, comment), issue_ids)
+        return self
+
+    def _add(self, key, flaw_ids):
+        if isinstance(flaw_ids, str):
+            flaw_ids = [flaw_id.strip() for flaw_id in flaw_ids.split(',') if flaw_id.strip()]
+        ids = self._groups.setdefault(key, {})
+        for flaw_id in flaw_ids:
+            ids[str(flaw_id)] = None
+
+    def batches(self):
+        """Yields a BatchResult, not yet submitted, for each batch."""
+        for (api, target, action, comment), ids in self._groups.items():
+            # the comment shares the query string with the ids; a batch always has at least one id
+            comment_length = len(quote_plus(comment or '')) if api == 'xml' else 0
+            batch = []
+            length = comment_length
+            for flaw_id in ids:
+                added = len(flaw_id) + (len(_ENCODED_COMMA) if batch else 0)
+                if batch and (len(batch) >= self.batch_size or length + added > self.max_list_length):
+                    yield BatchResult(api, target, action, comment, batch)
+                    batch = []
+                    length = comment_length
+                    added = len(flaw_id)
+                batch.append(flaw_id)
+                length += added
+            if batch:
+                yield BatchResult(api, target, action, comment, batch)
+
+    def submit(self, progress=None):
+        """Submits every batch and returns their BatchResults, in batch order. Failed batches do not stop
+        the others. progress, if given, is called as progress(batches_done, total_batches)."""
+        batches = list(self.batches())
+        done = [0]
+        lock = threading.Lock()
+
+        def submit_one(batch):
+            self._submit(batch)
+            if progress is not None:
+                with lock:
+                    done[0] += 1
+                    progress(done[0], len(batches))
+            return batch
+
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            # each batch runs in a copy of the caller's context, so that it is sent with the same profile
+            futures = [executor.submit(contextvars.copy_context().run, submit_one, batch) for batch in batches]
+            results = [future.result() for future in futures]
+        self._groups = {}
+        return results
+
+    def _submit(self, batch):
+        started = time.perf_counter()
+        try:
+            if batch.api == 'xml':
+                batch.response = XMLAPI().set_mitigation_info(batch.target, ','.join(batch.flaw_ids), batch.action,
+                                                              batch.comment)
+                batch.failed_flaws = self._failed_flaws(batch.response)
+            else:
+                app, sandbox = batch.target
+                batch.response = Findings().add_annotation(app, batch.flaw_ids, batch.comment, batch.action,
+                                                           sandbox=sandbox)
+        except Exception as e:
+            batch.error = e
+        batch.seconds = time.perf_counter() - started
+
+    def _failed_flaws(self, response):
+        # updatemitigationinfo.do lists refused flaws as <error type="..." flaw_id_list="1,2"/>
+        failed = {}
+        for element in parse_xml(response):
+            if local_name(element.tag) == 'error':
+                for flaw_id in (element.get('flaw_id_list') or '').split(','):
+                    if flaw_id:
+                        failed[flaw_id] = element.get('type') or element.text
+        return failed
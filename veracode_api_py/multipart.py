@@ -0,0 +1,99 @@
+# multipart.py - streamed multipart/form-data bodies for file uploads
+
+import os
+import uuid
+
+
+class MultipartEncoder():
+    """A multipart/form-data body that reads the files it contains in chunks while it is sent, instead of
+    building the whole body in memory. fields maps each field name to a string, bytes, or a
+    (filename, fileobj) or (filename, fileobj, content_type) tuple.
+
+    progress, if given, is called as progress(bytes_sent, total_bytes) as the body is read. digest, if given,
+    is a hashlib object that is updated with the file contents in the same pass; retries that send the body
+    again do not hash the contents twice."""
+
+    def __init__(self, fields, progress=None, digest=None, boundary=None):
+        self.boundary = boundary or uuid.uuid4().hex
+        self.content_type = 'multipart/form-data; boundary={}'.format(self.boundary)
+        self.progress = progress
+        self.digest = digest
+        self._parts = []
+        for name, value in fields.items():
+            self._add_field(name, value)
+        self._parts.append('--{}--\r\n'.format(self.boundary).encode())
+        self._sizes = [self._part_length(part) for part in self._parts]
+        self._length = sum(self._sizes)
+        self._hashed = {}
+        self.seek(0)
+
+    def _add_field(self, name, value):
+        if isinstance(value, tuple):
+            filename, fileobj = value[0], value[1]
+            content_type = value[2] if len(value) > 2 else 'application/octet-stream'
+            header = 'Content-Disposition: form-data; name="{}"; filename="{}"\r\nContent-Type: {}'.format(
+                name, filename, content_type)
+        else:
+            fileobj = value.encode() if isinstance(value, str) else value
+            header = 'Content-Disposition: form-data; name="{}"'.format(name)
+        self._parts.append('--{}\r\n{}\r\n\r\n'.format(self.boundary, header).encode())
+        self._parts.append(fileobj)
+        self._parts.append(b'\r\n')
+
+    def _part_length(self, part):
+        if isinstance(part, bytes):
+            return len(part)
+        return os.fstat(part.fileno()).st_size
+
+    def __len__(self):
+        return self._length
+
+    def tell(self):
+        return self._position
+
+    def seek(self, offset, whence=os.SEEK_SET):
+        # only rewinding is supported, which is all a retry needs
+        if offset != 0 or whence != os.SEEK_SET:
+            raise ValueError("MultipartEncoder can only be rewound to the start")
+        self._position = 0
+        self._index = 0
+        self._offset = 0
+        for part in self._parts:
+            if not isinstance(part, bytes):
+                part.seek(0)
+        return 0
+
+    def read(self, size=-1):
+        if size is None or size < 0:
+            size = self._length - self._position
+        chunks = []
+        remaining = size
+        while remaining > 0 and self._index < len(self._parts):
+            part = self._parts[self._index]
+            if isinstance(part, bytes):
+                chunk = part[self._offset:self._offset + remaining]
+            else:
+                chunk = part.read(remaining)
+                self._hash(part, chunk)
+            if chunk:
+                chunks.append(chunk)
+                self._offset += len(chunk)
+                remaining -= len(chunk)
+            if not chunk or self._offset >= self._sizes[self._index]:
+                self._index += 1
+                self._offset = 0
+        data = b''.join(chunks)
+        self._position += len(data)
+        if self.progress is not None and data:
+            self.progress(self._position, self._length)
+        return data
+
+    def _hash(self, part, chunk):
+        # the contents are hashed the first time they are read; on a retry only bytes past that point are new
+        if self.digest is None:
+            return
+        start = self._offset
+        hashed = self._hashed.get(id(part), 0)
+        if start + len(chunk) > hashed:
+            self.digest.update(chunk[max(0, hashed - start):])
+            self._hashed[id(part)] = start + len(chunk)
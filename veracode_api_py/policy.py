@@ -9,6 +9,9 @@ class Policies():
 
     def get_all (self):
         return APIHelper()._rest_paged_request("appsec/v1/policies","GET","policy_versions",{"page": 0})
+
+    def iter_all (self):
+        return APIHelper()._rest_paged_iter("appsec/v1/policies","GET","policy_versions",{"page": 0})
     
     def get (self,guid: UUID):
         uri = "appsec/v1/policies/{}".format(guid)
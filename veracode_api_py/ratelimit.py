@@ -0,0 +1,138 @@
+# ratelimit.py - process-wide rate limiting and retry backoff for Veracode API calls
+
+import random
+import threading
+import time
+from collections import deque
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+
+RETRY_STATUS_CODES = (429, 502, 503, 504)
+
+
+class RateLimiter():
+    """Token bucket shared by every REST and XML call in the process, across threads and asyncio tasks.
+
+    Until the API first answers 429, calls are not limited (rate=None). A 429 halves the sustained rate,
+    starting from the rate observed just before it, and pauses all callers for the Retry-After period if the
+    response has one. The rate is halved at most once per congestion window: a 429 for a call sent before the
+    last decrease, or less than decrease_interval (or 1/rate) seconds after it, is part of the same burst.
+    Every successful call raises the rate by recovery_factor of itself, up to twice the rate of recent calls."""
+    _shared = None
+    _shared_lock = threading.Lock()
+
+    def __init__(self, rate: float=None, burst: int=10, max_attempts: int=5, backoff_base: float=1.0,
+                 backoff_max: float=60.0, min_rate: float=0.5, max_rate: float=None, decrease_interval: float=1.0,
+                 recovery_factor: float=0.1):
+        self.rate = rate # calls per second, None for no limit
+        self.burst = burst
+        self.max_attempts = max_attempts
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self.decrease_interval = decrease_interval
+        self.recovery_factor = recovery_factor
+
+        self._lock = threading.Lock()
+        self._tokens = float(burst)
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._decreased = float('-inf') # when the rate was last halved
+        self._recent_calls = deque(maxlen=100)
+
+    @classmethod
+    def get(cls):
+        limiter = cls._shared
+        if limiter is None:
+            with cls._shared_lock:
+                if cls._shared is None:
+                    cls._shared = cls()
+                limiter = cls._shared
+        return limiter
+
+    @classmethod
+    def configure(cls, **settings):
+        """Replaces the shared limiter with one built from settings, e.g. configure(rate=20, max_attempts=8)."""
+        with cls._shared_lock:
+            cls._shared = cls(**settings)
+        return cls._shared
+
+    def reserve(self):
+        """Takes a token and returns how many seconds the caller must wait before sending."""
+        with self._lock:
+            now = time.monotonic()
+            self._recent_calls.append(now)
+            wait = max(0.0, self._paused_until - now)
+            if self.rate is not None:
+                self._tokens = min(float(self.burst), self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                self._tokens -= 1
+                if self._tokens < 0:
+                    wait = max(wait, -self._tokens / self.rate)
+            return wait
+
+    def acquire(self):
+        wait = self.reserve()
+        if wait > 0:
+            time.sleep(wait)
+
+    def backoff(self, attempt: int, retry_after: float=None):
+        """Seconds to wait before retry number attempt (1 for the first retry): exponential with full jitter,
+        but never less than the server's Retry-After."""
+        delay = random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** (attempt - 1))))
+        if retry_after is not None:
+            delay = max(delay, retry_after)
+        return delay
+
+    def throttled(self, retry_after: float=None, sent: float=None):
+        """Records a 429 response. sent is the time.monotonic() at which the call was sent, if known."""
+        with self._lock:
+            now = time.monotonic()
+            if retry_after is not None:
+                self._paused_until = max(self._paused_until, now + retry_after)
+            if self.rate is None:
+                self.rate = self._observed_rate(now)
+                self._tokens = 0.0
+                self._updated = now
+            elif ((sent is not None and sent < self._decreased)
+                  or now < self._decreased + max(self.decrease_interval, 1 / self.rate)):
+                # the call was in flight when the rate was last halved, so it is part of the same burst
+                return
+            self.rate = max(self.min_rate, self.rate / 2)
+            self._decreased = now
+
+    def succeeded(self):
+        if self.rate is None:
+            return
+        with self._lock:
+            if self.rate is not None:
+                # proportional, so that a low rate recovers in as few calls as a high one; capped so that the
+                # rate does not grow far past what callers actually send while it is not the limit
+                ceiling = max(self.min_rate, 2 * self._observed_rate(time.monotonic()))
+                self.rate = max(self.rate, min(self.rate * (1 + self.recovery_factor), ceiling))
+                if self.max_rate is not None:
+                    self.rate = min(self.rate, self.max_rate)
+
+    def _observed_rate(self, now):
+        if len(self._recent_calls) < 2:
+            return float(self.burst)
+        elapsed = now - self._recent_calls[0]
+        return len(self._recent_calls) / elapsed if elapsed > 0 else float(self.burst)
+
+
+def parse_retry_after(value):
+    """Returns the Retry-After header value in seconds, from either delta-seconds or an HTTP date."""
+    if value is None:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        when = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if when.tzinfo is None:
+        when = when.replace(tzinfo=timezone.utc)
+    return max(0.0, (when - datetime.now(timezone.utc)).total_seconds())
@@ -16,12 +16,23 @@ class Workspaces():
           request_params = {'include_metrics': include_metrics}
           return APIHelper()._rest_paged_request(self.sca_base_url,"GET",params=request_params,element="workspaces")
 
+     def iter_all(self, include_metrics=False):
+          #Yields existing workspaces
+          request_params = {'include_metrics': include_metrics}
+          return APIHelper()._rest_paged_iter(self.sca_base_url,"GET",params=request_params,element="workspaces")
+
      def get_by_name(self,name: str):
           #Does a name filter on the workspaces list. Note that this is a partial match. Only returns the first match
           name = parse.quote(name) #urlencode any spaces or special characters
           request_params = {'filter[workspace]': name}
           return APIHelper()._rest_paged_request(self.sca_base_url,"GET",params=request_params,element="workspaces")
 
+     def iter_by_name(self,name: str):
+          #Does a name filter on the workspaces list. Note that this is a partial match. Only returns the first match
+          name = parse.quote(name) #urlencode any spaces or special characters
+          request_params = {'filter[workspace]': name}
+          return APIHelper()._rest_paged_iter(self.sca_base_url,"GET",params=request_params,element="workspaces")
+
      def create(self,name: str):
           #pass payload with name, return guid to workspace
           payload = json.dumps({"name": name})
@@ -44,6 +55,9 @@ class Workspaces():
           else:
                return APIHelper()._rest_paged_request("srcclr/v3/teams","GET","teams",{})
 
+     def iter_teams(self):
+          return APIHelper()._rest_paged_iter("srcclr/v3/teams","GET","teams",{})
+
      def get_projects(self,workspace_guid: UUID,project_name=""):
           if project_name != "":
                params = { 'search': project_name }
@@ -51,6 +65,13 @@ class Workspaces():
                params = {}
           return APIHelper()._rest_paged_request(self.sca_base_url + '/{}/projects'.format(workspace_guid),"GET","projects",params)
 
+     def iter_projects(self,workspace_guid: UUID,project_name=""):
+          if project_name != "":
+               params = { 'search': project_name }
+          else:
+               params = {}
+          return APIHelper()._rest_paged_iter(self.sca_base_url + '/{}/projects'.format(workspace_guid),"GET","projects",params)
+
      def get_project(self,workspace_guid: UUID,project_guid:UUID ):
           uri = self.sca_base_url + '/{}/projects/{}'.format(workspace_guid,project_guid)
           return APIHelper()._rest_request(uri,"GET")
@@ -59,13 +80,24 @@ class Workspaces():
           uri = self.sca_base_url + '/{}/projects/{}/issues'.format(workspace_guid,project_guid)
           return APIHelper()._rest_paged_request(uri,"GET","issues", params)
 
+     def iter_project_issues(self,workspace_guid: UUID,project_guid: UUID, params={}):
+          uri = self.sca_base_url + '/{}/projects/{}/issues'.format(workspace_guid,project_guid)
+          return APIHelper()._rest_paged_iter(uri,"GET","issues", params)
+
      def get_project_libraries(self,workspace_guid: UUID,project_guid: UUID):
           uri = self.sca_base_url + '/{}/projects/{}/libraries'.format(workspace_guid,project_guid)
           return APIHelper()._rest_paged_request(uri,"GET","libraries",{})
 
+     def iter_project_libraries(self,workspace_guid: UUID,project_guid: UUID):
+          uri = self.sca_base_url + '/{}/projects/{}/libraries'.format(workspace_guid,project_guid)
+          return APIHelper()._rest_paged_iter(uri,"GET","libraries",{})
+
      def get_agents(self,workspace_guid: UUID):
           return APIHelper()._rest_paged_request(self.sca_base_url + '/{}/agents'.format(workspace_guid),"GET","agents",{})
 
+     def iter_agents(self,workspace_guid: UUID):
+          return APIHelper()._rest_paged_iter(self.sca_base_url + '/{}/agents'.format(workspace_guid),"GET","agents",{})
+
      def get_agent(self,workspace_guid: UUID,agent_guid: UUID):
           uri = self.sca_base_url + '/{}/agents/{}'.format(workspace_guid,agent_guid)
           return APIHelper()._rest_request(uri,"GET")
@@ -85,6 +117,10 @@ class Workspaces():
           uri = self.sca_base_url + '/{}/agents/{}/tokens'.format(workspace_guid,agent_guid)
           return APIHelper()._rest_paged_request(uri, "GET", "tokens" )
 
+     def iter_agent_tokens(self,workspace_guid: UUID,agent_guid: UUID):
+          uri = self.sca_base_url + '/{}/agents/{}/tokens'.format(workspace_guid,agent_guid)
+          return APIHelper()._rest_paged_iter(uri, "GET", "tokens" )
+
      def get_agent_token(self,workspace_guid: UUID,agent_guid: UUID,token_id: UUID):
           uri = self.sca_base_url + '/{}/agents/{}/tokens/{}'.format(workspace_guid,agent_guid,token_id)
           return APIHelper()._rest_request(uri, "GET" )
@@ -98,6 +134,16 @@ class Workspaces():
           return APIHelper()._rest_request(uri,"DELETE")
 
      def get_issues(self,workspace_guid: UUID, branch=None, created_after=None,direct=None, ignored=None, vuln_methods=None, project_id=None):
+          uri = self.sca_base_url + '/{}/issues'.format(workspace_guid)
+          params = self._issues_params(branch, created_after, direct, ignored, vuln_methods, project_id)
+          return APIHelper()._rest_paged_request(uri,"GET","issues",params)
+
+     def iter_issues(self,workspace_guid: UUID, branch=None, created_after=None,direct=None, ignored=None, vuln_methods=None, project_id=None):
+          uri = self.sca_base_url + '/{}/issues'.format(workspace_guid)
+          params = self._issues_params(branch, created_after, direct, ignored, vuln_methods, project_id)
+          return APIHelper()._rest_paged_iter(uri,"GET","issues",params)
+
+     def _issues_params(self, branch=None, created_after=None,direct=None, ignored=None, vuln_methods=None, project_id=None):
           params = {}
           if branch:
                params["branch"] = branch
@@ -111,8 +157,7 @@ class Workspaces():
                params["vuln_methods"] = vuln_methods
           if project_id:
                params["project_id"] = project_id
-          uri = self.sca_base_url + '/{}/issues'.format(workspace_guid)
-          return APIHelper()._rest_paged_request(uri,"GET","issues",params)
+          return params
 
      def get_issue(self,issue_id: UUID):
           uri = self.sca_issues_url + '/{}'.format(issue_id)
@@ -125,6 +170,13 @@ class Workspaces():
                uri = self.sca_base_url + '/{}/libraries'.format(workspace_guid)
           return APIHelper()._rest_paged_request(uri,"GET",'libraries',{})
 
+     def iter_libraries(self,workspace_guid: UUID,unmatched: bool):
+          if unmatched:
+               uri = self.sca_base_url + '/{}/libraries/unmatched'.format(workspace_guid)
+          else:
+               uri = self.sca_base_url + '/{}/libraries'.format(workspace_guid)
+          return APIHelper()._rest_paged_iter(uri,"GET",'libraries',{})
+
      def get_library(self,library_id: str):
           uri = "srcclr/v3/libraries/{}".format(library_id)
           return APIHelper()._rest_request(uri,"GET")
@@ -141,7 +193,14 @@ class Workspaces():
           return APIHelper()._rest_request("srcclr/v3/scans/{}".format(scan_id),"GET")
 
      def get_events(self, date_gte=None, event_group=None, event_type=None):
-          baseuri = "srcclr/v3/events"
+          params = self._events_params(date_gte, event_group, event_type)
+          return APIHelper()._rest_paged_request("srcclr/v3/events","GET","events",params)
+
+     def iter_events(self, date_gte=None, event_group=None, event_type=None):
+          params = self._events_params(date_gte, event_group, event_type)
+          return APIHelper()._rest_paged_iter("srcclr/v3/events","GET","events",params)
+
+     def _events_params(self, date_gte=None, event_group=None, event_type=None):
           params = {}
           if event_group != None:
                if event_group not in Constants().SCA_EVENT_GROUP:
@@ -154,7 +213,7 @@ class Workspaces():
           if date_gte != None:
                params["date_gte"] = date_gte
 
-          return APIHelper()._rest_paged_request(baseuri,"GET","events",params)
+          return params
 
 class ComponentActivity():
      component_base_uri = "srcclr/v3/component-activity"
@@ -0,0 +1,95 @@
+# scheduler.py - delayed retries of XML API calls that are not ready yet
+
+import heapq
+import itertools
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+
+class XMLRetryPolicy():
+    """How long to wait before asking an XML API again after it answers 204 (not ready, try again later).
+    The first retry waits initial seconds, each following one multiplier times longer, up to maximum.
+    Once the waits would add up to more than max_wait seconds the call fails; None waits forever.
+    The defaults wait 120 seconds before every retry, as APIHelper.retry_seconds did; configure a shorter
+    initial delay to poll faster."""
+    _shared = None
+    _shared_lock = threading.Lock()
+
+    def __init__(self, initial: float=120.0, maximum: float=120.0, multiplier: float=2.0, max_wait: float=None):
+        self.initial = initial
+        self.maximum = maximum
+        self.multiplier = multiplier
+        self.max_wait = max_wait
+
+    @classmethod
+    def get(cls):
+        policy = cls._shared
+        if policy is None:
+            with cls._shared_lock:
+                if cls._shared is None:
+                    cls._shared = cls()
+                policy = cls._shared
+        return policy
+
+    @classmethod
+    def configure(cls, **settings):
+        """Replaces the shared policy with one built from settings, e.g. configure(initial=30, max_wait=7200)."""
+        with cls._shared_lock:
+            cls._shared = cls(**settings)
+        return cls._shared
+
+    def delay(self, attempt: int):
+        """Seconds to wait before retry number attempt (1 for the first retry)."""
+        return min(self.maximum, self.initial * (self.multiplier ** (attempt - 1)))
+
+    def gives_up(self, waited: float, delay: float):
+        return self.max_wait is not None and waited + delay > self.max_wait
+
+
+class RetryScheduler():
+    """Runs callables after a delay. One timer thread keeps the pending calls in a heap and hands each
+    to a small worker pool when it is due, so no thread is tied up while a call waits."""
+    max_workers = 4
+
+    _shared = None
+    _shared_lock = threading.Lock()
+
+    def __init__(self):
+        self._pending = []
+        self._order = itertools.count()
+        self._condition = threading.Condition()
+        self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='veracode-retry')
+        self._timer = threading.Thread(target=self._run, name='veracode-retry-timer', daemon=True)
+        self._timer.start()
+
+    @classmethod
+    def get(cls):
+        scheduler = cls._shared
+        if scheduler is None:
+            with cls._shared_lock:
+                if cls._shared is None:
+                    cls._shared = cls()
+                scheduler = cls._shared
+        return scheduler
+
+    def call_later(self, delay: float, fn):
+        with self._condition:
+            heapq.heappush(self._pending, (time.monotonic() + delay, next(self._order), fn))
+            self._condition.notify()
+
+    def pending(self):
+        return len(self._pending)
+
+    def _run(self):
+        while True:
+            with self._condition:
+                while not self._pending:
+                    self._condition.wait()
+                due, _, fn = self._pending[0]
+                wait = due - time.monotonic()
+                if wait > 0:
+                    self._condition.wait(wait)
+                    continue
+                heapq.heappop(self._pending)
+            self._executor.submit(fn)
@@ -0,0 +1,275 @@
+# store.py - local SQLite copy of the findings of a portfolio, synced incrementally
+
+import json
+import os
+import sqlite3
+import threading
+from operator import itemgetter
+from datetime import datetime, timezone
+from os.path import expanduser
+
+from .applications import Applications
+from .harvest import FindingsHarvester, HarvestReport
+
+_COLUMNS = ('app_guid', 'sandbox_guid', 'issue_id', 'scan_type', 'cwe_id', 'severity', 'status', 'resolution',
+            'resolution_status', 'new', 'violates_policy', 'first_found_date', 'last_seen_date', 'file_path', 'line',
+            'module', 'path', 'component_id', 'cve')
+
+_row = itemgetter(*_COLUMNS[2:])
+
+_SCHEMA = ('CREATE TABLE IF NOT EXISTS findings (app_guid TEXT NOT NULL, sandbox_guid TEXT NOT NULL, issue_id INTEGER, '
+           'scan_type TEXT, cwe_id INTEGER, severity INTEGER, status TEXT, resolution TEXT, resolution_status TEXT, '
+           'new INTEGER, violates_policy INTEGER, first_found_date TEXT, last_seen_date TEXT, file_path TEXT, '
+           'line INTEGER, module TEXT, path TEXT, component_id TEXT, cve TEXT, finding TEXT, sync INTEGER, '
+           'PRIMARY KEY (app_guid, sandbox_guid, scan_type, issue_id))',
+           # the indexes cover the other common filters and app_guid, so counts per application need no table reads
+           'CREATE INDEX IF NOT EXISTS findings_cwe ON findings (cwe_id, status, app_guid)',
+           'CREATE INDEX IF NOT EXISTS findings_severity ON findings (severity, status, app_guid)',
+           'CREATE INDEX IF NOT EXISTS findings_status ON findings (status, severity, app_guid)',
+           'CREATE INDEX IF NOT EXISTS findings_scan_type ON findings (scan_type, status, severity, app_guid)',
+           'CREATE TABLE IF NOT EXISTS apps (app_guid TEXT PRIMARY KEY, synced_at TEXT, sandboxes INTEGER)',
+           'CREATE TABLE IF NOT EXISTS syncs (sync INTEGER PRIMARY KEY, started_at TEXT, finished_at TEXT, '
+           'portfolio INTEGER, apps INTEGER, records INTEGER, errors INTEGER)')
+
+_FILTERS = {'app': 'app_guid', 'scan_type': 'scan_type', 'cwe': 'cwe_id', 'severity': 'severity', 'status': 'status',
+            'resolution_status': 'resolution_status'}
+
+
+class FindingsStore():
+    """Keeps the findings of a portfolio in a SQLite file, indexed by application, CWE, severity, status and
+    scan type, so that questions such as which applications have open CWE-89 findings are answered offline.
+
+    sync() fetches the findings of the applications that changed since the last sync with a FindingsHarvester.
+    By default each of them is fetched in full and findings that are no longer returned are deleted. With
+    since_param, the time of the application's last sync is passed to the Findings API in that request
+    parameter instead, and only the findings it returns are updated."""
+    default_path = os.path.join(expanduser("~"), '.veracode', 'findings.sqlite')
+
+    def __init__(self, path: str=None, keep_finding: bool=True):
+        self.path = path or self.default_path
+        self.keep_finding = keep_finding
+        self._lock = threading.Lock()
+        self._buffer = []
+        self._sync = None
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        self._db = sqlite3.connect(self.path, timeout=30, check_same_thread=False, isolation_level=None)
+        self._db.execute('PRAGMA journal_mode=WAL')
+        self._db.execute('PRAGMA synchronous=NORMAL')
+        self._db.execute('PRAGMA cache_size=-65536')
+        for statement in _SCHEMA:
+            self._db.execute(statement)
+
+    def sync(self, apps=None, sandboxes: bool=False, full: bool=False, since_param: str=None, workers: int=8,
+             scantype='ALL', progress=None):
+        """Syncs apps (application guids, or applications from Applications().get_all()) and returns the
+        HarvestReport. By default, the applications whose policy compliance was checked since the last sync,
+        and those that failed to sync before; every application on the first sync or with full=True."""
+        started = _now()
+        last = self.last_sync()
+        portfolio = apps is None and (full or last is None)
+        if apps is None:
+            since = None if portfolio else last[:10]
+            guids = [app['guid'] for app in Applications().iter_all(policy_check_after=since)]
+            if since is not None:
+                guids.extend(self._failed_apps())
+        else:
+            guids = [app['guid'] if isinstance(app, dict) else str(app) for app in apps]
+        guids = list(dict.fromkeys(guids))
+
+        with self._lock:
+            self._sync = self._db.execute('INSERT INTO syncs (started_at, portfolio) VALUES (?, ?)',
+                                          (started, int(apps is None))).lastrowid
+
+        # with since_param, applications synced before (with their sandboxes, if wanted) are fetched from the
+        # earliest of their last syncs; the others are fetched in full
+        in_full = []
+        updated = []
+        since = None
+        synced = self._synced(guids) if since_param and not full else {}
+        for guid in guids:
+            synced_at, with_sandboxes = synced.get(guid, (None, False))
+            if synced_at is None or (sandboxes and not with_sandboxes):
+                in_full.append(guid)
+            else:
+                updated.append(guid)
+                since = synced_at if since is None else min(since, synced_at)
+
+        report = HarvestReport()
+        for group, request_params in ((in_full, None), (updated, {since_param: since})):
+            if not group:
+                continue
+            harvester = FindingsHarvester(self._add, workers=workers, scantype=scantype, request_params=request_params,
+                                          sandboxes=sandboxes)
+            group_report = harvester.run(group, progress=progress)
+            self._flush()
+            self._finish(group, group_report, started, sandboxes, scantype, replace=request_params is None)
+            self._merge(report, group_report)
+        if portfolio:
+            # applications that are no longer in the portfolio
+            with self._lock:
+                self._db.execute('BEGIN')
+                self._db.execute('CREATE TEMP TABLE IF NOT EXISTS current_apps (app_guid TEXT PRIMARY KEY)')
+                self._db.execute('DELETE FROM current_apps')
+                self._db.executemany('INSERT INTO current_apps VALUES (?)', [(guid,) for guid in guids])
+                for table in ('findings', 'apps'):
+                    self._db.execute('DELETE FROM {} WHERE app_guid NOT IN (SELECT app_guid FROM current_apps)'
+                                     .format(table))
+                self._db.execute('COMMIT')
+
+        with self._lock:
+            self._db.execute('UPDATE syncs SET finished_at = ?, apps = ?, records = ?, errors = ? WHERE sync = ?',
+                             (_now(), len(guids), report.records, len(report.errors), self._sync))
+        return report
+
+    def find(self, app=None, context=None, scan_type=None, cwe=None, severity=None, severity_gte: int=None,
+             status=None, resolution_status=None, violates_policy: bool=None, include_finding: bool=False,
+             limit: int=None):
+        """Returns the stored findings that match every filter given, as records like those of
+        harvest.normalize_finding. Filters take a value or a list of values. context is 'POLICY' for policy
+        findings, or a sandbox guid."""
+        where, params = self._where(locals())
+        columns = ', '.join(_COLUMNS + (('finding',) if include_finding else ()))
+        sql = 'SELECT {} FROM findings{} ORDER BY app_guid, sandbox_guid, issue_id'.format(columns, where)
+        if limit is not None:
+            sql += ' LIMIT {:d}'.format(limit)
+        with self._lock:
+            rows = self._db.execute(sql, params).fetchall()
+        return [self._record(row, include_finding) for row in rows]
+
+    def count(self, app=None, context=None, scan_type=None, cwe=None, severity=None, severity_gte: int=None,
+              status=None, resolution_status=None, violates_policy: bool=None):
+        """Returns the number of stored findings that match the filters, as for find()."""
+        where, params = self._where(locals())
+        with self._lock:
+            return self._db.execute('SELECT COUNT(*) FROM findings{}'.format(where), params).fetchone()[0]
+
+    def apps(self, app=None, context=None, scan_type=None, cwe=None, severity=None, severity_gte: int=None,
+             status=None, resolution_status=None, violates_policy: bool=None):
+        """Returns the guids of the applications with findings that match the filters, as for find(), with
+        the number of those findings in each."""
+        where, params = self._where(locals())
+        with self._lock:
+            rows = self._db.execute('SELECT app_guid, COUNT(*) FROM findings{} GROUP BY app_guid ORDER BY app_guid'
+                                    .format(where), params).fetchall()
+        return dict(rows)
+
+    def execute(self, sql: str, params=()):
+        """Runs a query of your own against the findings table and returns its rows."""
+        with self._lock:
+            return self._db.execute(sql, params).fetchall()
+
+    def last_sync(self, app=None):
+        """The time the last sync of the whole portfolio started, or that app was last synced, in ISO 8601 UTC;
+        None if never."""
+        with self._lock:
+            if app is not None:
+                row = self._db.execute('SELECT synced_at FROM apps WHERE app_guid = ?', (str(app),)).fetchone()
+            else:
+                row = self._db.execute('SELECT started_at FROM syncs WHERE finished_at IS NOT NULL AND portfolio = 1 '
+                                       'ORDER BY sync DESC LIMIT 1').fetchone()
+        return row[0] if row is not None else None
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+    def _add(self, record):
+        # the harvester's sink; rows are written in batches, each in one transaction
+        self._buffer.append((record['app_guid'], record['sandbox_guid'] or '') + _row(record) +
+                            (json.dumps(record['finding']) if self.keep_finding else None, self._sync))
+        if len(self._buffer) >= 5000:
+            self._flush()
+
+    def _flush(self):
+        if not self._buffer:
+            return
+        with self._lock:
+            self._db.execute('BEGIN')
+            self._db.executemany('INSERT OR REPLACE INTO findings VALUES ({})'.format(', '.join('?' * (len(_COLUMNS) + 2))),
+                                 self._buffer)
+            self._db.execute('COMMIT')
+        self._buffer = []
+
+    def _finish(self, guids, report, started, sandboxes, scantype, replace):
+        scan_types = [] if scantype == 'ALL' else scantype.split(',')
+        only_scan_types = ' AND scan_type IN ({})'.format(', '.join('?' * len(scan_types))) if scan_types else ''
+        failed = {}
+        for key in report.errors:
+            app_guid, _, target = key.partition(':')
+            failed.setdefault(app_guid, set()).add(target)
+        with self._lock:
+            self._db.execute('BEGIN')
+            for guid in guids:
+                targets = failed.get(guid, set())
+                if replace:
+                    # findings of targets that synced in full but were not returned again are gone
+                    if not sandboxes:
+                        if '' not in targets:
+                            self._db.execute("DELETE FROM findings WHERE app_guid = ? AND sandbox_guid = '' "
+                                             "AND sync != ?" + only_scan_types, [guid, self._sync] + scan_types)
+                    elif '*' not in targets:
+                        # the sandboxes were listed, so this also drops the findings of deleted sandboxes
+                        sql = 'DELETE FROM findings WHERE app_guid = ? AND sync != ?' + only_scan_types
+                        if targets:
+                            sql += ' AND sandbox_guid NOT IN ({})'.format(', '.join('?' * len(targets)))
+                        self._db.execute(sql, [guid, self._sync] + scan_types + sorted(targets))
+                # an application that failed is fetched in full on the next sync
+                self._db.execute('INSERT OR REPLACE INTO apps VALUES (?, ?, ?)',
+                                 (guid, None, 0) if targets else (guid, started, int(sandboxes)))
+            self._db.execute('COMMIT')
+
+    def _merge(self, report, other):
+        report.apps += other.apps
+        report.targets += other.targets
+        report.skipped += other.skipped
+        report.records += other.records
+        report.errors.update(other.errors)
+        report.seconds += other.seconds
+
+    def _failed_apps(self):
+        with self._lock:
+            rows = self._db.execute('SELECT app_guid FROM apps WHERE synced_at IS NULL').fetchall()
+        return [row[0] for row in rows]
+
+    def _synced(self, guids):
+        with self._lock:
+            rows = self._db.execute('SELECT app_guid, synced_at, sandboxes FROM apps '
+                                    'WHERE synced_at IS NOT NULL').fetchall()
+        wanted = set(guids)
+        return {guid: (synced_at, bool(with_sandboxes)) for guid, synced_at, with_sandboxes in rows if guid in wanted}
+
+    def _where(self, filters):
+        clauses = []
+        params = []
+        for name, column in _FILTERS.items():
+            value = filters.get(name)
+            if value is None:
+                continue
+            values = list(value) if isinstance(value, (list, tuple, set)) else [value]
+            clauses.append('{} IN ({})'.format(column, ', '.join('?' * len(values))))
+            params.extend(values)
+        context = filters.get('context')
+        if context is not None:
+            clauses.append('sandbox_guid = ?')
+            params.append('' if context == 'POLICY' else str(context))
+        if filters.get('severity_gte') is not None:
+            clauses.append('severity >= ?')
+            params.append(filters['severity_gte'])
+        if filters.get('violates_policy') is not None:
+            clauses.append('violates_policy = ?')
+            params.append(int(filters['violates_policy']))
+        return (' WHERE ' + ' AND '.join(clauses) if clauses else ''), params
+
+    def _record(self, row, include_finding):
+        record = dict(zip(_COLUMNS, row))
+        record['sandbox_guid'] = record['sandbox_guid'] or None
+        for name in ('new', 'violates_policy'):
+            if record[name] is not None:
+                record[name] = bool(record[name])
+        if include_finding:
+            record['finding'] = json.loads(row[-1]) if row[-1] is not None else None
+        return record
+
+
+def _now():
+    return datetime.now(timezone.utc).strftime('%Y-%m-%dT%H:%M:%S.%f')[:-3] + 'Z'
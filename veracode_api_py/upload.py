@@ -0,0 +1,160 @@
+# upload.py - upload, prescan and scan a static build with the XML APIs
+
+import contextvars
+import logging
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from .buildwatcher import FAILED_STATUSES, PRESCAN_DONE_STATUSES
+from .exceptions import VeracodeAPIError
+from .scheduler import XMLRetryPolicy
+from .xmlapi import XMLAPI
+from .xmlresults import BuildInfo, local_name as _local, parse_xml as _parse
+
+logger = logging.getLogger(__name__)
+
+
+def top_level_modules(modules):
+    """Default module selection: the modules that are not dependencies and have no fatal errors."""
+    return [module for module in modules if not module['is_dependency'] and not module['has_fatal_errors']]
+
+
+class StageTiming():
+    def __init__(self, name, seconds, detail=None):
+        self.name = name
+        self.seconds = seconds
+        self.detail = detail
+
+    def __repr__(self):
+        return 'StageTiming({!r}, {:.2f})'.format(self.name, self.seconds)
+
+
+class UploadReport():
+    """What an UploadPipeline run did and how long each stage took. uploads has one StageTiming per file,
+    whose detail is the file size in bytes."""
+
+    def __init__(self):
+        self.build_id = None
+        self.stages = []
+        self.uploads = []
+        self.modules = []
+        self.scan_started = False
+
+    @property
+    def total(self):
+        return sum(stage.seconds for stage in self.stages)
+
+    def stage(self, name):
+        for stage in self.stages:
+            if stage.name == name:
+                return stage
+
+    def format_report(self):
+        lines = ['{:<40}{:>10}{:>12}'.format('stage', 'seconds', 'MB/s')]
+        for stage in self.stages:
+            lines.append('{:<40}{:>10.2f}'.format(stage.name, stage.seconds))
+            if stage.name == 'upload':
+                for upload in self.uploads:
+                    rate = upload.detail / upload.seconds / 1e6 if upload.seconds else 0.0
+                    lines.append('  {:<38}{:>10.2f}{:>12.1f}'.format(upload.name, upload.seconds, rate))
+        lines.append('{:<40}{:>10.2f}'.format('total', self.total))
+        return '\n'.join(lines)
+
+
+class UploadPipeline():
+    """Uploads the files of a static build, runs the prescan and starts the scan on the selected modules.
+
+    Files are uploaded upload_workers at a time. The smallest file is uploaded on its own first, so that
+    the build it creates exists before the other uploads start. The build is then polled with get_build_info,
+    waiting as poll_policy (an XMLRetryPolicy) says, until the prescan is done. select_modules is called with
+    the prescan modules, as dicts, and returns those to scan; by default the top-level modules without fatal errors."""
+
+    def __init__(self, app_id: int, files, sandbox_id=None, upload_workers: int=4, poll_policy: XMLRetryPolicy=None,
+                 select_modules=top_level_modules, progress=None):
+        self.app_id = app_id
+        self.files = list(files)
+        self.sandbox_id = sandbox_id
+        self.upload_workers = upload_workers
+        self.poll_policy = poll_policy or XMLRetryPolicy(initial=10, maximum=60, multiplier=1.5, max_wait=3600)
+        self.select_modules = select_modules
+        self.progress = progress # called as progress(filename, bytes_sent, total_bytes)
+        self.report = UploadReport()
+
+    def run(self, scan: bool=True):
+        """Runs every stage and returns the UploadReport. With scan=False, stops after the prescan."""
+        self._stage('upload', self.upload)
+        self._stage('prescan', self.prescan)
+        build_info = self._stage('wait for prescan', self.wait_for_prescan)
+        if build_info.status in FAILED_STATUSES:
+            raise VeracodeAPIError("Prescan of build {} ended with status {}".format(self.report.build_id,
+                                                                                   build_info.status))
+        modules = self._stage('get prescan results', self.prescan_modules)
+        self.report.modules = self.select_modules(modules)
+        if scan:
+            self._stage('begin scan', self.begin_scan)
+        return self.report
+
+    def upload(self):
+        if not self.files:
+            raise VeracodeAPIError("No files to upload")
+        files = sorted(self.files, key=os.path.getsize)
+        self._upload_file(files[0])
+        with ThreadPoolExecutor(max_workers=self.upload_workers) as executor:
+            # each upload runs in a copy of the caller's context, so that it uses the same profile
+            uploads = [executor.submit(contextvars.copy_context().run, self._upload_file, file) for file in files[1:]]
+            for upload in uploads:
+                upload.result()
+
+    def prescan(self):
+        _parse(XMLAPI().begin_prescan(self.app_id, sandbox_id=self.sandbox_id))
+
+    def wait_for_prescan(self):
+        started = time.monotonic()
+        attempt = 0
+        while True:
+            build_info = BuildInfo.from_xml(XMLAPI().get_build_info(self.app_id, sandbox_id=self.sandbox_id))
+            self.report.build_id = build_info.build_id
+            status = build_info.status
+            if status in PRESCAN_DONE_STATUSES:
+                return build_info
+            attempt += 1
+            delay = self.poll_policy.delay(attempt)
+            waited = time.monotonic() - started
+            if self.poll_policy.gives_up(waited, delay):
+                raise VeracodeAPIError("Prescan of build {} still has status {} after {:.0f} seconds"
+                                       .format(self.report.build_id, status, waited))
+            logger.debug("Prescan status is {}, polling again in {:.0f}s".format(status, delay))
+            time.sleep(delay)
+
+    def prescan_modules(self):
+        results = _parse(XMLAPI().get_prescan_results(self.app_id, build_id=self.report.build_id,
+                                                      sandbox_id=self.sandbox_id))
+        return [{'id': module.get('id'), 'name': module.get('name'), 'platform': module.get('platform'),
+                 'status': module.get('status'),
+                 'has_fatal_errors': module.get('has_fatal_errors') == 'true',
+                 'is_dependency': module.get('is_dependency') == 'true'}
+                for module in results.iter() if _local(module.tag) == 'module']
+
+    def begin_scan(self):
+        if not self.report.modules:
+            raise VeracodeAPIError("No modules selected to scan in build {}".format(self.report.build_id))
+        _parse(XMLAPI().begin_scan(self.app_id, modules=','.join(module['id'] for module in self.report.modules),
+                                   sandbox_id=self.sandbox_id))
+        self.report.scan_started = True
+
+    def _upload_file(self, file):
+        name = os.path.basename(file)
+        progress = None
+        if self.progress is not None:
+            progress = lambda sent, total: self.progress(name, sent, total)
+        started = time.perf_counter()
+        _parse(XMLAPI().upload_file(self.app_id, file, sandbox_id=self.sandbox_id, progress=progress))
+        self.report.uploads.append(StageTiming(name, time.perf_counter() - started, os.path.getsize(file)))
+
+    def _stage(self, name, fn):
+        started = time.perf_counter()
+        try:
+            return fn()
+        finally:
+            self.report.stages.append(StageTiming(name, time.perf_counter() - started))
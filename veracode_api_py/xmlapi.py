@@ -1,32 +1,67 @@
 # xmlapi.py - API class for legacy XML API calls
 
+import os
+from concurrent.futures import Future
+
+import requests
+
 from .apihelper import APIHelper
 from .constants import Constants
+from .exceptions import VeracodeAPIError
+from .multipart import MultipartEncoder
+from .xmlresults import iter_detailed_report, local_name, parse_xml, AppList, SandboxList, BuildList
 
 
 class XMLAPI():
     baseurl = "https://analysiscenter.veracode.com/api"
 
+    def __init__(self, wait: bool = True):
+        """If wait is False, calls return a concurrent.futures.Future for the response instead of the response,
+        so that calls answered with "not ready, try again later" can be retried without blocking the caller."""
+        self.wait = wait
+
+    def _request(self, url, method, params=None, files=None):
+        if self.wait:
+            return APIHelper()._xml_request(url, method, params=params, files=files)
+        return APIHelper()._xml_request_future(url, method, params=params, files=files)
+
+    def _parse(self, response, parser):
+        # applies parser to the response, or to the result of the future when not waiting
+        if self.wait:
+            return parser(response)
+        parsed = Future()
+
+        def done(future):
+            try:
+                parsed.set_result(parser(future.result()))
+            except Exception as e:
+                parsed.set_exception(e)
+        response.add_done_callback(done)
+        return parsed
+
     # Upload XML APIs
-    def get_app_list(self):
-        """Returns all application profiles."""
-        return APIHelper()._xml_request(self.baseurl + "/4.0/getapplist.do", "GET")
+    def get_app_list(self, parsed: bool = False):
+        """Returns all application profiles. If parsed is True, returns an xmlresults.AppList."""
+        response = self._request(self.baseurl + "/4.0/getapplist.do", "GET")
+        return self._parse(response, AppList.from_xml) if parsed else response
 
     def get_app_info(self, app_id: int):
         """Returns application profile info for a given app ID."""
-        return APIHelper()._xml_request(self.baseurl + "/5.0/getappinfo.do", "GET", params={"app_id": app_id})
+        return self._request(self.baseurl + "/5.0/getappinfo.do", "GET", params={"app_id": app_id})
 
-    def get_sandbox_list(self, app_id: int):
-        """Returns a list of sandboxes for a given app ID"""
-        return APIHelper()._xml_request(self.baseurl + "/5.0/getsandboxlist.do", "GET", params={"app_id": app_id})
+    def get_sandbox_list(self, app_id: int, parsed: bool = False):
+        """Returns a list of sandboxes for a given app ID. If parsed is True, returns an xmlresults.SandboxList."""
+        response = self._request(self.baseurl + "/5.0/getsandboxlist.do", "GET", params={"app_id": app_id})
+        return self._parse(response, SandboxList.from_xml) if parsed else response
 
-    def get_build_list(self, app_id: int, sandbox_id: int = None):
-        """Returns all builds for a given app ID."""
+    def get_build_list(self, app_id: int, sandbox_id: int = None, parsed: bool = False):
+        """Returns all builds for a given app ID. If parsed is True, returns an xmlresults.BuildList."""
         if sandbox_id is None:
             params = {"app_id": app_id}
         else:
             params = {"app_id": app_id, "sandbox_id": sandbox_id}
-        return APIHelper()._xml_request(self.baseurl + "/4.0/getbuildlist.do", "GET", params=params)
+        response = self._request(self.baseurl + "/4.0/getbuildlist.do", "GET", params=params)
+        return self._parse(response, BuildList.from_xml) if parsed else response
 
     def get_build_info(self, app_id: int, build_id: int = None, sandbox_id: int = None):
         """Returns build info for a given build ID."""
@@ -35,7 +70,7 @@ class XMLAPI():
             params["sandbox_id"] = sandbox_id
         if build_id != None:
             params["build_id"] = build_id
-        return APIHelper()._xml_request(self.baseurl + "/5.0/getbuildinfo.do", "GET", params=params)
+        return self._request(self.baseurl + "/5.0/getbuildinfo.do", "GET", params=params)
 
 
     def delete_build(self, app_id: int, sandbox_id: int = None):
@@ -44,18 +79,30 @@ class XMLAPI():
             params = {"app_id": app_id}
         else:
             params = {"app_id": app_id, "sandbox_id": sandbox_id}
-        return APIHelper()._xml_request(self.baseurl + "/5.0/deletebuild.do", "GET", params=params)
+        return self._request(self.baseurl + "/5.0/deletebuild.do", "GET", params=params)
 
 
-    def upload_file(self, app_id: int, file: str, sandbox_id=None, save_as=None):
-        """Uploads a file to an existing build or creates a build."""
+    def upload_file(self, app_id: int, file: str, sandbox_id=None, save_as=None, progress=None, digest=None):
+        """Uploads a file to an existing build or creates a build. The file is streamed in chunks rather than
+        read into memory. progress is called as progress(bytes_sent, total_bytes); digest, a hashlib object
+        such as hashlib.sha256(), is updated with the file contents as they are sent."""
         params = {'app_id': app_id}
         if sandbox_id:
             params['sandbox_id'] = sandbox_id
         if save_as:
             params['save_as'] = save_as
-        files = {'file': open(file, 'rb')}
-        return APIHelper()._xml_request(self.baseurl + "/5.0/uploadfile.do", "POST", params=params, files=files)
+        upload = open(file, 'rb')
+        try:
+            body = MultipartEncoder({'file': (os.path.basename(file), upload)}, progress=progress, digest=digest)
+            response = self._request(self.baseurl + "/5.0/uploadfile.do", "POST", params=params, files=body)
+        except BaseException:
+            upload.close()
+            raise
+        if self.wait:
+            upload.close()
+        else:
+            response.add_done_callback(lambda _: upload.close())
+        return response
 
     def begin_prescan(self, app_id: int, sandbox_id=None, auto_scan=None,scan_all_nonfatal_top_level_modules=None):
         """Runs a static prescan for an application."""
@@ -66,7 +113,7 @@ class XMLAPI():
             params['auto_scan'] = auto_scan
         if scan_all_nonfatal_top_level_modules:
             params['scan_all_nonfatal_top_level_modules'] = scan_all_nonfatal_top_level_modules
-        return APIHelper()._xml_request(self.baseurl + "/5.0/beginprescan.do", "POST", params=params)
+        return self._request(self.baseurl + "/5.0/beginprescan.do", "POST", params=params)
 
     def get_prescan_results(self,app_id: int, build_id=None, sandbox_id=None):
         """Gets the prescan results for an application."""
@@ -75,7 +122,7 @@ class XMLAPI():
             params['build_id'] = build_id
         if sandbox_id:
             params['sandbox_id'] = sandbox_id
-        return APIHelper()._xml_request(self.baseurl + "/5.0/getprescanresults.do", "GET", params=params)
+        return self._request(self.baseurl + "/5.0/getprescanresults.do", "GET", params=params)
 
     def get_file_list(self,app_id: int, build_id=None, sandbox_id=None):
         """Gets the list of uploaded files for an application."""
@@ -84,14 +131,14 @@ class XMLAPI():
             params['build_id'] = build_id
         if sandbox_id:
             params['sandbox_id'] = sandbox_id
-        return APIHelper()._xml_request(self.baseurl + "/5.0/getfilelist.do", "GET", params=params)
+        return self._request(self.baseurl + "/5.0/getfilelist.do", "GET", params=params)
 
     def remove_file(self,app_id: int, file_id: int, sandbox_id=None):
         """Deletes a file from an existing application scan."""
         params = {'app_id': app_id, 'file_id': file_id}
         if sandbox_id:
             params['sandbox_id'] = sandbox_id
-        return APIHelper()._xml_request(self.baseurl + "/5.0/removefile.do", "GET", params=params)
+        return self._request(self.baseurl + "/5.0/removefile.do", "GET", params=params)
 
     def begin_scan(self, app_id: int, modules=None, scan_all_top_level_modules=None,scan_selected_modules=None,scan_previously_selected_modules=None,sandbox_id=None):
         """Runs a static scan for an application. Must specify one of: modules, scan_all_top_level_modules, scan_selected_modules, scan_previously_selected_modules"""
@@ -106,16 +153,26 @@ class XMLAPI():
             params['scan_selected_modules'] = scan_selected_modules
         if scan_previously_selected_modules:
             params['scan_previously_selected_modules'] = scan_previously_selected_modules
-        return APIHelper()._xml_request(self.baseurl + "/5.0/beginscan.do", "POST", params=params)
+        return self._request(self.baseurl + "/5.0/beginscan.do", "POST", params=params)
 
 
   # Results XML APIs
     def get_detailed_report(self, build_id: int):
         """Returns a detailed report for a given build ID."""
-        return APIHelper()._xml_request(self.baseurl + "/5.0/detailedreport.do", "GET", params={"build_id": build_id})
+        return self._request(self.baseurl + "/5.0/detailedreport.do", "GET", params={"build_id": build_id})
+
+    def iter_detailed_report(self, build_id: int, kinds=None):
+        """Streams the detailed report for a given build ID and yields typed records as they are read, without
+        holding the whole report in memory. See xmlresults.iter_detailed_report."""
+        response = APIHelper()._xml_stream(self.baseurl + "/5.0/detailedreport.do", "GET", params={"build_id": build_id})
+        try:
+            response.raw.decode_content = True
+            yield from iter_detailed_report(response.raw, kinds)
+        finally:
+            response.close()
 
     def generate_archer(self, payload):
-        return APIHelper()._xml_request(self.baseurl + "/3.0/generatearcherreport.do", "GET", params=payload)
+        return self._request(self.baseurl + "/3.0/generatearcherreport.do", "GET", params=payload)
 
     def download_archer(self, token=None):
         if token is None:
@@ -123,7 +180,62 @@ class XMLAPI():
         else:
             payload = {'token': token}
 
-        return APIHelper()._xml_request(self.baseurl + "/3.0/downloadarcherreport.do", "GET", params=payload)
+        return self._request(self.baseurl + "/3.0/downloadarcherreport.do", "GET", params=payload)
+
+    def save_archer(self, destination, payload=None, chunk_size: int = 1024 * 1024, max_resumes: int = 5):
+        """Generates an Archer report, waits until it is ready (as XMLRetryPolicy says) and streams it to
+        destination, a file name or a binary file-like object, chunk_size bytes at a time. If the connection
+        drops, the download resumes where it stopped, up to max_resumes times; a request that fails while
+        resuming counts as one of them. Returns the bytes written."""
+        token = self._archer_token(XMLAPI().generate_archer(payload))
+        if isinstance(destination, (str, os.PathLike)):
+            with open(destination, 'wb') as out:
+                return self._download_archer_to(token, out, chunk_size, max_resumes)
+        return self._download_archer_to(token, destination, chunk_size, max_resumes)
+
+    def _archer_token(self, response):
+        root = parse_xml(response)
+        token = root.get('token')
+        if token is None:
+            token = next((element.text for element in root.iter() if local_name(element.tag) == 'token'), None)
+        if not token:
+            raise VeracodeAPIError("No token in generatearcherreport.do response")
+        return token.strip()
+
+    def _download_archer_to(self, token, out, chunk_size, max_resumes):
+        url = self.baseurl + "/3.0/downloadarcherreport.do"
+        written = 0
+        resumes = 0
+        ranged = True
+        while True:
+            # resume with a Range request; if the server ignores it, or the body is compressed so that offsets
+            # do not match, skip what was already written instead
+            headers = {'Range': 'bytes={}-'.format(written)} if written and ranged else None
+            response = None
+            try:
+                response = APIHelper()._xml_stream(url, "GET", params={'token': token}, headers=headers)
+                ranged = response.headers.get('Content-Encoding', 'identity') == 'identity'
+                skip = 0 if response.status_code == 206 else written
+                for chunk in response.iter_content(chunk_size):
+                    if skip:
+                        if len(chunk) <= skip:
+                            skip -= len(chunk)
+                            continue
+                        chunk, skip = chunk[skip:], 0
+                    out.write(chunk)
+                    written += len(chunk)
+                return written
+            except (requests.exceptions.RequestException, VeracodeAPIError) as e:
+                # a report that cannot be opened at all is not retried, but failing to open it again after
+                # the connection dropped uses up a resume like the drop itself
+                if response is None and not resumes:
+                    raise
+                resumes += 1
+                if resumes > max_resumes:
+                    raise VeracodeAPIError("Archer report download failed after {} bytes: {}".format(written, e))
+            finally:
+                if response is not None:
+                    response.close()
 
    # Mitigation and Comments XML APIs
     def set_mitigation_info(self, build_id: int, flaw_id_list, action, comment: str):
@@ -132,4 +244,4 @@ class XMLAPI():
         """
         actiontype = Constants.ANNOT_TYPE.get(action, action)
         payload = {'build_id': build_id, 'flaw_id_list': flaw_id_list, 'action': actiontype, 'comment': comment}
-        return APIHelper()._xml_request(self.baseurl + "/updatemitigationinfo.do", "POST", params=payload)
+        return self._request(self.baseurl + "/updatemitigationinfo.do", "POST", params=payload)
@@ -0,0 +1,297 @@
+# xmlresults.py - typed results parsed from XML API responses
+
+import io
+import xml.etree.ElementTree as ET
+
+from .exceptions import VeracodeAPIError
+
+
+_local_names = {}
+
+
+def local_name(tag):
+    """Returns an element tag without its namespace."""
+    name = _local_names.get(tag)
+    if name is None:
+        name = _local_names[tag] = tag.rsplit('}', 1)[-1]
+    return name
+
+
+def parse_xml(content):
+    """Parses an XML API response. The XML APIs answer errors with HTTP 200 and an <error> document,
+    which is raised as VeracodeAPIError."""
+    root = ET.fromstring(content)
+    if local_name(root.tag) == 'error':
+        raise VeracodeAPIError(root.text)
+    return root
+
+
+def _bool(value):
+    return value == 'true'
+
+
+def _int(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _float(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+class XMLRecord():
+    """Base class of the parsed records. The fields listed in _fields are converted to their types and
+    set as attributes; attributes holds every XML attribute of the element as a string."""
+    _fields = {}
+    __slots__ = ('attributes',)
+
+    def __init__(self, attributes):
+        self.attributes = attributes
+        for name, kind in self._fields.items():
+            value = attributes.get(name)
+            setattr(self, name, kind(value) if kind is not str else value)
+
+    def __repr__(self):
+        shown = ', '.join('{}={!r}'.format(name, getattr(self, name)) for name in list(self._fields)[:3])
+        return '{}({})'.format(type(self).__name__, shown)
+
+
+# detailedreport.do
+
+class ReportInfo(XMLRecord):
+    """The attributes of the <detailedreport> element, yielded before any flaw."""
+    _fields = {'app_id': _int, 'app_name': str, 'build_id': _int, 'sandbox_id': _int, 'analysis_id': _int,
+               'version': str, 'policy_name': str, 'policy_compliance_status': str, 'generation_date': str,
+               'last_update_time': str}
+    __slots__ = tuple(_fields)
+
+
+class StaticFlaw(XMLRecord):
+    """A <flaw> from <staticflaws>. mitigations and annotations are lists of attribute dicts."""
+    _fields = {'issueid': _int, 'cweid': _int, 'severity': _int, 'categoryid': _int, 'categoryname': str,
+               'module': str, 'sourcefile': str, 'sourcefilepath': str, 'line': _int, 'functionprototype': str,
+               'functionrelativelocation': _int, 'count': _int, 'remediation_status': str,
+               'mitigation_status': str, 'affects_policy_compliance': _bool, 'date_first_occurrence': str}
+    __slots__ = tuple(_fields) + ('mitigations', 'annotations')
+
+
+class DynamicFlaw(XMLRecord):
+    """A <flaw> from <dynamicflaws>. mitigations and annotations are lists of attribute dicts."""
+    _fields = {'issueid': _int, 'cweid': _int, 'severity': _int, 'categoryid': _int, 'categoryname': str,
+               'url': str, 'vuln_parameter': str, 'hostname': str, 'port': _int, 'path': str, 'count': _int,
+               'remediation_status': str, 'mitigation_status': str, 'affects_policy_compliance': _bool,
+               'date_first_occurrence': str}
+    __slots__ = tuple(_fields) + ('mitigations', 'annotations')
+
+
+class CVE(XMLRecord):
+    """A <vulnerability> of a third-party component."""
+    _fields = {'cve_id': str, 'cvss_score': _float, 'severity': _int, 'cwe_id': str, 'cve_summary': str,
+               'first_found_date': str, 'mitigation': _bool, 'vulnerability_affects_policy_compliance': _bool}
+    __slots__ = tuple(_fields) + ('component_id',)
+
+
+class SCAComponent(XMLRecord):
+    """A <component> from <vulnerable_components>, with its file paths and CVEs."""
+    _fields = {'component_id': str, 'file_name': str, 'library': str, 'library_id': str, 'vendor': str,
+               'version': str, 'sha1': str, 'max_cvss_score': _float, 'vulnerabilities': _int,
+               'component_affects_policy_compliance': _bool, 'added_date': str}
+    __slots__ = tuple(_fields) + ('file_paths', 'cves')
+
+
+_FLAW_LISTS = {'staticflaws': StaticFlaw, 'dynamicflaws': DynamicFlaw}
+
+
+def iter_detailed_report(source, kinds=None):
+    """Parses a detailed report as it is read and yields a ReportInfo, then StaticFlaw, DynamicFlaw and
+    SCAComponent records in document order. source is the report as bytes or a binary file-like object,
+    such as a streamed response. Each element is discarded once its record is built, so memory does not
+    grow with the size of the report. kinds, if given, is a collection of the record classes to yield."""
+    if isinstance(source, (bytes, str)):
+        source = io.BytesIO(source.encode() if isinstance(source, str) else source)
+    stack = []
+    record_depth = None
+    for event, element in ET.iterparse(source, events=('start', 'end')):
+        if event == 'start':
+            stack.append(element)
+            if record_depth is None and _record_class(stack) is not None:
+                record_depth = len(stack)
+            elif len(stack) == 1:
+                if local_name(element.tag) == 'error':
+                    raise VeracodeAPIError(element.text)
+                if kinds is None or ReportInfo in kinds:
+                    yield ReportInfo(dict(element.attrib))
+            continue
+
+        depth = len(stack)
+        stack.pop()
+        if depth == 1:
+            break
+        if record_depth is not None and depth > record_depth:
+            continue # part of a record, read when the record ends
+        if depth == record_depth:
+            record_depth = None
+            record_class = _record_class(stack + [element])
+            if kinds is None or record_class in kinds:
+                yield _build_record(record_class, element)
+        element.clear()
+        stack[-1].remove(element)
+
+
+def _record_class(stack):
+    tag = local_name(stack[-1].tag)
+    if len(stack) < 2:
+        return None
+    parent = local_name(stack[-2].tag)
+    if tag == 'flaw':
+        return _FLAW_LISTS.get(parent)
+    if tag == 'component' and parent == 'vulnerable_components':
+        return SCAComponent
+    return None
+
+
+def _build_record(record_class, element):
+    record = record_class(dict(element.attrib))
+    if record_class is SCAComponent:
+        record.file_paths = []
+        record.cves = []
+        for child in element.iter():
+            tag = local_name(child.tag)
+            if tag == 'file_path':
+                record.file_paths.append(child.get('value'))
+            elif tag == 'vulnerability':
+                cve = CVE(dict(child.attrib))
+                cve.component_id = record.component_id
+                record.cves.append(cve)
+    else:
+        record.mitigations = [dict(child.attrib) for child in element.iter() if local_name(child.tag) == 'mitigation']
+        record.annotations = [dict(child.attrib) for child in element.iter() if local_name(child.tag) == 'annotation']
+    return record
+
+
+# getbuildinfo.do
+
+class BuildInfo(XMLRecord):
+    """The <build> of a getbuildinfo.do response, with the app_id and sandbox_id of the response and the
+    status of the build's analysis unit."""
+    _fields = {'build_id': _int, 'version': str, 'results_ready': _bool, 'policy_name': str,
+               'policy_compliance_status': str, 'rules_status': str, 'scan_overdue': _bool}
+    __slots__ = tuple(_fields) + ('app_id', 'sandbox_id', 'status', 'analysis_type')
+
+    @classmethod
+    def from_xml(cls, content):
+        root = parse_xml(content)
+        build = next((element for element in root if local_name(element.tag) == 'build'), None)
+        info = cls(dict(build.attrib) if build is not None else {})
+        if info.build_id is None:
+            info.build_id = _int(root.get('build_id'))
+        info.app_id = _int(root.get('app_id'))
+        info.sandbox_id = _int(root.get('sandbox_id'))
+        unit = None
+        if build is not None:
+            unit = next((element for element in build if local_name(element.tag) == 'analysis_unit'), None)
+        info.status = unit.get('status') if unit is not None else None
+        info.analysis_type = unit.get('analysis_type') if unit is not None else None
+        return info
+
+
+# getapplist.do, getsandboxlist.do and getbuildlist.do
+
+class XMLApp(XMLRecord):
+    _fields = {'app_id': _int, 'app_name': str, 'policy_updated_date': str}
+    __slots__ = tuple(_fields)
+
+
+class XMLSandbox(XMLRecord):
+    _fields = {'sandbox_id': _int, 'sandbox_name': str, 'owner': str, 'last_modified': str}
+    __slots__ = tuple(_fields)
+
+
+class XMLBuild(XMLRecord):
+    _fields = {'build_id': _int, 'version': str, 'policy_updated_date': str, 'dynamic_scan_type': str}
+    __slots__ = tuple(_fields)
+
+
+class XMLRecordList():
+    """A parsed list response. Iterating gives the records in document order; by_id and by_name index
+    them by id and by name, and attributes holds the attributes of the root element."""
+    _record = None
+    _tag = None
+    _id = None
+    _name = None
+    __slots__ = ('attributes', 'records', 'by_id', 'by_name')
+
+    def __init__(self, records, attributes=None):
+        self.attributes = attributes or {}
+        self.records = records
+        self.by_id = {getattr(record, self._id): record for record in records}
+        self.by_name = {getattr(record, self._name): record for record in records}
+
+    @classmethod
+    def from_xml(cls, content):
+        root = parse_xml(content)
+        records = [cls._record(dict(element.attrib)) for element in root if local_name(element.tag) == cls._tag]
+        return cls(records, dict(root.attrib))
+
+    def get(self, id: int):
+        return self.by_id.get(int(id))
+
+    def find(self, name: str):
+        return self.by_name.get(name)
+
+    def __iter__(self):
+        return iter(self.records)
+
+    def __len__(self):
+        return len(self.records)
+
+    def __contains__(self, id):
+        return int(id) in self.by_id
+
+    def __repr__(self):
+        return '{}({} records)'.format(type(self).__name__, len(self.records))
+
+
+class AppList(XMLRecordList):
+    """Applications from getapplist.do, indexed by app_id and app_name."""
+    _record = XMLApp
+    _tag = 'app'
+    _id = 'app_id'
+    _name = 'app_name'
+    __slots__ = ()
+
+
+class SandboxList(XMLRecordList):
+    """Sandboxes of one application from getsandboxlist.do, indexed by sandbox_id and sandbox_name."""
+    _record = XMLSandbox
+    _tag = 'sandbox'
+    _id = 'sandbox_id'
+    _name = 'sandbox_name'
+    __slots__ = ()
+
+    @property
+    def app_id(self):
+        return _int(self.attributes.get('app_id'))
+
+
+class BuildList(XMLRecordList):
+    """Builds of one application or sandbox from getbuildlist.do, indexed by build_id and by version.
+    Versions need not be unique; by_name keeps the last build listed with each version."""
+    _record = XMLBuild
+    _tag = 'build'
+    _id = 'build_id'
+    _name = 'version'
+    __slots__ = ()
+
+    @property
+    def app_id(self):
+        return _int(self.attributes.get('app_id'))
+
+    @property
+    def sandbox_id(self):
+        return _int(self.attributes.get('sandbox_id'))